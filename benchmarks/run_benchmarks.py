@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+"""Benchmarks for the hot paths of the library
+
+Each benchmark is run several times and the best time is reported, along
+with the rate of operations per second.  Results may be saved as JSON and
+compared against a previous run to find regressions::
+
+    $ python benchmarks/run_benchmarks.py --output before.json
+    ... make changes ...
+    $ python benchmarks/run_benchmarks.py --output after.json --compare before.json
+
+When comparing, the command exits with a non-zero status if any benchmark
+is slower than the baseline by more than ``--threshold`` percent.
+"""
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+
+import click
+import six
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from wva import WVA
+from wva.decoders import get_json_decoder
+from wva.simulator import WVASimulator
+from wva.stream import WVAEventConnection, WVAEventStream
+from wva.timeseries import TimeSeriesRingBuffer, decimate
+from wva.vehicle import sample_from_response
+
+BENCHMARKS = []
+
+
+def benchmark(name, operations):
+    """Register a benchmark performing ``operations`` operations per run
+
+    The decorated function is called once to set up the benchmark and must
+    return a function that performs one run.
+    """
+    def register(setup):
+        BENCHMARKS.append((name, operations, setup))
+        return setup
+    return register
+
+
+def _speed_event(i):
+    timestamp = "2015-03-22T05:{:02d}:{:02d}Z".format((i // 60) % 60, i % 60)
+    return {"data": {"VehicleSpeed": {"timestamp": timestamp, "value": 100.0 + (i % 50)},
+                     "sequence": i,
+                     "short_name": "speed{}".format(i % 10),
+                     "timestamp": timestamp,
+                     "uri": "vehicle/data/VehicleSpeed"}}
+
+
+class _StubHttpClient(object):
+    json_decoder = get_json_decoder()
+
+
+@benchmark("parse_events", 20000)
+def bench_parse_events():
+    raw = six.b("".join(json.dumps(_speed_event(i)) + "\r\n" for i in range(20000)))
+    chunks = [raw[i:i + 4096] for i in range(0, len(raw), 4096)]  # as read from the socket
+    connection = WVAEventConnection(WVAEventStream(None), _StubHttpClient())
+
+    def run():
+        connection._parser.reset()
+        count = 0
+        for chunk in chunks:
+            connection._parser.feed(chunk)
+            while connection._parse_one_event() is not None:
+                count += 1
+        assert count == 20000
+    return run
+
+
+@benchmark("emit_event_fanout", 5000)
+def bench_emit_event_fanout():
+    stream = WVAEventStream(None)
+    calls = [0]
+
+    def listener(event):
+        calls[0] += 1
+
+    for i in range(50):
+        stream.add_event_listener(lambda event: listener(event))
+    for i in range(10):
+        stream.add_event_listener(lambda event: listener(event), short_name="speed{}".format(i))
+    for _ in range(50):
+        stream.add_event_listener(lambda event: listener(event), element="EngineSpeed")
+    events = [_speed_event(i) for i in range(5000)]
+
+    def run():
+        for event in events:
+            stream.emit_event(event)
+    return run
+
+
+@benchmark("emit_event_typed", 5000)
+def bench_emit_event_typed():
+    stream = WVAEventStream(None)
+    for _ in range(10):
+        stream.add_event_listener(lambda event: event.epoch, element="VehicleSpeed", typed=True)
+    events = [_speed_event(i) for i in range(5000)]
+
+    def run():
+        stream.emit_events(events)
+    return run
+
+
+@benchmark("sample_from_response", 20000)
+def bench_sample_from_response():
+    responses = [{"VehicleSpeed": _speed_event(i)["data"]["VehicleSpeed"]} for i in range(20000)]
+
+    def run():
+        for response in responses:
+            sample_from_response("VehicleSpeed", response)
+    return run
+
+
+@benchmark("http_request_decode", 200)
+def bench_http_request_decode():
+    simulator = WVASimulator(elements=50)
+    simulator.start()
+    wva = WVA(simulator.hostname, "user", "pass", use_https=False)
+    client = wva.get_http_client()
+    client.get("vehicle/data")  # establish the connection
+
+    def run():
+        for i in range(100):
+            client.get("vehicle/data")
+            wva.get_vehicle_data_element("Element{}".format(i % 50)).sample()
+    run.cleanup = simulator.stop
+    return run
+
+
+@benchmark("grapher_history_render", 10)
+def bench_grapher_history_render():
+    # 10 signals of 30 minutes of history at 50 samples per second
+    seconds, rate = 30 * 60, 50
+    buffers = []
+    for signal in range(10):
+        buf = TimeSeriesRingBuffer(seconds * rate)
+        for i in range(seconds * rate):
+            buf.append(1000.0 + i / float(rate), float((i * (signal + 1)) % 1000))
+        buffers.append(buf)
+    now = 1000.0 + seconds
+
+    def run():
+        for buf in buffers:
+            times, values = buf.window(start=now - seconds)
+            try:
+                x = now - times
+            except TypeError:  # array.array without NumPy
+                x = [now - t for t in times]
+            decimate(x, values, 2 * 1200)
+    return run
+
+
+def run_benchmark(setup, repeat):
+    run = setup()
+    try:
+        run()  # warm up
+        times = []
+        for _ in range(repeat):
+            start = time.time()
+            run()
+            times.append(time.time() - start)
+    finally:
+        cleanup = getattr(run, "cleanup", None)
+        if cleanup is not None:
+            cleanup()
+    return min(times)
+
+
+def compare_results(results, baseline, threshold):
+    """Print a comparison against a baseline and return the names of regressed benchmarks"""
+    regressions = []
+    for name, result in sorted(results.items()):
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            print("{:<28} {:>12}".format(name, "(new)"))
+            continue
+        change = (result["seconds"] - previous["seconds"]) / previous["seconds"] * 100.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print("{:<28} {:>11.1f}%{}".format(name, change, flag))
+    return regressions
+
+
+@click.command()
+@click.option("--output", default=None, type=click.Path(dir_okay=False), help="Write results to this JSON file")
+@click.option("--compare", default=None, type=click.Path(exists=True, dir_okay=False),
+              help="Compare results against a previous JSON results file")
+@click.option("--threshold", default=10.0, help="Percent slowdown reported as a regression")
+@click.option("--repeat", default=5, help="Number of timed runs of each benchmark")
+@click.option("--filter", "name_filter", default=None, help="Only run benchmarks containing this text")
+def main(output, compare, threshold, repeat, name_filter):
+    """Run the benchmarks and report (and optionally compare) the results"""
+    results = {}
+    for name, operations, setup in BENCHMARKS:
+        if name_filter and name_filter not in name:
+            continue
+        seconds = run_benchmark(setup, repeat)
+        results[name] = {
+            "operations": operations,
+            "seconds": seconds,
+            "operations_per_second": operations / seconds if seconds else None,
+        }
+        print("{:<28} {:>10.4f}s {:>14.0f} ops/s".format(name, seconds, results[name]["operations_per_second"]))
+
+    document = {
+        "meta": {
+            "date": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "json_decoder": get_json_decoder().name,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+
+    if compare is not None:
+        with open(compare) as f:
+            baseline = json.load(f)
+        print("")
+        print("Change in time compared to {}:".format(compare))
+        if compare_results(results, baseline, threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
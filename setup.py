@@ -66,7 +66,10 @@ setup(
     packages=find_packages(),
     install_requires=open('requirements.txt').read().split(),
     entry_points={
-        'console_scripts': ['wva=wva.cli:main']
+        'console_scripts': [
+            'wva=wva.cli:main',
+            'wva-simulator=wva.simulator:main',
+        ]
     },
     classifiers=[
         "Development Status :: 3 - Alpha",
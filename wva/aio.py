@@ -0,0 +1,459 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+"""asyncio-native counterparts to the blocking WVA API
+
+This module requires Python 3.5 or later.  The classes here mirror the
+blocking API but never block the event loop; web services calls are made
+with a minimal HTTP/1.1 client built on ``asyncio.open_connection`` (with
+a small pool of keep-alive connections) and the event stream is consumed
+as an asynchronous iterator.  Example::
+
+    wva = AsyncWVA("192.168.100.1", "user", "pass")
+    speed = await wva.get_vehicle_data_element("VehicleSpeed").sample()
+    async for event in wva.get_event_stream():
+        print(event)
+    wva.close()
+"""
+import asyncio
+import base64
+import json
+import logging
+import ssl
+import time
+
+from wva.decoders import get_json_decoder
+from wva.exceptions import WVAError, WVAHttpRequestError, WVAHttpError, HTTP_STATUS_EXCEPTION_MAP
+from wva.stream import WVAEventParser, WVAReconnectPolicy, DEFAULT_RECV_BUFFER_SIZE, split_hostname
+from wva.vehicle import sample_from_response
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_IDLE_CONNECTIONS = 10
+
+
+class AsyncWVAResponse(object):
+    """The response to a request made with :class:`AsyncWVAHttpClient`
+
+    Provides the subset of the ``requests.Response`` interface used by
+    :class:`wva.exceptions.WVAHttpError`.
+    """
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+
+class AsyncWVAHttpClient(object):
+    """Non-blocking client for making WVA Web Service Calls"""
+
+    def __init__(self, hostname, username, password, use_https=True, json_decoder=None,
+                 max_idle_connections=DEFAULT_MAX_IDLE_CONNECTIONS, timeout=None):
+        self._hostname = hostname
+        self._username = username
+        self._password = password
+        self._use_https = use_https
+        self._json_decoder = get_json_decoder(json_decoder)
+        self._max_idle_connections = max_idle_connections
+        self._timeout = timeout
+        self._idle = []  # [(reader, writer), ...] available for reuse
+        self._ssl_context = None
+
+    @property
+    def hostname(self):
+        return self._hostname
+
+    @property
+    def username(self):
+        return self._username
+
+    @property
+    def password(self):
+        return self._password
+
+    @property
+    def use_https(self):
+        return self._use_https
+
+    @property
+    def json_decoder(self):
+        return self._json_decoder
+
+    def _get_ssl_context(self):
+        if self._ssl_context is None:
+            # The WVA uses a self-signed certificate
+            self._ssl_context = ssl.create_default_context()
+            self._ssl_context.check_hostname = False
+            self._ssl_context.verify_mode = ssl.CERT_NONE
+        return self._ssl_context
+
+    async def _open_connection(self):
+        host, port = split_hostname(self._hostname, 443 if self._use_https else 80)
+        ssl_context = self._get_ssl_context() if self._use_https else None
+        return await asyncio.open_connection(host, port, ssl=ssl_context)
+
+    def _build_request(self, method, uri, data, headers):
+        credentials = "{}:{}".format(self._username, self._password).encode('utf-8')
+        all_headers = {
+            "Host": self._hostname,
+            "Accept": "application/json",
+            "Authorization": "Basic " + base64.b64encode(credentials).decode('ascii'),
+            "Connection": "keep-alive",
+        }
+        all_headers.update(headers or {})
+        if data is not None:
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            elif not isinstance(data, bytes):
+                raise TypeError("Request data must be str or bytes, not {}".format(type(data).__name__))
+            all_headers["Content-Length"] = str(len(data))
+        elif method in ("PUT", "POST"):
+            all_headers["Content-Length"] = "0"
+
+        lines = ["{} /ws/{} HTTP/1.1".format(method, uri.lstrip("/"))]
+        lines.extend("{}: {}".format(k, v) for k, v in all_headers.items())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + (data or b"")
+
+    @staticmethod
+    async def _read_response(reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed before response was received")
+        version, status, _reason = (status_line.decode('latin-1').split(None, 2) + [""])[:3]
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode('latin-1').partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass  # discard trailers
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)  # \r\n following each chunk
+            content = b"".join(chunks)
+        elif "content-length" in headers:
+            content = await reader.readexactly(int(headers["content-length"]))
+        else:
+            content = await reader.read()
+            keep_alive = False
+        return AsyncWVAResponse(int(status), headers, content), keep_alive
+
+    async def _exchange(self, request):
+        reused = bool(self._idle)
+        reader, writer = self._idle.pop() if reused else await self._open_connection()
+        try:
+            writer.write(request)
+            await writer.drain()
+            response, keep_alive = await self._read_response(reader)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+            if not reused:
+                raise
+            # the server closed an idle connection, so try again on a fresh connection
+            return await self._exchange(request)
+        except:
+            writer.close()
+            raise
+
+        if keep_alive and len(self._idle) < self._max_idle_connections:
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+        return response
+
+    async def raw_request(self, method, uri, data=None, headers=None):
+        """Perform a WVA web services request and return the raw response object
+
+        :param method: The HTTP method to use when making this request
+        :param uri: The path past /ws to request.  That is, the path requested for
+            a relpath of `a/b/c` would be `/ws/a/b/c`.
+        :raises WVAHttpRequestError: if there was an error making the HTTP request.  That is,
+            the request was unable to make it to the WVA for some reason.
+        """
+        request = self._build_request(method, uri, data, headers)
+        try:
+            return await asyncio.wait_for(self._exchange(request), self._timeout)
+        except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+            raise WVAHttpRequestError(e) from e
+
+    async def request(self, method, uri, data=None, headers=None):
+        """Perform a WVA web services request and return the decoded value if successful
+
+        See :meth:`wva.http_client.WVAHttpClient.request` for details.
+        """
+        response = await self.raw_request(method, uri, data, headers)
+        if response.status_code != 200:
+            exception_class = HTTP_STATUS_EXCEPTION_MAP.get(response.status_code, WVAHttpError)
+            raise exception_class(response)
+
+        if response.headers.get("content-type", "").split(";")[0].strip() == "application/json":
+            return self._json_decoder.loads(response.content)
+        else:
+            return response.text
+
+    async def delete(self, uri, **kwargs):
+        """DELETE the specified web service path"""
+        return await self.request("DELETE", uri, **kwargs)
+
+    async def get(self, uri, **kwargs):
+        """GET the specified web service path and return the decoded response contents"""
+        return await self.request("GET", uri, **kwargs)
+
+    async def post(self, uri, data, **kwargs):
+        """POST the provided data to the specified path"""
+        return await self.request("POST", uri, data=data, **kwargs)
+
+    async def post_json(self, uri, data, **kwargs):
+        """POST the provided data as json to the specified path"""
+        kwargs.setdefault("headers", {}).update({"Content-Type": "application/json"})
+        return await self.post(uri, json.dumps(data), **kwargs)
+
+    async def put(self, uri, data, **kwargs):
+        """PUT the provided data to the specified path"""
+        return await self.request("PUT", uri, data=data, **kwargs)
+
+    async def put_json(self, uri, data, **kwargs):
+        """PUT the provided data as json to the specified path"""
+        kwargs.setdefault("headers", {}).update({"Content-Type": "application/json"})
+        return await self.put(uri, json.dumps(data), **kwargs)
+
+    def close(self):
+        """Close all idle keep-alive connections"""
+        idle, self._idle = self._idle, []
+        for _reader, writer in idle:
+            writer.close()
+
+
+class AsyncVehicleDataElement(object):
+    """Provides non-blocking access to a particular vehicle data element"""
+
+    def __init__(self, http_client, element_name):
+        self.name = element_name
+        self._http_client = http_client
+
+    async def sample(self):
+        """Get the current value of this vehicle data element
+
+        See :meth:`wva.vehicle.VehicleDataElement.sample` for details.
+        """
+        response = await self._http_client.get("vehicle/data/{}".format(self.name))
+        return sample_from_response(self.name, response)
+
+
+class AsyncWVASubscription(object):
+    """Provide non-blocking access to a subscription on the WVA"""
+
+    def __init__(self, http_client, short_name):
+        self._http_client = http_client
+        self.short_name = short_name
+
+    async def create(self, uri, buffer="queue", interval=10):
+        """Create a subscription with this short name and the provided parameters
+
+        See :meth:`wva.subscriptions.WVASubscription.create` for details.
+        """
+        return await self._http_client.put_json("subscriptions/{}".format(self.short_name), {
+            "subscription": {
+                "uri": uri,
+                "buffer": buffer,
+                "interval": interval,
+            }
+        })
+
+    async def delete(self):
+        """Delete this subscription"""
+        return await self._http_client.delete("subscriptions/{}".format(self.short_name))
+
+    async def get_metadata(self):
+        """Get the metadata that is available for this subscription"""
+        return (await self._http_client.get("subscriptions/{}".format(self.short_name)))["subscription"]
+
+
+class AsyncWVAEventStream(object):
+    """Asynchronous iterator over the events received from a WVA
+
+    Iterating over the stream connects to the WVA (enabling the event
+    stream if necessary) and yields each event as it is received.  If the
+    connection is lost, the stream will reconnect and continue iterating::
+
+        async for event in wva.get_event_stream():
+            print(event["data"]["short_name"])
+
+    Call :meth:`close` to disconnect; any pending iteration will then end.
+    Failed attempts to connect, and lost connections, are retried with the
+    delays of the provided :class:`wva.stream.WVAReconnectPolicy` in the same
+    way as for the blocking :class:`wva.stream.WVAEventStream`.
+    """
+
+    def __init__(self, http_client, recv_buffer_size=DEFAULT_RECV_BUFFER_SIZE, reconnect_policy=None):
+        self._http_client = http_client
+        self._recv_buffer_size = recv_buffer_size
+        self._reconnect_policy = reconnect_policy or WVAReconnectPolicy()
+        self._parser = WVAEventParser(http_client.json_decoder)
+        self._reader = None
+        self._writer = None
+        self._closed = False
+        self._connected_since = 0.0
+        self._failures = 0  # consecutive failures to connect
+        self._next_attempt = 0.0
+        self._event_port = None  # (hostname, port) of the last connection
+        self._event_port_expires = 0.0
+
+    def _get_cached_event_port(self, hostname):
+        if self._event_port is None or self._event_port[0] != hostname:
+            return None
+        if time.time() >= self._event_port_expires:
+            return None
+        return self._event_port[1]
+
+    def _schedule_retry(self, now):
+        self._failures += 1
+        self._next_attempt = now + self._reconnect_policy.get_delay(self._failures)
+
+    async def _connect(self):
+        while not self._closed:
+            delay = self._next_attempt - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            hostname = self._http_client.hostname
+            port = self._get_cached_event_port(hostname)
+            try:
+                if port is None:
+                    event_info = (await self._http_client.get("config/ws_events"))["ws_events"]
+                    if event_info["enable"] != "on":
+                        await self._http_client.put_json("config/ws_events", {
+                            "enable": "on",
+                            "port": event_info["port"],  # just keep existing port
+                        })
+                    port = event_info["port"]
+                host, _port = split_hostname(hostname)
+                self._reader, self._writer = await asyncio.open_connection(host, port)
+            except WVAError as e:
+                logger.debug("WVAError connecting to event stream: %s", e)
+            except OSError as e:
+                logger.debug("socket.error connecting to event stream: %s", e)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.debug("Unable to configure event stream: %r", e)
+            else:
+                self._event_port = (hostname, port)
+                self._connected_since = time.time()
+                self._parser.reset()
+                return
+            self._event_port = None  # query the port again (events may have been disabled)
+            self._schedule_retry(time.time())
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    def _connection_lost(self):
+        self._disconnect()
+        now = time.time()
+        policy = self._reconnect_policy
+        self._event_port_expires = now + (policy.event_port_ttl or 0)
+        if now - self._connected_since >= policy.reset_after:
+            self._failures = 0
+            self._next_attempt = now + policy.get_delay(0)
+        else:
+            # the connection did not last, so back off as if connecting failed
+            self._schedule_retry(now)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._closed:
+            event = self._parser.next_event()
+            if event is not None:
+                return event
+
+            if self._reader is None:
+                await self._connect()
+                continue
+
+            try:
+                data = await self._reader.read(self._recv_buffer_size)
+            except OSError as e:
+                logger.debug("socket.error from connected state: %s", e)
+                data = b""
+            if not data:
+                self._connection_lost()
+            else:
+                self._parser.feed(data)
+        raise StopAsyncIteration
+
+    def close(self):
+        """Disconnect from the event stream and end iteration"""
+        self._closed = True
+        self._disconnect()
+
+
+class AsyncWVA(object):
+    """asyncio counterpart to :class:`wva.WVA`"""
+
+    def __init__(self, hostname, username, password, use_https=True, json_decoder=None, **kwargs):
+        self._http_client = AsyncWVAHttpClient(hostname, username, password, use_https, json_decoder, **kwargs)
+        self._event_stream = None
+
+    @property
+    def hostname(self):
+        return self._http_client.hostname
+
+    def get_http_client(self):
+        """Get a direct reference to the http client used by this instance"""
+        return self._http_client
+
+    def get_vehicle_data_element(self, name):
+        """Return an :class:`AsyncVehicleDataElement` with the given name"""
+        return AsyncVehicleDataElement(self._http_client, name)
+
+    async def get_vehicle_data_elements(self):
+        """Get a dictionary mapping names to :class:`AsyncVehicleDataElement` instances"""
+        elements = {}
+        for uri in (await self._http_client.get("vehicle/data")).get("data", []):
+            name = uri.split("/")[-1]
+            elements[name] = self.get_vehicle_data_element(name)
+        return elements
+
+    def get_subscription(self, short_name):
+        """Get the :class:`AsyncWVASubscription` with the provided short_name"""
+        return AsyncWVASubscription(self._http_client, short_name)
+
+    async def get_subscriptions(self):
+        """Return a list of subscriptions currently active for this WVA device"""
+        subscriptions = []
+        for uri in (await self._http_client.get("subscriptions")).get('subscriptions'):
+            subscriptions.append(self.get_subscription(uri.split("/")[-1]))
+        return subscriptions
+
+    def get_event_stream(self):
+        """Get the :class:`AsyncWVAEventStream` associated with this WVA"""
+        if self._event_stream is None:
+            self._event_stream = AsyncWVAEventStream(self._http_client)
+        return self._event_stream
+
+    def close(self):
+        """Close the event stream (if any) and all idle HTTP connections"""
+        if self._event_stream is not None:
+            self._event_stream.close()
+        self._http_client.close()
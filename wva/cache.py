@@ -0,0 +1,164 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+"""Caching of WVA web services responses
+
+Many resources on the WVA (ECU information, for instance) rarely or never
+change, yet tools tend to request them over and over.  A
+:class:`WVAResponseCache` may be given to :class:`wva.http_client.WVAHttpClient`
+(or :class:`wva.WVA`) to avoid repeating those requests::
+
+    wva = WVA("192.168.100.1", "user", "pass", response_cache=WVAResponseCache())
+
+Only GET requests are cached, keyed by method and URI.  How long a response
+is reused is decided by the first matching rule, a ``(pattern, ttl)`` pair
+where the pattern is matched against the URI with :func:`fnmatch.fnmatch`:
+
+- ``ttl`` is None: the response is never cached
+- ``ttl`` is 0: the response is cached but revalidated on every request
+- ``ttl`` > 0: the response is reused without contacting the WVA for that
+  many seconds and then revalidated
+
+When the WVA provides an ``ETag`` or ``Last-Modified`` header, revalidation
+is performed with a conditional request (``If-None-Match`` or
+``If-Modified-Since``) and a ``304 Not Modified`` response reuses the cached
+value without transferring or decoding it again.  Responses without either
+header are only cached when their rule has a positive TTL.
+
+Any PUT, POST or DELETE made through the client invalidates the cached
+response for that URI and for its parent (e.g. writing
+``subscriptions/speed`` invalidates ``subscriptions``).
+
+Cached values are shared between callers and must not be modified.
+"""
+import collections
+import fnmatch
+import threading
+import time
+
+# Vehicle data changes constantly and ECU information rarely does.  Anything
+# else (including hardware state such as LEDs and buttons) is revalidated.
+DEFAULT_CACHE_RULES = (
+    ("vehicle/data", None),
+    ("vehicle/data/*", None),
+    ("vehicle/ecus/*", 3600),
+    ("*", 0),
+)
+
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class WVACacheEntry(object):
+    """A cached response value along with its validators"""
+
+    __slots__ = ("value", "etag", "last_modified", "expires")
+
+    def __init__(self, value, etag, last_modified, expires):
+        self.value = value
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+    def is_fresh(self, now):
+        return self.expires > now
+
+    def get_conditional_headers(self):
+        """Return the headers used to revalidate this entry with the WVA"""
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class WVAResponseCache(object):
+    """Thread-safe cache of decoded responses with per-path TTL rules
+
+    :param rules: Sequence of ``(pattern, ttl)`` pairs; see the module
+        documentation.  URIs matching no rule are not cached.
+    :param max_entries: Maximum number of responses held; the least
+        recently used response is discarded when this is exceeded.
+    """
+
+    def __init__(self, rules=DEFAULT_CACHE_RULES, max_entries=DEFAULT_MAX_ENTRIES):
+        self._rules = tuple(rules)
+        self._max_entries = max_entries
+        self._entries = collections.OrderedDict()  # (method, uri) -> WVACacheEntry
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._revalidated = 0
+        self._misses = 0
+
+    @property
+    def rules(self):
+        return self._rules
+
+    def get_ttl(self, uri):
+        """Return the TTL for the provided URI according to the rules (None if not cacheable)"""
+        uri = uri.strip("/")
+        for pattern, ttl in self._rules:
+            if fnmatch.fnmatch(uri, pattern):
+                return ttl
+        return None
+
+    def lookup(self, method, uri):
+        """Return the :class:`WVACacheEntry` for a request or None if there is none"""
+        key = (method, uri.strip("/"))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.pop(key)
+            self._entries[key] = entry  # most recently used
+            return entry
+
+    def store(self, method, uri, value, etag=None, last_modified=None):
+        """Cache a decoded response, returning False if the rules do not allow it"""
+        ttl = self.get_ttl(uri)
+        if ttl is None or (ttl <= 0 and etag is None and last_modified is None):
+            return False
+
+        entry = WVACacheEntry(value, etag, last_modified, time.time() + ttl)
+        key = (method, uri.strip("/"))
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def refresh(self, entry, uri):
+        """Extend the lifetime of an entry after the WVA reported it is not modified"""
+        entry.expires = time.time() + (self.get_ttl(uri) or 0)
+        with self._lock:
+            self._revalidated += 1
+
+    def record_hit(self):
+        with self._lock:
+            self._hits += 1
+
+    def invalidate(self, uri=None):
+        """Discard cached responses for ``uri`` and its parent, or everything if None"""
+        with self._lock:
+            if uri is None:
+                self._entries.clear()
+                return
+            uri = uri.strip("/")
+            paths = {uri, uri.rsplit("/", 1)[0]}
+            for key in list(self._entries):
+                if key[1] in paths:
+                    del self._entries[key]
+
+    def get_stats(self):
+        """Return a dictionary of counters for this cache"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "revalidated": self._revalidated,
+                "misses": self._misses,
+            }
@@ -0,0 +1,165 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+"""Recording and replay of the raw event stream
+
+A capture records exactly what is received from the event socket of a WVA,
+along with the time it was received, so that it can later be replayed to
+event stream listeners without a device attached::
+
+    capture = WVAStreamCapture("truck42.wvacap")
+    stream = wva.get_event_stream()
+    stream.set_capture(capture)
+    stream.enable()
+    ...
+    stream.disable()
+    capture.close()
+
+    # later, possibly on another machine
+    replay_stream = WVAEventStream(None)
+    replay_stream.add_event_listener(callback)
+    WVAStreamReplay("truck42.wvacap", replay_stream, speed=10).run()
+
+The capture file is append-only: a short header followed by one record per
+read from the socket, each consisting of the receive time (seconds since
+the epoch, little-endian double), the length of the data (little-endian
+unsigned 32-bit integer) and the raw data itself.  Replayed data is parsed
+by :class:`wva.stream.WVAEventParser` exactly as live data would be.
+"""
+import struct
+import threading
+import time
+
+from wva.stream import WVAEventParser
+
+CAPTURE_MAGIC = b"WVACAP1\n"
+CAPTURE_RECORD_HEADER = struct.Struct("<dI")
+
+
+class WVAStreamCapture(object):
+    """Append raw event stream data with receive timestamps to a capture file
+
+    :param path: Path of the capture file.  If the file already exists,
+        new records are appended to it.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(CAPTURE_MAGIC)
+        self._records = 0
+        self._bytes = 0
+
+    def write(self, receive_time, data):
+        """Append a record of ``data`` received at ``receive_time``"""
+        with self._lock:
+            self._file.write(CAPTURE_RECORD_HEADER.pack(receive_time, len(data)))
+            self._file.write(data)
+            self._records += 1
+            self._bytes += len(data)
+
+    def flush(self):
+        """Flush buffered records to the capture file"""
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        """Flush and close the capture file"""
+        with self._lock:
+            self._file.close()
+
+    def get_stats(self):
+        """Return a dictionary with the number of records and bytes written"""
+        with self._lock:
+            return {"records": self._records, "bytes": self._bytes}
+
+
+def read_capture(path):
+    """Iterate over the ``(receive_time, data)`` records in a capture file
+
+    :raises ValueError: if the file is not a capture file
+    """
+    with open(path, "rb") as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError("{!r} is not a WVA event stream capture".format(path))
+        header_size = CAPTURE_RECORD_HEADER.size
+        while True:
+            header = f.read(header_size)
+            if len(header) < header_size:
+                return  # end of file (or a record truncated while writing)
+            receive_time, length = CAPTURE_RECORD_HEADER.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            yield receive_time, data
+
+
+class WVAStreamReplay(object):
+    """Feed the events in a capture file to the listeners of an event stream
+
+    :param path: Path of the capture file
+    :param event_stream: The :class:`wva.stream.WVAEventStream` whose
+        listeners receive the events.  This need not be (and usually should
+        not be) enabled.
+    :param speed: Replay speed relative to the time the data was captured
+        (e.g. 1 for real time, 10 for ten times faster) or None to replay as
+        fast as possible
+    :param json_decoder: The JSON decoder used to parse events (see
+        :mod:`wva.decoders`)
+    """
+
+    def __init__(self, path, event_stream, speed=None, json_decoder=None):
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be positive or None")
+        self._path = path
+        self._event_stream = event_stream
+        self._speed = speed
+        self._json_decoder = json_decoder
+        self._stop_requested = False
+        self._events = 0
+        self._bytes = 0
+
+    def stop(self):
+        """Request that a replay in progress (in another thread) stops"""
+        self._stop_requested = True
+
+    def run(self):
+        """Replay the capture, returning once all events have been delivered
+
+        :returns: The number of events delivered
+        """
+        self._stop_requested = False
+        parser = WVAEventParser(self._json_decoder)
+        first_time = None
+        start = time.time()
+        for receive_time, data in read_capture(self._path):
+            if self._stop_requested:
+                break
+            if self._speed is not None:
+                if first_time is None:
+                    first_time = receive_time
+                delay = start + (receive_time - first_time) / self._speed - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+            parser.feed(data)
+            self._bytes += len(data)
+            events = []
+            while True:
+                event = parser.next_event()
+                if event is None:
+                    break
+                events.append(event)
+            if events:
+                self._events += len(events)
+                self._event_stream.emit_events(events)
+
+        self._event_stream.flush_batches(force=True)
+        return self._events
+
+    def get_stats(self):
+        """Return a dictionary with the number of events and bytes replayed"""
+        return {"events": self._events, "bytes": self._bytes}
@@ -265,23 +265,24 @@ def vehicle(ctx):
 @vehicle.command(short_help="List available vehicle data items")
 @click.option("--value/--no-value", default=False, help="Get the currently value as well")
 @click.option('--timestamp/--no-timestamp', default=False, help="Also print the timestamp of the sample")
+@click.option('--workers', default=8, help="Number of elements to sample concurrently")
 @click.pass_context
-def list(ctx, value, timestamp):
-    for name, element in sorted(get_wva(ctx).get_vehicle_data_elements().items(), key=lambda (k, v): k):
-        if value:
-            try:
-                curval = element.sample()
-            except WVAHttpServiceUnavailableError:
-                print("{} (Unavailable)".format(name))
-            except WVAError, e:
-                print("{} (Error: {})".format(name, e))
-            else:
-                if timestamp:
-                    print("{} = {} at {}".format(name, curval.value, curval.timestamp.ctime()))
-                else:
-                    print("{} = {}".format(name, curval.value))
-        else:
+def list(ctx, value, timestamp, workers):
+    wva = get_wva(ctx)
+    if not value:
+        for name in sorted(wva.get_vehicle_data_elements().keys()):
             print(name)
+        return
+
+    for name, curval in sorted(wva.sample_all(max_workers=workers).items(), key=lambda (k, v): k):
+        if isinstance(curval, WVAHttpServiceUnavailableError):
+            print("{} (Unavailable)".format(name))
+        elif isinstance(curval, WVAError):
+            print("{} (Error: {})".format(name, curval))
+        elif timestamp:
+            print("{} = {} at {}".format(name, curval.value, curval.timestamp.ctime()))
+        else:
+            print("{} = {}".format(name, curval.value))
 
 
 @vehicle.command(short_help="Get the current value of a vehicle data element")
@@ -473,12 +474,69 @@ glimpse at what data is coming in to a WVA device.
         time.sleep(5)
 
 
+@subscriptions.command()
+@click.argument("path", type=click.Path(dir_okay=False))
+@click.option("--seconds", default=None, type=float, help="Stop capturing after this many seconds")
+@click.pass_context
+def capture(ctx, path, seconds):
+    """Record the raw WVA event stream to a capture file
+
+The capture may later be replayed with 'wva subscriptions replay' or graphed
+with 'wva subscriptions graph --capture'.  Data is appended if the file
+already exists.
+
+\b
+    $ wva subscriptions capture --seconds=3600 truck42.wvacap
+"""
+    from wva.capture import WVAStreamCapture
+
+    wva = get_wva(ctx)
+    es = wva.get_event_stream()
+    stream_capture = WVAStreamCapture(path)
+    es.set_capture(stream_capture)
+    es.enable()
+    try:
+        if seconds is None:
+            while True:
+                time.sleep(5)
+        else:
+            time.sleep(seconds)
+    finally:
+        es.disable()
+        stream_capture.close()
+
+
+@subscriptions.command()
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--speed", default=None, type=float,
+              help="Replay speed relative to real time (e.g. 1 or 10); as fast as possible if not specified")
+def replay(path, speed):
+    """Output the events in a capture file
+
+\b
+    $ wva subscriptions replay --speed=1 truck42.wvacap
+"""
+    from wva.capture import WVAStreamReplay
+    from wva.stream import WVAEventStream
+
+    es = WVAEventStream(None)
+    es.add_event_listener(cli_pprint)
+    WVAStreamReplay(path, es, speed=speed).run()
+
+
 @subscriptions.command()
 @click.argument("items", nargs=-1)
 @click.option("--seconds", default=300, help="The number of seconds of history to graph")
 @click.option("--ylim", default=1000, help="The Y Limit for the graph view area")
+@click.option("--output", default=None, type=click.Path(dir_okay=False),
+              help="Record for --seconds and write the graph to this file (e.g. graph.png or graph.svg) "
+                   "instead of showing a live graph")
+@click.option("--summary", default=None, type=click.Path(dir_okay=False),
+              help="With --output, also write summary statistics to this file as JSON")
+@click.option("--capture", default=None, type=click.Path(exists=True, dir_okay=False),
+              help="With --output, graph the data in a capture file rather than the live stream")
 @click.pass_context
-def graph(ctx, items, seconds, ylim):
+def graph(ctx, items, seconds, ylim, output, summary, capture):
     """Present a live graph of the incoming streaming data
 
 This command requires that matplotlib be installed and accessible
@@ -493,10 +551,45 @@ subscriptions and execute the following...
 
 \b
     $ wva subscriptions graph --seconds=180 VehicleSpeed EngineSpeed
+
+On a machine without a display, the graph may instead be written to a file
+after recording for the specified number of seconds:
+
+\b
+    $ wva subscriptions graph --seconds=600 --output=trip.png --summary=trip.json VehicleSpeed
+
+or from a capture made with 'wva subscriptions capture':
+
+\b
+    $ wva subscriptions graph --capture=truck42.wvacap --output=trip.svg VehicleSpeed
 """
+    if output is not None:
+        try:
+            from wva import report
+        except ImportError:
+            print("Unable to graph... you must have matplotlib installed")
+        else:
+            stream_report = report.WVAStreamReport(items)
+            if capture is not None:
+                from wva.capture import WVAStreamReplay
+                from wva.stream import WVAEventStream
+
+                es = WVAEventStream(None)
+                stream_report.attach(es)
+                WVAStreamReplay(capture, es).run()
+                stream_report.detach()
+            else:
+                es = get_wva(ctx).get_event_stream()
+                es.enable()
+                stream_report.record(es, seconds)
+                es.disable()
+            stream_report.render(output)
+            if summary is not None:
+                stream_report.write_summary(summary)
+        return
+
     wva = get_wva(ctx)
     es = wva.get_event_stream()
-
     try:
         from wva import grapher
     except ImportError:
@@ -4,16 +4,39 @@
 #
 # Copyright (c) 2015 Digi International Inc. All Rights Reserved.
 
-from wva.http_client import WVAHttpClient
+import sys
+import threading
+import time
+
+import six
+from six.moves import queue
+from wva.exceptions import WVAError
+from wva.http_client import WVAHttpClient, DEFAULT_POOL_MAXSIZE, DEFAULT_TIMEOUT
 from wva.stream import WVAEventStream
 from wva.subscriptions import WVASubscription
 from wva.vehicle import VehicleDataElement
 
+DEFAULT_SAMPLE_WORKERS = 8
+
+
+DISCOVERY_VEHICLE_DATA = "vehicle/data"
+DISCOVERY_SUBSCRIPTIONS = "subscriptions"
+
 
 class WVA(object):
-    def __init__(self, hostname, username, password, use_https=True):
-        self._http_client = WVAHttpClient(hostname, username, password, use_https)
+    def __init__(self, hostname, username, password, use_https=True, json_decoder=None,
+                 discovery_cache_ttl=None, response_cache=None, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 timeout=DEFAULT_TIMEOUT, max_retries=0, backoff_factor=0, keep_alive=True,
+                 verify=False, metrics=None):
+        self._http_client = WVAHttpClient(hostname, username, password, use_https, json_decoder,
+                                          response_cache, pool_maxsize=pool_maxsize, timeout=timeout,
+                                          max_retries=max_retries, backoff_factor=backoff_factor,
+                                          keep_alive=keep_alive, verify=verify, metrics=metrics)
         self._event_stream = None
+        self._discovery_cache_ttl = discovery_cache_ttl
+        self._discovery_cache = {}  # discovery key -> (expiration time, result)
+        self._discovery_generation = 0  # incremented whenever the cache is invalidated
+        self._discovery_lock = threading.Lock()
 
     @property
     def hostname(self):
@@ -21,7 +44,57 @@ class WVA(object):
 
     @hostname.setter
     def hostname(self, hostname):
-        self._http_client._hostname = hostname
+        self._http_client.hostname = hostname
+        self.invalidate_discovery_cache()
+
+    @property
+    def discovery_cache_ttl(self):
+        """Seconds for which discovery results are cached (None disables caching)
+
+        When enabled, the results of :meth:`get_vehicle_data_elements` and
+        :meth:`get_subscriptions` are reused for this many seconds rather
+        than being requested from the WVA on every call.  The cache of
+        subscriptions is invalidated automatically when a subscription
+        obtained from this WVA is created or deleted.
+        """
+        return self._discovery_cache_ttl
+
+    @discovery_cache_ttl.setter
+    def discovery_cache_ttl(self, ttl):
+        self._discovery_cache_ttl = ttl
+        self.invalidate_discovery_cache()
+
+    def invalidate_discovery_cache(self, key=None):
+        """Discard cached discovery results
+
+        :param key: Either ``DISCOVERY_VEHICLE_DATA`` or ``DISCOVERY_SUBSCRIPTIONS``
+            to invalidate only one set of results, or None to invalidate both.
+        """
+        with self._discovery_lock:
+            self._discovery_generation += 1
+            if key is None:
+                self._discovery_cache.clear()
+            else:
+                self._discovery_cache.pop(key, None)
+
+    def _discover(self, key, fetch):
+        ttl = self._discovery_cache_ttl
+        if ttl is None:
+            return fetch()
+
+        now = time.time()
+        with self._discovery_lock:
+            cached = self._discovery_cache.get(key)
+            generation = self._discovery_generation
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        result = fetch()
+        with self._discovery_lock:
+            # don't store a result that may predate an invalidation made during fetch()
+            if self._discovery_generation == generation:
+                self._discovery_cache[key] = (now + ttl, result)
+        return result
 
     @property
     def username(self):
@@ -51,6 +124,10 @@ class WVA(object):
         """Get a direct reference to the http client used by this WVA instance"""
         return self._http_client
 
+    def get_metrics(self):
+        """Get the :class:`wva.metrics.WVAMetrics` for this WVA (None unless provided)"""
+        return self._http_client.metrics
+
     def get_vehicle_data_element(self, name):
         """Return a :class:`VehicleDataElement` with the given name
 
@@ -73,19 +150,85 @@ class WVA(object):
         :raises WVAError: In the event of a problem retrieving the list of data elements
         :returns: A dictionary of element names mapped to :class:`VehicleDataElement` instances.
         """
-        # Response looks like: { "data": ['vehicle/data/ParkingBrake', ...] }
-        elements = {}
-        for uri in self.get_http_client().get("vehicle/data").get("data", []):
-            name = uri.split("/")[-1]
-            elements[name] = self.get_vehicle_data_element(name)
-        return elements
+        def fetch():
+            # Response looks like: { "data": ['vehicle/data/ParkingBrake', ...] }
+            elements = {}
+            for uri in self.get_http_client().get("vehicle/data").get("data", []):
+                name = uri.split("/")[-1]
+                elements[name] = self.get_vehicle_data_element(name)
+            return elements
+
+        return dict(self._discover(DISCOVERY_VEHICLE_DATA, fetch))
+
+    def sample_all(self, names=None, max_workers=DEFAULT_SAMPLE_WORKERS):
+        """Sample many vehicle data elements concurrently
+
+        Rather than sampling each element in turn (one HTTP round trip
+        after another), the elements are sampled by up to ``max_workers``
+        threads sharing this WVA's HTTP connection pool::
+
+            for name, sample in wva.sample_all(["VehicleSpeed", "EngineSpeed"]).items():
+                if isinstance(sample, WVAError):
+                    print("{}: {}".format(name, sample))
+                else:
+                    print("{} = {}".format(name, sample.value))
+
+        A failure sampling one element (e.g. :class:`WVAHttpServiceUnavailableError`
+        as the element has not yet been received from the vehicle bus) does
+        not abort the others; the exception is returned in place of the sample.
+
+        :param names: Names of the elements to sample.  If None, all elements
+            returned by :meth:`get_vehicle_data_elements` are sampled.
+        :param max_workers: The maximum number of concurrent requests
+        :raises ValueError: if max_workers is less than 1
+        :raises WVAError: if names is None and the list of elements cannot be retrieved
+        :returns: A dictionary mapping each name to either a
+            :class:`VehicleDataSample` or the :class:`WVAError` raised sampling it
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be positive")
+        if names is None:
+            names = self.get_vehicle_data_elements().keys()
+        work = queue.Queue()
+        for name in names:
+            work.put(name)
+
+        results = {}
+        unexpected = []
+
+        def sample_worker():
+            while not unexpected:
+                try:
+                    name = work.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results[name] = self.get_vehicle_data_element(name).sample()
+                except WVAError as e:
+                    results[name] = e
+                except:
+                    unexpected.append(sys.exc_info())
+
+        workers = [threading.Thread(target=sample_worker, name="WVASampleWorker-{}".format(i))
+                   for i in range(min(max_workers, work.qsize()))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        if unexpected:
+            six.reraise(*unexpected[0])
+        return results
 
     def get_subscription(self, short_name):
         """Get the subscription with the provided short_name
 
         :returns: A :class:`WVASubscription` instance bound for the specified short name
         """
-        return WVASubscription(self._http_client, short_name)
+        return WVASubscription(self._http_client, short_name, on_change=self._subscriptions_changed)
+
+    def _subscriptions_changed(self, subscription):
+        self.invalidate_discovery_cache(DISCOVERY_SUBSCRIPTIONS)
 
     def get_subscriptions(self):
         """Return a list of subscriptions currently active for this WVA device
@@ -93,11 +236,14 @@ class WVA(object):
         :raises WVAError: if there is a problem getting the subscription list from the WVA
         :returns: A list of :class:`WVASubscription` instances
         """
-        # Example: {'subscriptions': ['subscriptions/TripDistance~sub', 'subscriptions/FuelRate~sub', ]}
-        subscriptions = []
-        for uri in self.get_http_client().get("subscriptions").get('subscriptions'):
-            subscriptions.append(self.get_subscription(uri.split("/")[-1]))
-        return subscriptions
+        def fetch():
+            # Example: {'subscriptions': ['subscriptions/TripDistance~sub', 'subscriptions/FuelRate~sub', ]}
+            subscriptions = []
+            for uri in self.get_http_client().get("subscriptions").get('subscriptions'):
+                subscriptions.append(self.get_subscription(uri.split("/")[-1]))
+            return subscriptions
+
+        return list(self._discover(DISCOVERY_SUBSCRIPTIONS, fetch))
 
     def get_event_stream(self):
         """Get the event stream associated with this WVA
@@ -108,5 +254,5 @@ class WVA(object):
         :return: a new :class:`WVAEventStream` instance
         """
         if self._event_stream is None:
-            self._event_stream = WVAEventStream(self._http_client)
+            self._event_stream = WVAEventStream(self._http_client, metrics=self._http_client.metrics)
         return self._event_stream
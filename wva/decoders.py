@@ -0,0 +1,138 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+"""Pluggable JSON decoder backends
+
+Documents received from the WVA (both web services responses and event
+stream records) are decoded by a decoder backend.  By default, the fastest
+backend that is installed will be used, in the following order of
+preference:
+
+- ``orjson``
+- ``simdjson`` (pysimdjson)
+- ``ujson``
+- ``json`` (the standard library, always available)
+
+A specific backend may be selected by passing its name (or a decoder
+instance) as the ``json_decoder`` parameter to :class:`wva.WVA` or by
+setting the ``WVA_JSON_DECODER`` environment variable.
+"""
+import json
+import os
+
+import six
+
+DECODER_ENV_VAR = "WVA_JSON_DECODER"
+
+
+class StdlibJSONDecoder(object):
+    """Decoder using the json module from the standard library"""
+
+    name = "json"
+
+    def loads(self, data):
+        """Decode the provided bytes (or text) and return the document"""
+        if not isinstance(data, six.text_type):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+
+class OrjsonDecoder(object):
+    """Decoder using `orjson <https://github.com/ijl/orjson>`_"""
+
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._loads = orjson.loads
+
+    def loads(self, data):
+        """Decode the provided bytes (or text) and return the document"""
+        return self._loads(data)
+
+
+class SimdjsonDecoder(object):
+    """Decoder using `pysimdjson <https://github.com/TkTech/pysimdjson>`_"""
+
+    name = "simdjson"
+
+    def __init__(self):
+        import simdjson
+        self._loads = simdjson.loads
+
+    def loads(self, data):
+        """Decode the provided bytes (or text) and return the document"""
+        if isinstance(data, bytearray):
+            data = bytes(data)
+        return self._loads(data)
+
+
+class UjsonDecoder(object):
+    """Decoder using `ujson <https://github.com/ultrajson/ultrajson>`_"""
+
+    name = "ujson"
+
+    def __init__(self):
+        import ujson
+        self._loads = ujson.loads
+
+    def loads(self, data):
+        """Decode the provided bytes (or text) and return the document"""
+        if isinstance(data, bytearray):
+            data = bytes(data)
+        return self._loads(data)
+
+
+DECODER_CLASSES = {
+    "orjson": OrjsonDecoder,
+    "simdjson": SimdjsonDecoder,
+    "ujson": UjsonDecoder,
+    "json": StdlibJSONDecoder,
+}
+
+# Order in which backends are tried when automatically selecting a decoder
+DECODER_PREFERENCE = ["orjson", "simdjson", "ujson", "json"]
+
+_decoder_cache = {}
+
+
+def get_json_decoder(decoder=None):
+    """Get a JSON decoder backend
+
+    :param decoder: Either an object with a ``loads`` method (which is returned
+        as-is), the name of a backend (one of ``orjson``, ``simdjson``, ``ujson``,
+        ``json`` or ``auto``) or None.  If None, the backend named by the
+        ``WVA_JSON_DECODER`` environment variable is used if set, otherwise the
+        best available backend is selected automatically.
+    :raises ValueError: if the name of the backend is not recognized
+    :raises ImportError: if the requested backend is not installed
+    :returns: A decoder with a ``loads`` method that accepts bytes or text
+    """
+    if decoder is not None and not isinstance(decoder, six.string_types):
+        return decoder
+
+    name = decoder or os.environ.get(DECODER_ENV_VAR) or "auto"
+    name = name.strip().lower()
+    try:
+        return _decoder_cache[name]
+    except KeyError:
+        pass
+
+    if name == "auto":
+        for candidate in DECODER_PREFERENCE:
+            try:
+                instance = get_json_decoder(candidate)
+            except ImportError:
+                continue
+            else:
+                break
+    elif name in DECODER_CLASSES:
+        instance = DECODER_CLASSES[name]()
+    else:
+        raise ValueError("Unknown JSON decoder {!r}, expected one of {!r}".format(
+            name, ["auto"] + DECODER_PREFERENCE))
+
+    _decoder_cache[name] = instance
+    return instance
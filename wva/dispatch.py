@@ -0,0 +1,184 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+import collections
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_OLDEST = "drop-oldest"
+OVERFLOW_DROP_NEWEST = "drop-newest"
+OVERFLOW_COALESCE = "coalesce"
+
+OVERFLOW_POLICIES = (
+    OVERFLOW_BLOCK,
+    OVERFLOW_DROP_OLDEST,
+    OVERFLOW_DROP_NEWEST,
+    OVERFLOW_COALESCE,
+)
+
+DEFAULT_QUEUE_SIZE = 1000
+
+
+def _get_short_name(event):
+    try:
+        return event["data"]["short_name"]
+    except (KeyError, TypeError):
+        return None
+
+
+class WVAQueuedDispatcher(object):
+    """Deliver events to listeners from a pool of worker threads
+
+    By default, :class:`wva.stream.WVAEventStream` calls each listener on
+    the thread reading from the event socket, so a slow listener delays
+    reading further data from the WVA.  When a dispatcher is set on the
+    stream, received events are instead placed in a bounded queue which is
+    consumed by ``workers`` threads that call the listeners::
+
+        stream.set_dispatcher(WVAQueuedDispatcher(maxsize=500, workers=2,
+                                                  overflow=OVERFLOW_DROP_OLDEST))
+
+    When the queue is full, the ``overflow`` policy determines what happens:
+
+    - ``OVERFLOW_BLOCK``: wait for space in the queue (reading from the WVA
+      pauses and the WVA buffers subscription data)
+    - ``OVERFLOW_DROP_OLDEST``: discard the oldest queued event
+    - ``OVERFLOW_DROP_NEWEST``: discard the event being added
+    - ``OVERFLOW_COALESCE``: replace the queued event with the same
+      ``short_name`` (subscription) with the new one, so listeners see the
+      latest value; if there is no such event the oldest is discarded
+
+    Counts of delivered, dropped and coalesced events are available from
+    :meth:`get_stats`.  Note that with more than one worker, events may be
+    delivered out of order.
+    """
+
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE, workers=1, overflow=OVERFLOW_BLOCK):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy {!r}, expected one of {!r}".format(
+                overflow, OVERFLOW_POLICIES))
+        self._maxsize = maxsize
+        self._workers = workers
+        self._overflow = overflow
+        self._queue = collections.deque()  # entries are [short_name, event] lists
+        self._pending = {}  # short_name -> queued entry (only used with OVERFLOW_COALESCE)
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._threads = []
+        self._deliver = None
+        self._running = False
+        self._delivered = 0
+        self._dropped = 0
+        self._coalesced = 0
+
+    @property
+    def overflow(self):
+        return self._overflow
+
+    def start(self, deliver):
+        """Start the worker threads which will call ``deliver(event)`` for each event"""
+        with self._lock:
+            if self._running:
+                return
+            self._deliver = deliver
+            self._running = True
+            for i in range(self._workers):
+                thread = threading.Thread(target=self._run, name="WVAQueuedDispatcher-{}".format(i))
+                thread.setDaemon(True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, drain=True):
+        """Stop the worker threads
+
+        :param drain: If True, events already queued are delivered before the
+            workers exit; otherwise they are discarded.
+        """
+        with self._lock:
+            self._running = False
+            if not drain:
+                self._dropped += len(self._queue)
+                self._queue.clear()
+                self._pending.clear()
+            threads, self._threads = self._threads, []
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+        for thread in threads:
+            thread.join()
+
+    def put(self, event):
+        """Queue an event for delivery, applying the overflow policy if the queue is full"""
+        short_name = _get_short_name(event)
+        with self._lock:
+            if len(self._queue) >= self._maxsize:
+                if self._overflow == OVERFLOW_BLOCK:
+                    while self._running and len(self._queue) >= self._maxsize:
+                        self._not_full.wait()
+                    if len(self._queue) >= self._maxsize:
+                        self._dropped += 1  # stopped while waiting for space
+                        return
+                elif self._overflow == OVERFLOW_DROP_NEWEST:
+                    self._dropped += 1
+                    return
+                elif self._overflow == OVERFLOW_COALESCE and short_name in self._pending:
+                    self._pending[short_name][1] = event
+                    self._coalesced += 1
+                    return
+                else:
+                    self._discard_oldest()
+
+            entry = [short_name, event]
+            self._queue.append(entry)
+            if self._overflow == OVERFLOW_COALESCE:
+                self._pending[short_name] = entry
+            self._not_empty.notify()
+
+    def _discard_oldest(self):
+        self._pop()
+        self._dropped += 1
+
+    def _pop(self):
+        entry = self._queue.popleft()
+        if self._pending.get(entry[0]) is entry:
+            del self._pending[entry[0]]
+        return entry[1]
+
+    def qsize(self):
+        """Return the number of events waiting to be delivered"""
+        with self._lock:
+            return len(self._queue)
+
+    def get_stats(self):
+        """Return a dictionary of counters for this dispatcher"""
+        with self._lock:
+            return {
+                "queued": len(self._queue),
+                "delivered": self._delivered,
+                "dropped": self._dropped,
+                "coalesced": self._coalesced,
+            }
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while self._running and not self._queue:
+                    self._not_empty.wait()
+                if not self._queue:
+                    return  # stopped and drained
+                event = self._pop()
+                self._not_full.notify()
+
+            # noinspection PyBroadException
+            try:
+                self._deliver(event)
+            except:
+                logger.exception("Unhandled exception delivering event")
+            with self._lock:
+                self._delivered += 1
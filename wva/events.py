@@ -0,0 +1,110 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+"""Compact, typed representation of events received from the event stream"""
+from wva.timestamps import parse_epoch, epoch_to_datetime
+from wva.vehicle import VehicleDataSample
+
+# Keys in the data of an event which are not the name of the vehicle data element
+_EVENT_METADATA_KEYS = frozenset(["short_name", "uri", "sequence", "timestamp"])
+
+_UNSET = object()
+
+
+class VehicleDataEvent(object):
+    """A vehicle data event received on the event stream
+
+    This is a compact alternative to the nested dictionaries delivered to
+    regular event listeners.  For instance, the following event::
+
+        {'data': {'VehicleSpeed': {'timestamp': '2015-03-22T05:14:31Z',
+                                   'value': 153.095673},
+                  'sequence': 99649,
+                  'short_name': 'speedy',
+                  'timestamp': '2015-03-22T05:14:31Z',
+                  'uri': 'vehicle/data/VehicleSpeed'}}
+
+    has a ``short_name`` of ``'speedy'``, ``element`` of
+    ``'VehicleSpeed'``, ``value`` of ``153.095673`` and so on.  The sample
+    timestamp is parsed only when first accessed, either as seconds since
+    the epoch (:attr:`epoch`) or as a UTC datetime (:attr:`timestamp`).
+    """
+
+    __slots__ = ('short_name', 'uri', 'sequence', 'element', 'value', '_timestamp_str', '_epoch', '_datetime')
+
+    def __init__(self, short_name, uri, sequence, element, value, timestamp):
+        self.short_name = short_name
+        self.uri = uri
+        self.sequence = sequence
+        self.element = element
+        self.value = value
+        self._timestamp_str = timestamp
+        self._epoch = _UNSET
+        self._datetime = _UNSET
+
+    @classmethod
+    def from_event(cls, event):
+        """Create a :class:`VehicleDataEvent` from an event dictionary
+
+        :returns: A new instance or None if the event is not a vehicle data event
+        """
+        try:
+            data = event["data"]
+            uri = data["uri"]
+        except (KeyError, TypeError):
+            return None
+
+        element = uri.rsplit("/", 1)[-1]
+        element_data = data.get(element)
+        if element_data is None:
+            for key, element_data in data.items():
+                if key not in _EVENT_METADATA_KEYS:
+                    element = key
+                    break
+            else:
+                return None
+
+        if isinstance(element_data, dict):
+            value = element_data.get("value")
+            timestamp = element_data.get("timestamp", data.get("timestamp"))
+        else:
+            value = element_data
+            timestamp = data.get("timestamp")
+        return cls(data.get("short_name"), uri, data.get("sequence"), element, value, timestamp)
+
+    @property
+    def epoch(self):
+        """Timestamp of the sample in seconds since the epoch (or None)"""
+        if self._epoch is _UNSET:
+            self._epoch = None if self._timestamp_str is None else parse_epoch(self._timestamp_str)
+        return self._epoch
+
+    @property
+    def timestamp(self):
+        """Timestamp of the sample as a timezone-aware (UTC) datetime (or None)"""
+        if self._datetime is _UNSET:
+            epoch = self.epoch
+            self._datetime = None if epoch is None else epoch_to_datetime(epoch)
+        return self._datetime
+
+    def to_sample(self):
+        """Return this event as a :class:`wva.vehicle.VehicleDataSample`"""
+        return VehicleDataSample(self.value, self.timestamp)
+
+    def __eq__(self, other):
+        return (isinstance(other, VehicleDataEvent) and
+                (self.short_name, self.uri, self.sequence, self.element, self.value, self._timestamp_str) ==
+                (other.short_name, other.uri, other.sequence, other.element, other.value, other._timestamp_str))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.short_name, self.uri, self.sequence))
+
+    def __repr__(self):
+        return "VehicleDataEvent(short_name={!r}, uri={!r}, sequence={!r}, element={!r}, value={!r}, " \
+               "timestamp={!r})".format(self.short_name, self.uri, self.sequence, self.element,
+                                        self.value, self._timestamp_str)
@@ -3,14 +3,15 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 #
 # Copyright (c) 2015 Digi International Inc. All Rights Reserved.
-import collections
-import datetime
-import threading
+import time
 
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 import numpy as np
-import arrow
+from wva.timeseries import TimeSeriesStore, decimate
+
+# Maximum rate of samples (per second and element) held for the graph window
+MAX_SAMPLE_RATE = 50
 
 
 class WVAStreamGrapher(object):
@@ -20,29 +21,13 @@ class WVAStreamGrapher(object):
         self._seconds = seconds
         self._ylim = ylim
 
-        # History is a dictionary of deques where each deque contains a set of
-        # ordered samples in descending order (oldest data at the end).  This data is pruned
-        # by the graph drawing function so that it only contains information within the
-        # moving window we care about.
-        self._lock = threading.RLock()
-        self._history = {}
-        for item in self.items:
-            self._history[item] = collections.deque(maxlen=self._seconds * 2)
-        self._wva.get_event_stream().add_event_listener(self._event_received)
-
-    def _event_received(self, event):
-        with self._lock:
-            data = event["data"]
-            for item in self.items:
-                item_data = data.get(item)
-                if item_data:
-                    dat = (arrow.get(item_data["timestamp"]).datetime, item_data["value"])
-                    self._history[item].append(dat)
+        # History is kept in a ring buffer per item, recorded from the event stream
+        self._history = TimeSeriesStore(capacity=self._seconds * MAX_SAMPLE_RATE)
+        self._history.attach(self._wva.get_event_stream(), elements=self.items)
 
     def run(self):
         fig, ax = plt.subplots()
         plt.suptitle("WVA Vehicle Data (Live Graph)")
-        x = np.arange(-200, self._seconds, 0.01)
         plot_lines = {}
         plt.xlabel("Seconds from Current Time")
         plt.ylabel("Value")
@@ -50,24 +35,18 @@ class WVAStreamGrapher(object):
         ax.set_xlim(left=-10, right=self._seconds)
         ax.set_ylim(top=self._ylim)
         for item in self.items:
-            lines_created = ax.plot(x, label=item)
-            print lines_created
-            plot_lines[item] = lines_created[0]  # only 1 line will ever be created
+            plot_lines[item], = ax.plot([], [], label=item)  # only 1 line will ever be created
         plt.legend()
 
         def animate(_i):
-            with self._lock:
-                now = arrow.utcnow().datetime
-                for item, plot_line in plot_lines.items():
-                    history = self._history[item]
-                    x = []
-                    y = []
-                    for dt, value in history:
-                        x.append((now - dt).total_seconds())
-                        y.append(value)
-                    plot_line.set_data(x, y)
-                return plot_lines.values()
-
-        # blit is more performant but causes issues with resizing, etc.
-        ani = animation.FuncAnimation(fig, animate, interval=250, blit=False)
+            now = time.time()
+            max_points = 2 * int(ax.bbox.width)  # min and max for each pixel column
+            for item, plot_line in plot_lines.items():
+                times, values = self._history.get_buffer(item).window(start=now - self._seconds)
+                plot_line.set_data(*decimate(now - np.asarray(times), values, max_points))
+            return list(plot_lines.values())
+
+        # Only the lines are redrawn on each frame; matplotlib redraws the
+        # background (axes, legend) when the window is resized
+        ani = animation.FuncAnimation(fig, animate, interval=250, blit=True)
         plt.show()
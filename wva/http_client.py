@@ -4,21 +4,122 @@
 #
 # Copyright (c) 2015 Digi International Inc. All Rights Reserved.
 import json
+import time
+
 import requests
-from requests.packages import urllib3
+from requests.adapters import HTTPAdapter, DEFAULT_POOLBLOCK
+from requests.packages.urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from requests.packages.urllib3.poolmanager import PoolManager
+from requests.packages.urllib3.util.retry import Retry
 import six
-import warnings
+from wva.decoders import get_json_decoder
 from wva.exceptions import WVAHttpRequestError, HTTP_STATUS_EXCEPTION_MAP, WVAHttpError
+from wva.metrics import STATUS_ERROR
+
+
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 30.0
+DEFAULT_TIMEOUT = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+RETRY_STATUS_CODES = (502, 503, 504)
+
+
+class _UnverifiedHTTPSConnectionPool(HTTPSConnectionPool):
+    """HTTPS connection pool which does not warn about unverified certificates
+
+    The WVA uses a self-signed certificate by default, and urllib3 warns about
+    every request made to it without verification.  This connects early as
+    ``HTTPSConnectionPool._validate_conn`` does, without the warning, so that
+    the global warning filters never need to be changed.
+    """
+
+    def _validate_conn(self, conn):
+        HTTPConnectionPool._validate_conn(self, conn)
+        if getattr(conn, "sock", None) is None:
+            conn.connect()
+
+
+class _UnverifiedPoolManager(PoolManager):
+    def _new_pool(self, scheme, *args, **kwargs):
+        pool = PoolManager._new_pool(self, scheme, *args, **kwargs)
+        if type(pool) is HTTPSConnectionPool:
+            # older urllib3 looks up pool classes in a module global, so the
+            # class of the new pool is replaced rather than configured
+            pool.__class__ = _UnverifiedHTTPSConnectionPool
+        return pool
+
+
+class _UnverifiedHTTPAdapter(HTTPAdapter):
+    """Transport adapter for sessions which do not verify the WVA's certificate"""
+
+    def init_poolmanager(self, connections, maxsize, block=DEFAULT_POOLBLOCK, **pool_kwargs):
+        HTTPAdapter.init_poolmanager(self, connections, maxsize, block, **pool_kwargs)
+        self.poolmanager = _UnverifiedPoolManager(num_pools=connections, maxsize=maxsize, block=block,
+                                                  **pool_kwargs)
+
+
+def _create_retry(total, backoff_factor):
+    """Create the urllib3 Retry used for requests to the WVA
+
+    502/503/504 responses are only retried if the installed urllib3 can
+    return the last response once retries are exhausted (``raise_on_status``).
+    Older versions, such as the one bundled with requests 2.6, raise
+    MaxRetryError instead, which would hide the WVA's status (e.g. 503 for
+    an element that is not yet available), so only connection failures are
+    retried with them.
+    """
+    if total:
+        try:
+            return Retry(total=total, backoff_factor=backoff_factor,
+                         status_forcelist=RETRY_STATUS_CODES, raise_on_status=False)
+        except TypeError:
+            pass
+    return Retry(total=total, backoff_factor=backoff_factor)
 
 
 class WVAHttpClient(object):
-    """Wrapper around requests for making WVA Web Service Calls"""
+    """Wrapper around requests for making WVA Web Service Calls
+
+    Connections to the WVA are pooled and kept alive between requests.  The
+    pool and its behavior may be tuned with the following parameters:
 
-    def __init__(self, hostname, username, password, use_https=True):
+    :param pool_maxsize: Maximum number of connections kept open to the WVA.
+        This should be at least the number of threads making requests
+        concurrently (e.g. the workers used by :meth:`wva.WVA.sample_all`),
+        otherwise connections are discarded and re-established.
+    :param timeout: Seconds to wait for a connection and for a response,
+        either as a single number or a ``(connect, read)`` tuple.  None waits
+        forever.
+    :param max_retries: Number of times a failed connection or a 502/503/504
+        response is retried for idempotent requests.  Responses are only
+        retried with urllib3 versions that support ``raise_on_status`` (see
+        :func:`_create_retry`).
+    :param backoff_factor: Delay between retries, growing exponentially
+        (``backoff_factor * 2 ** (retry - 1)`` seconds)
+    :param keep_alive: If False, a new connection is made for each request
+    :param verify: False (the default) to accept the WVA's self-signed
+        certificate without verification, True to verify against the system
+        CA bundle or the path of a CA bundle or certificate to verify against
+    :param metrics: A :class:`wva.metrics.WVAMetrics` in which to record
+        the count and latency of requests (or None)
+    """
+
+    def __init__(self, hostname, username, password, use_https=True, json_decoder=None,
+                 response_cache=None, pool_maxsize=DEFAULT_POOL_MAXSIZE, timeout=DEFAULT_TIMEOUT,
+                 max_retries=0, backoff_factor=0, keep_alive=True, verify=False, metrics=None):
         self._hostname = hostname
         self._username = username
         self._password = password
         self._use_https = use_https
+        self._json_decoder = get_json_decoder(json_decoder)
+        self._response_cache = response_cache
+        self._pool_maxsize = pool_maxsize
+        self._timeout = timeout
+        self._max_retries = max_retries
+        self._backoff_factor = backoff_factor
+        self._keep_alive = keep_alive
+        self._verify = verify
+        self._metrics = metrics
         self._session = None
 
     @property
@@ -29,6 +130,8 @@ class WVAHttpClient(object):
     def hostname(self, hostname):
         self._hostname = hostname
         self._session = None  # invalidate the current session
+        if self._response_cache is not None:
+            self._response_cache.invalidate()
 
     @property
     def username(self):
@@ -37,7 +140,7 @@ class WVAHttpClient(object):
     @username.setter
     def username(self, username):
         self._username = username
-        self._session = None  # invalidate the current session
+        self._update_auth()
 
     @property
     def password(self):
@@ -46,7 +149,7 @@ class WVAHttpClient(object):
     @password.setter
     def password(self, password):
         self._password = password
-        self._session = None  # invalidate the current session
+        self._update_auth()
 
     @property
     def use_https(self):
@@ -54,17 +157,67 @@ class WVAHttpClient(object):
 
     @use_https.setter
     def use_https(self, use_https):
-        self._use_https = use_https
-        self._session = None
+        self._use_https = use_https  # adapters are mounted for both schemes
+
+    @property
+    def timeout(self):
+        """Timeout applied to requests, as a number or ``(connect, read)`` tuple"""
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, timeout):
+        self._timeout = timeout
+
+    @property
+    def json_decoder(self):
+        """The decoder used for JSON documents received from the WVA
+
+        See :mod:`wva.decoders` for details on the available backends.
+        """
+        return self._json_decoder
+
+    @property
+    def metrics(self):
+        """The :class:`wva.metrics.WVAMetrics` in which requests are recorded (or None)"""
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, metrics):
+        self._metrics = metrics
+
+    @property
+    def response_cache(self):
+        """The :class:`wva.cache.WVAResponseCache` used for GET requests (or None)"""
+        return self._response_cache
+
+    @response_cache.setter
+    def response_cache(self, response_cache):
+        self._response_cache = response_cache
+
+    def _update_auth(self):
+        # Credentials are sent with each request, so pooled connections remain usable
+        session = self._session
+        if session is not None:
+            session.auth = (self._username, self._password)
+
+    def _create_adapter(self):
+        retry = _create_retry(self._max_retries, self._backoff_factor)
+        adapter_class = _UnverifiedHTTPAdapter if self._verify is False else HTTPAdapter
+        return adapter_class(pool_connections=1, pool_maxsize=self._pool_maxsize, max_retries=retry)
 
     def _get_session(self):
         if self._session is None:
-            self._session = requests.Session()
-            self._session.auth = (self._username, self._password)
-            self._session.verify = False  # self-signed certificate
-            self._session.headers.update({
+            session = requests.Session()
+            session.auth = (self._username, self._password)
+            session.verify = self._verify
+            session.headers.update({
                 'Accept': 'application/json',
             })
+            if not self._keep_alive:
+                session.headers['Connection'] = 'close'
+            session.mount("https://", self._create_adapter())
+            session.mount("http://", self._create_adapter())
+            self._session = session
         return self._session
 
     def _get_ws_url(self, uri):
@@ -85,16 +238,23 @@ class WVAHttpClient(object):
         :raises WVAHttpSocketError: if there was an error making the HTTP request.  That is,
             the request was unable to make it to the WVA for some reason.
         """
-        with warnings.catch_warnings():  # catch warning about certs not being verified
-            warnings.simplefilter("ignore", urllib3.exceptions.InsecureRequestWarning)
-            warnings.simplefilter("ignore", urllib3.exceptions.InsecurePlatformWarning)
-            try:
-                response = self._get_session().request(method, self._get_ws_url(uri), **kwargs)
-            except requests.RequestException as e:
-                # e.g. raise new_exc from old_exc
-                six.raise_from(WVAHttpRequestError(e), e)
-            else:
-                return response
+        kwargs.setdefault("timeout", self._timeout)
+        metrics = self._metrics
+        if metrics is not None:
+            start = time.time()
+            status = STATUS_ERROR
+        try:
+            response = self._get_session().request(method, self._get_ws_url(uri), **kwargs)
+            if metrics is not None:
+                status = response.status_code
+        except requests.RequestException as e:
+            # e.g. raise new_exc from old_exc
+            six.raise_from(WVAHttpRequestError(e), e)
+        else:
+            return response
+        finally:
+            if metrics is not None:
+                metrics.record_request(method, uri, status, time.time() - start)
 
     def request(self, method, uri, **kwargs):
         """Perform a WVA web services request and return the decoded value if successful
@@ -108,17 +268,46 @@ class WVAHttpClient(object):
         :return: If the response content type is JSON, it will be deserialized and a
             python dictionary containing the information from the json document will
             be returned.  If not a JSON response, a unicode string of the response
-            text will be returned.
+            text will be returned.  When a response cache is configured, GET
+            requests may be answered from the cache (see :mod:`wva.cache`).
         """
-        response = self.raw_request(method, uri, **kwargs)
+        cache = self._response_cache
+        cacheable = cache is not None and method == "GET" and not kwargs.get("params")
+        entry = None
+        if cacheable:
+            entry = cache.lookup(method, uri)
+            if entry is not None:
+                if entry.is_fresh(time.time()):
+                    cache.record_hit()
+                    return entry.value
+                headers = dict(kwargs.get("headers") or {})
+                headers.update(entry.get_conditional_headers())
+                kwargs["headers"] = headers
+
+        try:
+            response = self.raw_request(method, uri, **kwargs)
+        finally:
+            if cache is not None and method != "GET":
+                cache.invalidate(uri)
+
+        if response.status_code == 304 and entry is not None:
+            cache.refresh(entry, uri)
+            return entry.value
+
         if response.status_code != 200:
             exception_class = HTTP_STATUS_EXCEPTION_MAP.get(response.status_code, WVAHttpError)
             raise exception_class(response)
 
         if response.headers.get("content-type") == "application/json":
-            return json.loads(response.text)
+            value = self._json_decoder.loads(response.content)
         else:
-            return response.text
+            value = response.text
+
+        if cacheable:
+            cache.store(method, uri, value,
+                        etag=response.headers.get("ETag"),
+                        last_modified=response.headers.get("Last-Modified"))
+        return value
 
     def delete(self, uri, **kwargs):
         """DELETE the specified web service path
@@ -0,0 +1,256 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+import heapq
+import logging
+import socket
+import threading
+import time
+
+from six.moves import queue
+from wva.stream import EVENT_STREAM_STATE_CONNECTED
+
+try:
+    import selectors
+except ImportError:  # python < 3.4
+    try:
+        import selectors34 as selectors
+    except ImportError:
+        raise ImportError("wva.hub requires the selectors34 package on Python < 3.4")
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECT_WORKERS = 4
+SELECT_TIMEOUT = 1.0
+BATCH_FLUSH_INTERVAL = 0.5
+
+
+class WVAEventStreamHub(object):
+    """Service the event streams of many WVA devices from a single thread
+
+    By default, each enabled :class:`wva.stream.WVAEventStream` starts its own
+    listener thread.  When working with a large number of devices, streams may
+    instead be attached to a shared hub which registers every connected event
+    socket with a single selector (epoll/kqueue where available) and only
+    reads from sockets which have data waiting.  Establishing a connection
+    requires blocking web services calls, so these are performed by a small
+    pool of connect worker threads.  Example::
+
+        hub = WVAEventStreamHub()
+        hub.start()
+        for wva in wvas:
+            stream = wva.get_event_stream()
+            stream.add_event_listener(callback)
+            stream.enable(hub=hub)
+
+    Each stream still has its own connecting/connected state machine, which
+    may be queried with :meth:`wva.stream.WVAEventStream.get_status`.  Events
+    for all devices are emitted on the hub thread, so listeners should avoid
+    blocking.
+
+    Failed connections are retried (and lost connections reestablished)
+    according to each stream's :class:`wva.stream.WVAReconnectPolicy`.
+    """
+
+    def __init__(self, connect_workers=DEFAULT_CONNECT_WORKERS):
+        self._connect_workers = connect_workers
+        self._lock = threading.RLock()
+        self._connections = set()
+        self._connect_queue = queue.Queue()
+
+        # Connections are handed over to the hub thread through these lists
+        # (guarded by _lock) as only the hub thread may touch the selector
+        self._connected = []
+        self._failed = []
+        self._removed = []
+
+        # The following are only accessed from the hub thread
+        self._registered = set()
+        self._retries = []  # heap of (retry time, sequence, connection)
+        self._retry_seq = 0
+
+        self._selector = None
+        self._wakeup_recv = None
+        self._wakeup_send = None
+        self._threads = []
+        self._stop_requested = False
+
+    def start(self):
+        """Start the hub thread and the connect worker threads"""
+        with self._lock:
+            if self._threads:
+                return
+
+            self._stop_requested = False
+            self._selector = selectors.DefaultSelector()
+            self._wakeup_recv, self._wakeup_send = socket.socketpair()
+            self._wakeup_recv.setblocking(False)
+            self._wakeup_send.setblocking(False)
+            self._selector.register(self._wakeup_recv, selectors.EVENT_READ, None)
+
+            self._threads.append(threading.Thread(target=self._run, name="WVAEventStreamHub"))
+            for i in range(self._connect_workers):
+                self._threads.append(threading.Thread(
+                    target=self._connect_worker, name="WVAEventStreamHubConnect-{}".format(i)))
+            for thread in self._threads:
+                thread.setDaemon(True)
+                thread.start()
+
+    def stop(self):
+        """Stop all hub threads and close the sockets of all attached streams"""
+        with self._lock:
+            if not self._threads:
+                return
+            threads = self._threads
+            self._threads = []
+            self._stop_requested = True
+            for _ in range(self._connect_workers):
+                self._connect_queue.put(None)
+            self._wake()
+
+        for thread in threads:
+            thread.join()
+
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._registered.clear()
+            self._retries = []
+            self._selector.close()
+            self._wakeup_recv.close()
+            self._wakeup_send.close()
+            self._wakeup_recv = self._wakeup_send = None
+
+    def add_connection(self, connection):
+        """Begin servicing the provided :class:`wva.stream.WVAEventConnection`
+
+        This is called by :meth:`wva.stream.WVAEventStream.enable` and does
+        not usually need to be called directly.
+        """
+        with self._lock:
+            self._connections.add(connection)
+            self._connect_queue.put(connection)
+
+    def remove_connection(self, connection):
+        """Stop servicing the provided connection and close its socket"""
+        with self._lock:
+            self._connections.discard(connection)
+            self._removed.append(connection)
+            self._wake()
+
+    def get_connection_count(self):
+        """Return the number of connections currently attached to this hub"""
+        with self._lock:
+            return len(self._connections)
+
+    def _wake(self):
+        # Interrupt the select() call in the hub thread
+        if self._wakeup_send is not None:
+            try:
+                self._wakeup_send.send(b'\0')
+            except socket.error:
+                pass  # buffer is full, so the hub will wake up anyhow
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_recv.recv(4096):
+                pass
+        except socket.error:
+            pass
+
+    def _connect_worker(self):
+        while True:
+            connection = self._connect_queue.get()
+            if connection is None:
+                return
+
+            with self._lock:
+                if connection not in self._connections:
+                    continue
+
+            connected = connection.connect()
+            with self._lock:
+                if connected:
+                    self._connected.append(connection)
+                else:
+                    self._failed.append(connection)
+                self._wake()
+
+    def _process_handoffs(self):
+        with self._lock:
+            removed, self._removed = self._removed, []
+            connected, self._connected = self._connected, []
+            failed, self._failed = self._failed, []
+            active = set(self._connections)
+
+        for connection in removed:
+            if connection in self._registered:
+                self._registered.discard(connection)
+                self._selector.unregister(connection)
+            connection.close()
+
+        for connection in connected:
+            if connection in active:
+                self._selector.register(connection, selectors.EVENT_READ, connection)
+                self._registered.add(connection)
+            else:
+                connection.close()
+
+        for connection in failed:
+            self._schedule_connect(connection)
+
+    def _schedule_connect(self, connection):
+        # Called from the hub thread only
+        delay = connection.get_reconnect_delay()
+        if delay <= 0:
+            self._connect_queue.put(connection)
+        else:
+            self._retry_seq += 1
+            heapq.heappush(self._retries, (time.time() + delay, self._retry_seq, connection))
+
+    def _process_retries(self):
+        now = time.time()
+        while self._retries and self._retries[0][0] <= now:
+            _, _, connection = heapq.heappop(self._retries)
+            self._connect_queue.put(connection)  # skipped by the worker if since removed
+
+    def _service(self, key):
+        connection = key.data
+        connection.receive()
+        if connection.get_state() != EVENT_STREAM_STATE_CONNECTED:
+            # The socket has been closed, so reconnect (as the listener thread would)
+            self._selector.unregister(key.fileobj)
+            self._registered.discard(connection)
+            with self._lock:
+                if connection in self._connections:
+                    self._schedule_connect(connection)
+
+    def _run(self):
+        last_flush = time.time()
+        while not self._stop_requested:
+            timeout = SELECT_TIMEOUT
+            if self._retries:
+                timeout = max(0, min(timeout, self._retries[0][0] - time.time()))
+
+            for key, _mask in self._selector.select(timeout):
+                if key.data is None:
+                    self._drain_wakeup()
+                else:
+                    # noinspection PyBroadException
+                    try:
+                        self._service(key)
+                    except:
+                        logger.exception("Unexpected exception servicing event stream")
+
+            self._process_handoffs()
+            self._process_retries()
+
+            now = time.time()
+            if now - last_flush >= BATCH_FLUSH_INTERVAL:
+                # deliver interval batches for streams that have gone quiet
+                last_flush = now
+                for connection in self._registered:
+                    connection.event_stream.flush_batches()
@@ -0,0 +1,245 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+"""Opt-in instrumentation of web services requests and the event stream
+
+Metrics are only collected when a :class:`WVAMetrics` instance is provided,
+so there is no cost otherwise::
+
+    metrics = WVAMetrics(labels={"device": "truck42"})
+    wva = WVA("192.168.100.1", "user", "pass", metrics=metrics)
+    ...
+    print(metrics.as_dict())
+    print(metrics.to_prometheus())
+
+The following are collected:
+
+- web services requests: count and latency histogram by method, URI
+  template (e.g. ``vehicle/data/{element}``) and status code (``error``
+  if no response was received)
+- event stream: bytes and events received, time spent parsing, time
+  spent in each event listener, number of reconnects and time spent in
+  each ``EVENT_STREAM_STATE_*`` (accumulated on each state change)
+
+A single instance may be shared by many devices, in which case values are
+aggregated across them; use one instance per device with a ``device``
+label to tell them apart.
+"""
+import bisect
+import fnmatch
+import threading
+
+# Upper bounds (in seconds) of the histogram buckets
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Patterns (matched with fnmatch, in order) used to group request URIs
+DEFAULT_URI_TEMPLATES = (
+    ("vehicle/data/*", "vehicle/data/{element}"),
+    ("vehicle/ecus/*/*", "vehicle/ecus/{ecu}/{element}"),
+    ("vehicle/ecus/*", "vehicle/ecus/{ecu}"),
+    ("subscriptions/*", "subscriptions/{short_name}"),
+    ("alarms/*", "alarms/{short_name}"),
+    ("files/*", "files/{path}"),
+)
+
+STATUS_ERROR = "error"
+
+
+class _Histogram(object):
+    """Cumulative histogram with fixed bucket bounds"""
+
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last bucket is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self):
+        result, running = [], 0
+        for count in self.counts:
+            running += count
+            result.append(running)
+        return result
+
+    def to_dict(self):
+        cumulative = self.cumulative()
+        buckets = dict((repr(bound), cumulative[i]) for i, bound in enumerate(self.bounds))
+        buckets["+Inf"] = cumulative[-1]
+        return {"count": self.count, "sum": self.total, "buckets": buckets}
+
+
+def _callback_name(callback):
+    name = getattr(callback, "__qualname__", None) or getattr(callback, "__name__", None)
+    if name is None:
+        return repr(callback)
+    module = getattr(callback, "__module__", None)
+    return "{}.{}".format(module, name) if module else name
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class WVAMetrics(object):
+    """Thread-safe collection of counters and timings for a WVA
+
+    :param labels: Dictionary of labels added to every exported value
+        (e.g. ``{"device": "truck42"}``)
+    :param buckets: Upper bounds (seconds) of the latency histogram buckets
+    :param uri_templates: Sequence of ``(pattern, template)`` pairs used to
+        group request URIs; URIs matching no pattern are used as-is
+    """
+
+    def __init__(self, labels=None, buckets=DEFAULT_LATENCY_BUCKETS, uri_templates=DEFAULT_URI_TEMPLATES):
+        self._labels = dict(labels or {})
+        self._buckets = tuple(buckets)
+        self._uri_templates = tuple(uri_templates)
+        self._template_cache = {}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Set all metrics back to zero"""
+        with self._lock:
+            self._requests = {}  # (method, template, status) -> _Histogram
+            self._stream_bytes = 0
+            self._stream_events = 0
+            self._parse_seconds = 0.0
+            self._listeners = {}  # callback name -> _Histogram
+            self._reconnects = 0
+            self._state_seconds = {}
+
+    def get_uri_template(self, uri):
+        """Return the template used to group requests for ``uri``"""
+        try:
+            return self._template_cache[uri]
+        except KeyError:
+            pass
+        path = uri.strip("/").split("?")[0]
+        template = path
+        for pattern, candidate in self._uri_templates:
+            if fnmatch.fnmatch(path, pattern):
+                template = candidate
+                break
+        if len(self._template_cache) < 10000:
+            self._template_cache[uri] = template
+        return template
+
+    def record_request(self, method, uri, status, seconds):
+        """Record a web services request which took ``seconds`` to complete"""
+        key = (method, self.get_uri_template(uri), str(status))
+        with self._lock:
+            histogram = self._requests.get(key)
+            if histogram is None:
+                histogram = self._requests[key] = _Histogram(self._buckets)
+            histogram.observe(seconds)
+
+    def record_received(self, nbytes, parse_seconds, events):
+        """Record data read from the event stream and the events parsed from it"""
+        with self._lock:
+            self._stream_bytes += nbytes
+            self._parse_seconds += parse_seconds
+            self._stream_events += events
+
+    def record_listener(self, callback, seconds):
+        """Record the time taken by an event listener to handle one event"""
+        name = _callback_name(callback)
+        with self._lock:
+            histogram = self._listeners.get(name)
+            if histogram is None:
+                histogram = self._listeners[name] = _Histogram(self._buckets)
+            histogram.observe(seconds)
+
+    def record_state(self, state, seconds, reconnect=False):
+        """Record ``seconds`` spent in an event stream state
+
+        :param reconnect: True if leaving the state is due to losing an
+            established connection
+        """
+        with self._lock:
+            self._state_seconds[state] = self._state_seconds.get(state, 0.0) + seconds
+            if reconnect:
+                self._reconnects += 1
+
+    def as_dict(self):
+        """Return a snapshot of all metrics as a dictionary"""
+        with self._lock:
+            return {
+                "labels": dict(self._labels),
+                "requests": [
+                    dict(method=method, uri=template, status=status, **histogram.to_dict())
+                    for (method, template, status), histogram in sorted(self._requests.items())
+                ],
+                "stream": {
+                    "bytes_received": self._stream_bytes,
+                    "events_received": self._stream_events,
+                    "parse_seconds": self._parse_seconds,
+                    "reconnects": self._reconnects,
+                    "state_seconds": dict(self._state_seconds),
+                    "listeners": dict((name, histogram.to_dict())
+                                      for name, histogram in self._listeners.items()),
+                },
+            }
+
+    def _format_labels(self, extra=()):
+        items = sorted(self._labels.items()) + list(extra)
+        if not items:
+            return ""
+        return "{" + ",".join('{}="{}"'.format(k, _escape_label(v)) for k, v in items) + "}"
+
+    def _histogram_lines(self, name, extra, histogram):
+        cumulative = histogram.cumulative()
+        lines = []
+        for i, bound in enumerate(self._buckets):
+            lines.append("{}_bucket{} {}".format(name, self._format_labels(extra + [("le", repr(bound))]),
+                                                 cumulative[i]))
+        lines.append("{}_bucket{} {}".format(name, self._format_labels(extra + [("le", "+Inf")]), cumulative[-1]))
+        lines.append("{}_sum{} {!r}".format(name, self._format_labels(extra), histogram.total))
+        lines.append("{}_count{} {}".format(name, self._format_labels(extra), histogram.count))
+        return lines
+
+    def to_prometheus(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            lines = [
+                "# HELP wva_http_request_duration_seconds Duration of WVA web services requests",
+                "# TYPE wva_http_request_duration_seconds histogram",
+            ]
+            for (method, template, status), histogram in sorted(self._requests.items()):
+                extra = [("method", method), ("uri", template), ("status", status)]
+                lines.extend(self._histogram_lines("wva_http_request_duration_seconds", extra, histogram))
+
+            for name, kind, help_text, value in (
+                    ("wva_stream_bytes_received_total", "counter", "Bytes received on the event stream",
+                     self._stream_bytes),
+                    ("wva_stream_events_received_total", "counter", "Events received on the event stream",
+                     self._stream_events),
+                    ("wva_stream_parse_seconds_total", "counter", "Time spent parsing the event stream",
+                     self._parse_seconds),
+                    ("wva_stream_reconnects_total", "counter", "Connections to the event stream lost",
+                     self._reconnects)):
+                lines.append("# HELP {} {}".format(name, help_text))
+                lines.append("# TYPE {} {}".format(name, kind))
+                lines.append("{}{} {!r}".format(name, self._format_labels(), value))
+
+            lines.append("# HELP wva_stream_state_seconds_total Time spent in each event stream state")
+            lines.append("# TYPE wva_stream_state_seconds_total counter")
+            for state, seconds in sorted(self._state_seconds.items()):
+                lines.append("wva_stream_state_seconds_total{} {!r}".format(
+                    self._format_labels([("state", state)]), seconds))
+
+            lines.append("# HELP wva_stream_listener_duration_seconds Time spent in event listeners")
+            lines.append("# TYPE wva_stream_listener_duration_seconds histogram")
+            for name, histogram in sorted(self._listeners.items()):
+                lines.extend(self._histogram_lines("wva_stream_listener_duration_seconds",
+                                                   [("listener", name)], histogram))
+        return "\n".join(lines) + "\n"
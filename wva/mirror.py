@@ -0,0 +1,127 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+"""Local mirror of vehicle data kept current by the event stream"""
+import threading
+import time
+
+DEFAULT_MIRROR_INTERVAL = 1
+DEFAULT_MAX_AGE = 10.0
+DEFAULT_SHORT_NAME_PREFIX = "mirror_"
+
+
+class VehicleStateMirror(object):
+    """Keep the latest sample of a set of vehicle data elements in memory
+
+    Sampling a vehicle data element with
+    :meth:`wva.vehicle.VehicleDataElement.sample` requires a web services
+    request.  A mirror instead subscribes to the elements of interest and
+    records each value pushed over the event stream, so that reading the
+    current value is a dictionary lookup::
+
+        mirror = VehicleStateMirror(wva, ["VehicleSpeed", "EngineSpeed"])
+        mirror.start()
+        ...
+        speed = mirror.get("VehicleSpeed")
+        print("Speed: %0.2f @ %s" % (speed.value, speed.timestamp))
+        ...
+        mirror.stop()
+
+    If no event has been received for an element within ``max_age`` seconds
+    (measured by the local clock when events arrive), :meth:`get` falls back
+    to sampling the element over web services and records that sample in
+    the mirror.
+
+    :param wva: The :class:`wva.WVA` to mirror
+    :param elements: Names of the vehicle data elements to mirror
+    :param interval: Subscription interval in seconds
+    :param max_age: Seconds after which a mirrored sample is considered
+        stale, or None if samples never become stale
+    :param short_name_prefix: Prefix for the short names of the
+        subscriptions created for the mirror
+    """
+
+    def __init__(self, wva, elements, interval=DEFAULT_MIRROR_INTERVAL, max_age=DEFAULT_MAX_AGE,
+                 short_name_prefix=DEFAULT_SHORT_NAME_PREFIX):
+        self._wva = wva
+        self._elements = tuple(elements)
+        self._interval = interval
+        self._max_age = max_age
+        self._short_name_prefix = short_name_prefix
+        self._samples = {}  # element name -> (local receive time, VehicleDataSample)
+        self._lock = threading.Lock()
+        self._running = False
+
+    @property
+    def elements(self):
+        return self._elements
+
+    def _get_short_name(self, element):
+        return "{}{}".format(self._short_name_prefix, element)
+
+    def start(self):
+        """Create the subscriptions for the mirrored elements and enable the event stream"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+
+        stream = self._wva.get_event_stream()
+        for element in self._elements:
+            stream.add_event_listener(self._on_event, element=element, typed=True)
+        for element in self._elements:
+            self._wva.get_subscription(self._get_short_name(element)).create(
+                "vehicle/data/{}".format(element), buffer="discard", interval=self._interval)
+        stream.enable()
+
+    def stop(self, delete_subscriptions=True):
+        """Stop updating the mirror
+
+        The event stream is left enabled as it may be used by other listeners.
+
+        :param delete_subscriptions: If True, the subscriptions created by
+            :meth:`start` are deleted from the WVA
+        """
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+
+        try:
+            self._wva.get_event_stream().remove_event_listener(self._on_event)
+        except KeyError:
+            pass
+        if delete_subscriptions:
+            for element in self._elements:
+                self._wva.get_subscription(self._get_short_name(element)).delete()
+
+    def _on_event(self, event):
+        self._samples[event.element] = (time.time(), event.to_sample())
+
+    def get(self, name, max_age=None):
+        """Return the latest :class:`wva.vehicle.VehicleDataSample` for an element
+
+        :param name: The name of the vehicle data element
+        :param max_age: Overrides the ``max_age`` of the mirror for this call
+        :raises WVAError: if the sample is stale and sampling the element fails
+        """
+        if max_age is None:
+            max_age = self._max_age
+        entry = self._samples.get(name)
+        if entry is not None and (max_age is None or time.time() - entry[0] <= max_age):
+            return entry[1]
+
+        sample = self._wva.get_vehicle_data_element(name).sample()
+        self._samples[name] = (time.time(), sample)
+        return sample
+
+    def get_all(self):
+        """Return a dictionary of the latest samples held by the mirror (without sampling)"""
+        return dict((name, entry[1]) for name, entry in list(self._samples.items()))
+
+    def get_age(self, name):
+        """Return the seconds since the sample for ``name`` was received (or None)"""
+        entry = self._samples.get(name)
+        return None if entry is None else time.time() - entry[0]
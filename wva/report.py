@@ -0,0 +1,241 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+"""Headless graphs and summary statistics of event stream data
+
+Unlike :class:`wva.grapher.WVAStreamGrapher`, a :class:`WVAStreamReport`
+does not require a display.  It records the vehicle data received for a
+set of elements and writes the result to an image (PNG, SVG or any other
+format supported by matplotlib) using the Agg renderer, along with summary
+statistics::
+
+    report = WVAStreamReport(["VehicleSpeed", "EngineSpeed"])
+    stream = wva.get_event_stream()
+    stream.enable()
+    report.record(stream, seconds=600)
+    report.render("trip.png")
+    report.write_summary("trip.json")
+
+Summary statistics and the data to plot are updated as each event
+arrives, so rendering does not revisit every sample received.  At most
+``capacity`` points are kept per item: when a recording holds more samples
+than that, they are averaged into progressively wider time buckets, so the
+plot always covers the whole recording.  Plotted lines are further reduced
+to the pixel width of the image before being drawn.  This module requires
+matplotlib and NumPy.
+"""
+import json
+import threading
+import time
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import numpy as np
+from wva.timeseries import TimeSeriesRingBuffer, decimate
+
+DEFAULT_REPORT_CAPACITY = 100000
+DEFAULT_REPORT_SIZE = (12, 6)  # inches
+DEFAULT_REPORT_DPI = 100
+
+
+class _RunningStats(object):
+    """Count, min, max and mean of a series of values without storing them"""
+
+    __slots__ = ("count", "minimum", "maximum", "total", "first", "last")
+
+    def __init__(self):
+        self.count = 0
+        self.minimum = float("inf")
+        self.maximum = float("-inf")
+        self.total = 0.0
+        self.first = None
+        self.last = None
+
+    def add(self, epoch, value):
+        self.count += 1
+        self.total += value
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+        if self.first is None:
+            self.first = epoch
+        self.last = epoch
+
+    def to_dict(self):
+        if not self.count:
+            return {"count": 0, "min": None, "max": None, "mean": None, "first": None, "last": None}
+        return {
+            "count": self.count,
+            "min": self.minimum,
+            "max": self.maximum,
+            "mean": self.total / self.count,
+            "first": self.first,
+            "last": self.last,
+        }
+
+
+class _PlotSeries(object):
+    """Points to plot for one item, reduced as samples arrive to fit a fixed capacity
+
+    Samples are stored as received until the buffer is full.  From then on,
+    the buffer holds the mean of buckets of ``interval`` seconds; whenever
+    it fills up again the stored points are merged into buckets at least
+    twice as wide.
+    """
+
+    __slots__ = ("buffer", "interval", "_bucket_start", "_bucket_total", "_bucket_count")
+
+    def __init__(self, capacity):
+        self.buffer = TimeSeriesRingBuffer(capacity)
+        self.interval = 0.0  # width of the buckets stored (0 while samples are stored as received)
+        self._bucket_start = None
+        self._bucket_total = 0.0
+        self._bucket_count = 0
+
+    def add(self, epoch, value):
+        if self._bucket_start is not None and epoch < self._bucket_start + self.interval:
+            self._bucket_total += value
+            self._bucket_count += 1
+            return
+        self._flush_bucket()
+        if len(self.buffer) == self.buffer.capacity:
+            self._compact()
+        if self.interval:
+            self._bucket_start, self._bucket_total, self._bucket_count = epoch, value, 1
+        else:
+            self.buffer.append(epoch, value)
+
+    def _flush_bucket(self):
+        if self._bucket_count:
+            if len(self.buffer) == self.buffer.capacity:
+                self._compact()
+            self.buffer.append(self._bucket_start, self._bucket_total / self._bucket_count)
+        self._bucket_start, self._bucket_total, self._bucket_count = None, 0.0, 0
+
+    def _compact(self):
+        times, values = self.buffer.window()
+        span = times[-1] - times[0]
+        # buckets wide enough that the stored points fill at most half the buffer
+        self.interval = max(self.interval * 2, 2.0 * span / self.buffer.capacity) or 1.0
+        times, values = self.buffer.downsample(self.interval)
+        self.buffer.clear()
+        for epoch, value in zip(times, values):
+            self.buffer.append(epoch, value)
+
+    def points(self):
+        """Return ``(times, values)`` of the points to plot, including the bucket in progress"""
+        times, values = self.buffer.window()
+        if self._bucket_count:
+            times = np.append(times, self._bucket_start)
+            values = np.append(values, self._bucket_total / self._bucket_count)
+        return times, values
+
+
+class WVAStreamReport(object):
+    """Record vehicle data for a set of elements and export graphs and statistics
+
+    :param items: Names of the vehicle data elements to record
+    :param capacity: Maximum number of points per element kept for the plot;
+        longer recordings are averaged over time to fit (see above)
+    :param size: Size of the rendered figure in inches, as ``(width, height)``
+    :param dpi: Resolution of raster images in dots per inch
+    """
+
+    def __init__(self, items, capacity=DEFAULT_REPORT_CAPACITY, size=DEFAULT_REPORT_SIZE,
+                 dpi=DEFAULT_REPORT_DPI):
+        self.items = tuple(items)
+        self._size = size
+        self._dpi = dpi
+        self._stats = dict((item, _RunningStats()) for item in self.items)
+        self._series = dict((item, _PlotSeries(capacity)) for item in self.items)
+        self._lock = threading.Lock()
+        self._event_stream = None
+
+    def attach(self, event_stream):
+        """Start recording events for the report's items from the provided stream"""
+        self.detach()
+        self._event_stream = event_stream
+        for item in self.items:
+            event_stream.add_event_listener(self._on_event, element=item, typed=True)
+
+    def detach(self):
+        """Stop recording events"""
+        if self._event_stream is not None:
+            try:
+                self._event_stream.remove_event_listener(self._on_event)
+            except KeyError:
+                pass
+            self._event_stream = None
+
+    def record(self, event_stream, seconds):
+        """Record events from an (enabled) event stream for the given number of seconds"""
+        self.attach(event_stream)
+        try:
+            time.sleep(seconds)
+        finally:
+            self.detach()
+
+    def _on_event(self, event):
+        try:
+            value = float(event.value)
+        except (TypeError, ValueError):
+            return
+        epoch = event.epoch
+        if epoch is not None:
+            self.add_sample(event.element, epoch, value)
+
+    def add_sample(self, item, epoch, value):
+        """Record a sample for one of the report's items"""
+        stats = self._stats.get(item)
+        if stats is None:
+            return
+        with self._lock:
+            stats.add(epoch, value)
+            self._series[item].add(epoch, value)
+
+    def get_summary(self):
+        """Return a dictionary mapping each item to its summary statistics
+
+        Each value is a dictionary with the ``count``, ``min``, ``max`` and
+        ``mean`` of the values received and the epoch of the ``first`` and
+        ``last`` samples.
+        """
+        with self._lock:
+            return dict((item, stats.to_dict()) for item, stats in self._stats.items())
+
+    def write_summary(self, path):
+        """Write the summary statistics to a file as JSON"""
+        with open(path, "w") as f:
+            json.dump(self.get_summary(), f, indent=2, sort_keys=True)
+
+    def render(self, path, title="WVA Vehicle Data"):
+        """Plot the recorded data and save it to ``path``
+
+        The format of the image is taken from the extension of the path
+        (e.g. ``.png`` or ``.svg``).  The x axis is seconds since the first
+        sample recorded for any item.
+        """
+        fig = Figure(figsize=self._size, dpi=self._dpi)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(1, 1, 1)
+        ax.set_title(title)
+        ax.set_xlabel("Seconds")
+        ax.set_ylabel("Value")
+
+        firsts = [stats["first"] for stats in self.get_summary().values() if stats["first"] is not None]
+        origin = min(firsts) if firsts else 0.0
+        max_points = 2 * int(self._size[0] * self._dpi)
+        for item in self.items:
+            with self._lock:
+                times, values = self._series[item].points()
+            if not len(times):
+                continue
+            x, y = decimate(times, values, max_points)
+            ax.plot(np.asarray(x) - origin, y, label=item)
+
+        if ax.lines:
+            ax.legend()
+        fig.savefig(path)
@@ -0,0 +1,387 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+"""A local simulation of a WVA for load testing and benchmarking
+
+The simulator implements enough of the WVA web services and event stream
+for this library to be used against it without hardware:
+
+- ``GET /ws/vehicle/data`` and ``GET /ws/vehicle/data/<element>``
+- ``GET /ws/subscriptions``, and ``GET``, ``PUT`` and ``DELETE`` of
+  ``/ws/subscriptions/<short_name>``
+- ``GET`` and ``PUT /ws/config/ws_events``
+- a TCP event port which sends an event to every connected client each
+  time a subscription's interval elapses.  Clients that fall more than
+  ``CLIENT_MAX_BACKLOG`` bytes behind are disconnected.
+
+Web services are served over plain HTTP on a local port, so the simulated
+device is used as follows::
+
+    simulator = WVASimulator(elements=200, event_interval=0.01)
+    simulator.start()
+    wva = WVA(simulator.hostname, "user", "pass", use_https=False)
+    ...
+    simulator.stop()
+
+or from the command line with ``wva-simulator --elements 200``.  Values
+follow a sine wave with a different period for each element.  Credentials
+are not checked.
+"""
+import errno
+import json
+import math
+import re
+import socket
+import threading
+import time
+
+import click
+from six.moves import BaseHTTPServer, socketserver
+import six.moves.urllib.parse as urllib_parse
+
+DEFAULT_ELEMENTS = ("VehicleSpeed", "EngineSpeed", "FuelRate", "TripDistance", "ParkingBrake",
+                    "AccelPedalPosition", "ThrottlePosition", "EngineCoolantTemp")
+EMITTER_MAX_SLEEP = 0.05
+CLIENT_MAX_BACKLOG = 1024 * 1024
+
+_SUBSCRIPTION_PATH_RE = re.compile(r"^/ws/subscriptions/([^/]+)$")
+_ELEMENT_PATH_RE = re.compile(r"^/ws/vehicle/data/([^/]+)$")
+
+
+def _format_timestamp(epoch):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(epoch))
+
+
+class _SimulatorHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _SimulatorRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body are written separately
+
+    def log_message(self, *args):
+        pass  # requests are far too frequent to log
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        data = self.rfile.read(length).decode('utf-8') if length else ""
+        if not data:
+            return None
+        if "json" in (self.headers.get("Content-Type") or ""):
+            return json.loads(data)
+        return dict((k, v[0]) for k, v in urllib_parse.parse_qs(data).items())  # form encoded
+
+    def _respond(self, status, document=None):
+        body = b"" if document is None else json.dumps(document).encode('utf-8')
+        self.send_response(status)
+        if document is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method):
+        try:
+            body = self._read_body() if method in ("PUT", "POST") else None
+        except ValueError:
+            return self._respond(400)
+        status, document = self.server.simulator.handle_request(method, self.path.split("?")[0], body)
+        self._respond(status, document)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+class WVASimulator(object):
+    """Simulated WVA serving web services and the event stream on local ports
+
+    :param elements: Either the names of the vehicle data elements to
+        simulate or the number of elements (named ``Element0``, ``Element1``
+        and so on)
+    :param host: Address on which to listen
+    :param http_port: Port for web services (0 to pick a free port)
+    :param event_port: Port for the event stream (0 to pick a free port)
+    :param event_interval: If set, every subscription emits an event this
+        often (in seconds) regardless of the interval it was created with,
+        allowing rates beyond one event per second per subscription
+    :param subscribe_all: If True, a subscription is created for every
+        element when the simulator starts
+    """
+
+    def __init__(self, elements=DEFAULT_ELEMENTS, host="127.0.0.1", http_port=0, event_port=0,
+                 event_interval=None, subscribe_all=False):
+        if isinstance(elements, int):
+            elements = ["Element{}".format(i) for i in range(elements)]
+        self._elements = tuple(elements)
+        self._periods = dict((name, 10.0 + i) for i, name in enumerate(self._elements))
+        self._host = host
+        self._http_port = http_port
+        self._event_port = event_port
+        self._event_interval = event_interval
+        self._subscribe_all = subscribe_all
+
+        self._lock = threading.Lock()
+        self._subscriptions = {}  # short_name -> [metadata, next emit time, sequence]
+        self._events_enabled = True
+        self._clients = {}  # socket -> bytearray of data not yet sent
+        self._events_sent = 0
+
+        self._http_server = None
+        self._event_server = None
+        self._threads = []
+        self._stop_requested = False
+
+    @property
+    def elements(self):
+        return self._elements
+
+    @property
+    def hostname(self):
+        """The hostname (including port) to use for :class:`wva.WVA`"""
+        return "{}:{}".format(self._host, self._http_port)
+
+    @property
+    def event_port(self):
+        return self._event_port
+
+    def start(self):
+        """Start serving web services and the event stream"""
+        self._stop_requested = False
+        self._http_server = _SimulatorHTTPServer((self._host, self._http_port), _SimulatorRequestHandler)
+        self._http_server.simulator = self
+        self._http_port = self._http_server.server_address[1]
+
+        self._event_server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._event_server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._event_server.bind((self._host, self._event_port))
+        self._event_server.listen(128)
+        self._event_server.settimeout(EMITTER_MAX_SLEEP)
+        self._event_port = self._event_server.getsockname()[1]
+
+        if self._subscribe_all:
+            for element in self._elements:
+                self._create_subscription("sim_{}".format(element), {
+                    "uri": "vehicle/data/{}".format(element), "buffer": "queue", "interval": 1})
+
+        self._threads = [
+            threading.Thread(target=self._http_server.serve_forever, name="WVASimulatorHTTP"),
+            threading.Thread(target=self._accept_clients, name="WVASimulatorAccept"),
+            threading.Thread(target=self._emit_events, name="WVASimulatorEvents"),
+        ]
+        for thread in self._threads:
+            thread.setDaemon(True)
+            thread.start()
+
+    def stop(self):
+        """Stop the simulator and disconnect all event stream clients"""
+        self._stop_requested = True
+        self._http_server.shutdown()
+        self._event_server.close()
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client in clients:
+            client.close()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._http_server.server_close()
+
+    def get_stats(self):
+        """Return a dictionary with the number of clients and events sent"""
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "subscriptions": len(self._subscriptions),
+                "events_sent": self._events_sent,
+            }
+
+    def sample(self, element, now=None):
+        """Return the simulated ``(timestamp, value)`` of an element"""
+        now = time.time() if now is None else now
+        value = 100.0 + 100.0 * math.sin(2 * math.pi * now / self._periods[element])
+        return _format_timestamp(now), round(value, 6)
+
+    def handle_request(self, method, path, body):
+        """Handle a web services request, returning ``(status, document)``"""
+        path = path.rstrip("/")
+        if path == "/ws/vehicle/data" and method == "GET":
+            return 200, {"data": ["vehicle/data/{}".format(e) for e in self._elements]}
+
+        match = _ELEMENT_PATH_RE.match(path)
+        if match and method == "GET":
+            element = match.group(1)
+            if element not in self._periods:
+                return 404, None
+            timestamp, value = self.sample(element)
+            return 200, {element: {"timestamp": timestamp, "value": value}}
+
+        if path == "/ws/subscriptions" and method == "GET":
+            with self._lock:
+                names = sorted(self._subscriptions)
+            return 200, {"subscriptions": ["subscriptions/{}".format(name) for name in names]}
+
+        match = _SUBSCRIPTION_PATH_RE.match(path)
+        if match:
+            return self._handle_subscription(method, match.group(1), body)
+
+        if path == "/ws/config/ws_events":
+            if method == "GET":
+                return 200, {"ws_events": {"enable": "on" if self._events_enabled else "off",
+                                           "port": self._event_port}}
+            if method == "PUT":
+                settings = body.get("ws_events", body) if isinstance(body, dict) else {}
+                self._events_enabled = settings.get("enable", "on") == "on"
+                return 200, None
+
+        return 404, None
+
+    def _handle_subscription(self, method, short_name, body):
+        if method == "GET":
+            with self._lock:
+                subscription = self._subscriptions.get(short_name)
+            if subscription is None:
+                return 404, None
+            return 200, {"subscription": dict(subscription[0])}
+        elif method == "PUT":
+            try:
+                metadata = body["subscription"]
+                element = metadata["uri"].rsplit("/", 1)[-1]
+            except (KeyError, TypeError, AttributeError):
+                return 400, None
+            if element not in self._periods:
+                return 400, None
+            self._create_subscription(short_name, metadata)
+            return 200, None
+        elif method == "DELETE":
+            with self._lock:
+                if self._subscriptions.pop(short_name, None) is None:
+                    return 404, None
+            return 200, None
+        return 405, None
+
+    def _create_subscription(self, short_name, metadata):
+        metadata = {
+            "uri": metadata["uri"],
+            "buffer": metadata.get("buffer", "queue"),
+            "interval": metadata.get("interval", 10),
+        }
+        with self._lock:
+            self._subscriptions[short_name] = [metadata, time.time(), 0]
+
+    def _accept_clients(self):
+        while not self._stop_requested:
+            try:
+                client, _address = self._event_server.accept()
+            except socket.timeout:
+                continue
+            except socket.error:
+                return  # closed
+            client.setblocking(False)  # a slow client must not stall the others
+            with self._lock:
+                self._clients[client] = bytearray()
+
+    def _emit_events(self):
+        while not self._stop_requested:
+            now = time.time()
+            records = []
+            next_due = now + EMITTER_MAX_SLEEP
+            with self._lock:
+                for short_name, subscription in self._subscriptions.items():
+                    metadata, due, sequence = subscription
+                    if due <= now:
+                        interval = self._event_interval or metadata["interval"]
+                        subscription[1] = max(due + interval, now - interval)
+                        subscription[2] = sequence = sequence + 1
+                        records.append(self._build_event(short_name, metadata["uri"], sequence, now))
+                    next_due = min(next_due, subscription[1])
+                clients = list(self._clients.items()) if self._events_enabled else []
+
+            data = b"".join(records)
+            sent = 0
+            for client, backlog in clients:
+                backlog += data
+                if backlog and self._send_backlog(client, backlog):
+                    sent += 1
+            if records and sent:
+                with self._lock:
+                    self._events_sent += len(records) * sent
+
+            delay = next_due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    def _build_event(self, short_name, uri, sequence, now):
+        element = uri.rsplit("/", 1)[-1]
+        timestamp, value = self.sample(element, now)
+        event = {"data": {
+            element: {"timestamp": timestamp, "value": value},
+            "sequence": sequence,
+            "short_name": short_name,
+            "timestamp": timestamp,
+            "uri": uri,
+        }}
+        return json.dumps(event).encode('utf-8') + b"\r\n"
+
+    def _send_backlog(self, client, backlog):
+        """Send as much of a client's backlog as it will take without blocking
+
+        Returns False (and disconnects the client) if the connection failed or
+        the client has fallen too far behind.
+        """
+        try:
+            sent = client.send(backlog)
+        except socket.error as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                self._drop_client(client)
+                return False
+            sent = 0
+        del backlog[:sent]
+        if len(backlog) > CLIENT_MAX_BACKLOG:
+            self._drop_client(client)
+            return False
+        return True
+
+    def _drop_client(self, client):
+        with self._lock:
+            self._clients.pop(client, None)
+        client.close()
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", help="Address on which to listen")
+@click.option("--http-port", default=8080, help="Port for web services")
+@click.option("--event-port", default=5000, help="Port for the event stream")
+@click.option("--elements", default=None, type=int,
+              help="Number of vehicle data elements to simulate (default: {})".format(", ".join(DEFAULT_ELEMENTS)))
+@click.option("--event-interval", default=None, type=float,
+              help="Seconds between events for every subscription (overrides subscription intervals)")
+@click.option("--subscribe-all/--no-subscribe-all", default=False,
+              help="Subscribe to every element on startup")
+def main(host, http_port, event_port, elements, event_interval, subscribe_all):
+    """Run a simulated WVA for load testing and benchmarks"""
+    simulator = WVASimulator(elements or DEFAULT_ELEMENTS, host=host, http_port=http_port, event_port=event_port,
+                             event_interval=event_interval, subscribe_all=subscribe_all)
+    simulator.start()
+    print("Simulating a WVA at http://{}/ws (event port {})".format(simulator.hostname, simulator.event_port))
+    try:
+        while True:
+            time.sleep(5)
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
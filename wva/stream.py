@@ -4,13 +4,14 @@
 #
 # Copyright (c) 2015 Digi International Inc. All Rights Reserved.
 
-import json
 import logging
 
+import random
 import socket
 import threading
 import time
-import six
+from wva.decoders import get_json_decoder
+from wva.events import VehicleDataEvent
 from wva.exceptions import WVAError
 
 
@@ -23,22 +24,358 @@ EVENT_STREAM_STATE_CONNECTED = "EVENT_STREAM_STATE_CONNECTED"
 DELAY_ON_ERROR = 0.5
 SOCKET_TIMEOUT = 0.5
 
+# Defaults for WVAReconnectPolicy
+DEFAULT_RECONNECT_MAX_DELAY = 60.0
+DEFAULT_RECONNECT_MULTIPLIER = 2.0
+DEFAULT_RECONNECT_JITTER = 0.5
+DEFAULT_RECONNECT_RESET_AFTER = 30.0
+DEFAULT_EVENT_PORT_TTL = 300.0
+
+# Initial and maximum size of the buffer used for receiving data from the
+# event socket.  The buffer grows (doubling in size) up to the maximum when
+# reads fill it completely.
+DEFAULT_RECV_BUFFER_SIZE = 64 * 1024
+MAX_RECV_BUFFER_SIZE = 1024 * 1024
+
+# The WVA separates each event record on the stream with \r\n
+RECORD_SEPARATOR = b'\r\n'
+
+# Consumed bytes are only removed from the front of the parser buffer
+# once at least this much data has been consumed (and at least half the
+# buffer), so compaction cost is amortized across many events.
+COMPACT_THRESHOLD = 64 * 1024
+
+
+class _EventRoutes(object):
+    """Immutable snapshot of the listeners registered with a :class:`WVAEventStream`
+
+    Listeners without a filter are kept in a tuple; filtered listeners are
+    indexed in dictionaries by short name, element name and URI prefix so
+    only the interested listeners are looked up for each event.
+    """
+
+    __slots__ = ('unfiltered', 'by_short_name', 'by_element', 'by_uri_prefix')
+
+    def __init__(self, registrations=()):
+        self.unfiltered = ()
+        self.by_short_name = {}
+        self.by_element = {}
+        self.by_uri_prefix = {}
+        indexes = {
+            "short_name": self.by_short_name,
+            "element": self.by_element,
+            "uri_prefix": self.by_uri_prefix,
+        }
+        for callback, kind, key in registrations:
+            if kind is None:
+                self.unfiltered += (callback,)
+            else:
+                index = indexes[kind]
+                index[key] = index.get(key, ()) + (callback,)
+
+    def match(self, event):
+        """Return the listeners that should receive the provided event"""
+        if not (self.by_short_name or self.by_element or self.by_uri_prefix):
+            return self.unfiltered
+
+        try:
+            data = event["data"]
+            short_name = data.get("short_name")
+            uri = data.get("uri") or ""
+        except (KeyError, TypeError, AttributeError):
+            return self.unfiltered
+
+        matched = [self.unfiltered]
+        if self.by_short_name:
+            matched.append(self.by_short_name.get(short_name, ()))
+        if uri:
+            if self.by_element:
+                matched.append(self.by_element.get(uri.rsplit("/", 1)[-1], ()))
+            if self.by_uri_prefix:
+                end = uri.find("/")
+                while end != -1:
+                    matched.append(self.by_uri_prefix.get(uri[:end], ()))
+                    end = uri.find("/", end + 1)
+                matched.append(self.by_uri_prefix.get(uri, ()))
+
+        matched = [listeners for listeners in matched if listeners]
+        if not matched:
+            return ()
+        elif len(matched) == 1:
+            return matched[0]
+        else:
+            # a callback registered with more than one matching filter is only called once
+            seen = set()
+            return [cb for listeners in matched for cb in listeners if not (cb in seen or seen.add(cb))]
+
+
+class _EventBatcher(object):
+    """Accumulate events for a batch listener and deliver them as lists"""
+
+    def __init__(self, callback, max_events=None, max_interval=None, typed=False):
+        self.callback = callback
+        self._typed = typed
+        self._max_events = max_events
+        self._max_interval = max_interval
+        self._pending = []
+        self._first_time = None
+        self._lock = threading.Lock()
+
+    def _deliver(self, batch):
+        # noinspection PyBroadException
+        try:
+            self.callback(batch)
+        except:
+            logger.exception("Batch event callback resulted in unhandled exception")
+
+    def add(self, events, now):
+        if self._typed:
+            events = [typed for typed in (VehicleDataEvent.from_event(e) for e in events) if typed is not None]
+            if not events:
+                return
+        if self._max_events is None and self._max_interval is None:
+            self._deliver(list(events))  # one batch per group of events received
+            return
+
+        with self._lock:
+            self._pending.extend(events)
+            if self._first_time is None:
+                self._first_time = now
+        self.flush(now, force=False)
+
+    def flush(self, now, force=True):
+        with self._lock:
+            if not self._pending:
+                return
+            if force or (self._max_interval is not None and now - self._first_time >= self._max_interval):
+                pending, self._pending, self._first_time = self._pending, [], None
+            elif self._max_events is not None and len(self._pending) >= self._max_events:
+                # deliver full batches, keeping any remainder pending
+                full = len(self._pending) - len(self._pending) % self._max_events
+                pending, self._pending = self._pending[:full], self._pending[full:]
+                if not self._pending:
+                    self._first_time = None
+            else:
+                return
+
+        size = self._max_events or len(pending)
+        for i in range(0, len(pending), size):
+            self._deliver(pending[i:i + size])
+
+
+def split_hostname(hostname, default_port=None):
+    """Split a WVA hostname into ``(host, port)``
+
+    The hostname used for web services may include a port (e.g. when the
+    WVA is behind a port forward or is a local simulator).  IPv6 addresses
+    must be enclosed in brackets when a port is given (``[fe80::1]:8080``).
+    If there is no port, ``default_port`` is returned in its place.
+    """
+    if hostname.count(":") > 1 and not hostname.startswith("["):
+        return hostname, default_port  # bare IPv6 address
+    host, sep, port = hostname.rpartition(":")
+    if sep and port.isdigit():
+        return host.strip("[]"), int(port)
+    return hostname.strip("[]"), default_port
+
+
+class WVAReconnectPolicy(object):
+    """Exponential backoff with jitter between attempts to connect to the event stream
+
+    After ``n`` consecutive failures, the next attempt is made after
+    ``min(max_delay, initial_delay * multiplier ** (n - 1))`` seconds, less a
+    random fraction (up to ``jitter``) of that delay so that many devices
+    losing connectivity at the same time do not all retry in lockstep.
+
+    A connection which is lost less than ``reset_after`` seconds after being
+    established counts as a failure; otherwise the failure count is reset
+    and reconnecting is attempted after a random fraction (up to ``jitter``)
+    of ``initial_delay``, so that devices dropped together (e.g. by a WVA
+    restart) do not all reconnect at the same moment.
+
+    The event port is normally queried from the WVA (``config/ws_events``)
+    before connecting.  When reconnecting within ``event_port_ttl`` seconds
+    of losing a connection, the port of that connection is reused instead
+    (and forgotten if connecting to it fails).  Set ``event_port_ttl`` to 0
+    to always query the port.
+
+    :raises ValueError: if ``jitter`` is not between 0 and 1
+    """
+
+    def __init__(self, initial_delay=DELAY_ON_ERROR, max_delay=DEFAULT_RECONNECT_MAX_DELAY,
+                 multiplier=DEFAULT_RECONNECT_MULTIPLIER, jitter=DEFAULT_RECONNECT_JITTER,
+                 reset_after=DEFAULT_RECONNECT_RESET_AFTER, event_port_ttl=DEFAULT_EVENT_PORT_TTL):
+        if not 0 <= jitter <= 1:
+            raise ValueError("jitter must be between 0 and 1")
+        self.initial_delay = initial_delay
+        self.max_delay = max(initial_delay, max_delay)
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.reset_after = reset_after
+        self.event_port_ttl = event_port_ttl
+
+    def get_delay(self, failures):
+        """Return the delay (in seconds) before the next attempt after ``failures`` consecutive failures"""
+        if failures <= 0:
+            return self.initial_delay * self.jitter * random.random()
+        delay = self.initial_delay
+        for _ in range(max(0, failures - 1)):
+            delay *= self.multiplier
+            if delay >= self.max_delay:
+                break
+        return min(delay, self.max_delay) * (1.0 - self.jitter * random.random())
+
 
 class WVAEventStream(object):
     """Provide methods for working with the event stream from a WVA Device"""
 
-    def __init__(self, http_client):
+    def __init__(self, http_client, recv_buffer_size=DEFAULT_RECV_BUFFER_SIZE,
+                 max_recv_buffer_size=MAX_RECV_BUFFER_SIZE, dispatcher=None, metrics=None,
+                 reconnect_policy=None):
         self._http_client = http_client
-        self._event_listeners = set()
+        self._recv_buffer_size = recv_buffer_size
+        self._max_recv_buffer_size = max(recv_buffer_size, max_recv_buffer_size)
+        self._registrations = ()  # (callback, filter kind, filter key, typed) tuples
+        self._routes = _EventRoutes()  # immutable snapshots, replaced on add/remove
+        self._typed_routes = _EventRoutes()
+        self._batchers = ()  # immutable tuple of _EventBatcher, replaced on add/remove
         self._event_listener_thread = None
+        self._hub = None
+        self._hub_connection = None
+        self._dispatcher = None
+        self._capture = None
+        self._metrics = metrics
+        self._reconnect_policy = reconnect_policy or WVAReconnectPolicy()
+        self._state_listeners = ()  # immutable tuple, replaced on add/remove
         self._lock = threading.RLock()
+        if dispatcher is not None:
+            self.set_dispatcher(dispatcher)
+
+    @property
+    def recv_buffer_size(self):
+        """Initial size (in bytes) of the buffer used to receive data from the WVA
+
+        Changes take effect the next time the stream is enabled.
+        """
+        return self._recv_buffer_size
+
+    @recv_buffer_size.setter
+    def recv_buffer_size(self, recv_buffer_size):
+        self._recv_buffer_size = recv_buffer_size
+        self._max_recv_buffer_size = max(recv_buffer_size, self._max_recv_buffer_size)
+
+    @property
+    def max_recv_buffer_size(self):
+        """Size (in bytes) up to which the receive buffer may grow when reads fill it
+
+        Changes take effect the next time the stream is enabled.
+        """
+        return self._max_recv_buffer_size
+
+    @max_recv_buffer_size.setter
+    def max_recv_buffer_size(self, max_recv_buffer_size):
+        self._max_recv_buffer_size = max(self._recv_buffer_size, max_recv_buffer_size)
+
+    @property
+    def metrics(self):
+        """The :class:`wva.metrics.WVAMetrics` in which stream activity is recorded (or None)"""
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, metrics):
+        self._metrics = metrics
+
+    @property
+    def reconnect_policy(self):
+        """The :class:`WVAReconnectPolicy` used when connecting to the WVA fails or the connection is lost"""
+        return self._reconnect_policy
+
+    @reconnect_policy.setter
+    def reconnect_policy(self, reconnect_policy):
+        self._reconnect_policy = reconnect_policy or WVAReconnectPolicy()
+
+    def set_dispatcher(self, dispatcher):
+        """Set how events are delivered to listeners
+
+        By default (or if ``dispatcher`` is None), listeners are called
+        directly on the thread receiving events from the WVA.  If a
+        :class:`wva.dispatch.WVAQueuedDispatcher` is provided, events are
+        queued and listeners are called from the dispatcher's worker threads
+        instead.  Any previously set dispatcher is stopped after delivering
+        the events it has queued.
+        """
+        with self._lock:
+            previous, self._dispatcher = self._dispatcher, dispatcher
+            if dispatcher is not None:
+                dispatcher.start(self._deliver_event)
+        if previous is not None:
+            previous.stop()
+
+    def get_dispatcher(self):
+        """Get the dispatcher set with :meth:`set_dispatcher` (or None)"""
+        return self._dispatcher
+
+    def set_capture(self, capture):
+        """Record the raw data received from the WVA to a capture
+
+        :param capture: A :class:`wva.capture.WVAStreamCapture` (or None to
+            stop capturing).  The capture is not closed by the stream.
+        """
+        self._capture = capture
+
+    def get_capture(self):
+        """Get the capture set with :meth:`set_capture` (or None)"""
+        return self._capture
 
     def emit_event(self, event):
         """Emit the specified event (notify listeners)"""
-        with self._lock:
-            listeners = list(self._event_listeners)
+        dispatcher = self._dispatcher
+        if dispatcher is not None:
+            dispatcher.put(event)
+        else:
+            self._deliver_event(event)
+        if self._batchers:
+            self._deliver_batch((event,))
+
+    def emit_events(self, events):
+        """Emit a group of events received together (notify listeners)
 
-        for cb in list(self._event_listeners):
+        Each event is delivered to the event listeners individually and the
+        group is delivered to the batch listeners.
+        """
+        dispatcher = self._dispatcher
+        for event in events:
+            if dispatcher is not None:
+                dispatcher.put(event)
+            else:
+                self._deliver_event(event)
+        if self._batchers:
+            self._deliver_batch(events)
+
+    def _deliver_batch(self, events):
+        now = time.time()
+        for batcher in self._batchers:
+            batcher.add(events, now)
+
+    def flush_batches(self, force=False):
+        """Deliver events held by batch listeners
+
+        :param force: If True, all pending events are delivered; otherwise only
+            batches whose ``max_interval`` has elapsed are delivered.  This is
+            called periodically by the thread receiving events.
+        """
+        now = time.time()
+        for batcher in self._batchers:
+            batcher.flush(now, force)
+
+    def _deliver_event(self, event):
+        metrics = self._metrics
+        if metrics is not None:
+            return self._deliver_event_timed(event, metrics)
+
+        # The routes are never mutated (registration replaces them), so
+        # using the current snapshot requires no copy or lock
+        for cb in self._routes.match(event):
             # noinspection PyBroadException
             try:
                 cb(event)
@@ -46,7 +383,37 @@ class WVAEventStream(object):
                 # Don't let exceptions from callbacks kill our thread of execution
                 logger.exception("Event callback resulted in unhandled exception")
 
-    def enable(self):
+        typed_listeners = self._typed_routes.match(event)
+        if typed_listeners:
+            typed_event = VehicleDataEvent.from_event(event)  # converted once for all listeners
+            if typed_event is None:
+                return
+            for cb in typed_listeners:
+                # noinspection PyBroadException
+                try:
+                    cb(typed_event)
+                except:
+                    logger.exception("Event callback resulted in unhandled exception")
+
+    def _deliver_event_timed(self, event, metrics):
+        # As _deliver_event, recording the time spent in each listener
+        deliveries = [(cb, event) for cb in self._routes.match(event)]
+        typed_listeners = self._typed_routes.match(event)
+        if typed_listeners:
+            typed_event = VehicleDataEvent.from_event(event)
+            if typed_event is not None:
+                deliveries.extend((cb, typed_event) for cb in typed_listeners)
+
+        for cb, delivered_event in deliveries:
+            start = time.time()
+            # noinspection PyBroadException
+            try:
+                cb(delivered_event)
+            except:
+                logger.exception("Event callback resulted in unhandled exception")
+            metrics.record_listener(cb, time.time() - start)
+
+    def enable(self, hub=None):
         """Enable the stream thread
 
         This operation will ensure that the thread that is responsible
@@ -54,19 +421,38 @@ class WVAEventStream(object):
         This thread will continue to run and do what it needs to do to
         maintain a connection to the WVA.
 
+        If a :class:`wva.hub.WVAEventStreamHub` is provided, no thread is
+        started for this stream; instead, the connection is serviced by the
+        hub alongside the event streams of other devices.
+
         The status of the thread can be monitored by calling :meth:`get_status`.
         """
         with self._lock:
-            if self._event_listener_thread is None:
+            if self._event_listener_thread is not None or self._hub_connection is not None:
+                return
+
+            if hub is None:
                 self._event_listener_thread = WVAEventListenerThread(self, self._http_client)
                 self._event_listener_thread.start()
+            else:
+                self._hub = hub
+                self._hub_connection = WVAEventConnection(self, self._http_client)
+                hub.add_connection(self._hub_connection)
 
     def disable(self):
-        """Disconnect from the event stream"""
+        """Disconnect from the event stream
+
+        Any events held by batch listeners are delivered.
+        """
         with self._lock:
             if self._event_listener_thread is not None:
                 self._event_listener_thread.stop()
                 self._event_listener_thread = None
+            if self._hub_connection is not None:
+                self._hub.remove_connection(self._hub_connection)
+                self._hub = None
+                self._hub_connection = None
+        self.flush_batches(force=True)
 
     def get_status(self):
         """Get the current status of the event stream system
@@ -82,12 +468,14 @@ class WVAEventStream(object):
             and there is an appropriate set of subscriptions set up.
         """
         with self._lock:
-            if self._event_listener_thread is None:
-                return EVENT_STREAM_STATE_DISABLED
-            else:
+            if self._event_listener_thread is not None:
                 return self._event_listener_thread.get_state()
+            elif self._hub_connection is not None:
+                return self._hub_connection.get_state()
+            else:
+                return EVENT_STREAM_STATE_DISABLED
 
-    def add_event_listener(self, callback):
+    def add_event_listener(self, callback, short_name=None, element=None, uri_prefix=None, typed=False):
         """Add a listener that will be called when events are received
 
         This callback will be called when any event is received.  The callback
@@ -98,6 +486,26 @@ class WVAEventStream(object):
         Where event is a dictionary containg the event data as described in
         the `WVA Documentation on Events <http://goo.gl/6vU5i1>`_.
 
+        Optionally, one of the following filters may be specified so that the
+        callback is only called for the events it is interested in:
+
+        - ``short_name``: the short name of the subscription (or alarm)
+          that generated the event, e.g. ``"speedy"``
+        - ``element``: the name of the vehicle data element, e.g.
+          ``"VehicleSpeed"``
+        - ``uri_prefix``: a URI prefix made of whole path segments, e.g.
+          ``"vehicle/data"`` matches ``vehicle/data/VehicleSpeed`` but
+          ``"vehicle/data/Vehicle"`` does not
+
+        The same callback may be added multiple times with different filters,
+        but will only be called once for each event.  Filtered listeners are
+        looked up in a dictionary, so many filtered listeners cost no more per
+        event than a few.
+
+        If ``typed`` is True, the callback receives a compact
+        :class:`wva.events.VehicleDataEvent` rather than a dictionary and is
+        only called for vehicle data events.
+
         .. note::
 
            The event stream operates in its own thread of execution and event callbacks
@@ -107,33 +515,230 @@ class WVAEventStream(object):
            the event on to another thread of execution.
 
         """
+        filters = [(kind, key) for kind, key in (("short_name", short_name),
+                                                 ("element", element),
+                                                 ("uri_prefix", uri_prefix)) if key is not None]
+        if len(filters) > 1:
+            raise ValueError("Only one of short_name, element or uri_prefix may be specified")
+        kind, key = filters[0] if filters else (None, None)
+        if kind == "uri_prefix":
+            key = key.strip("/")
+
         with self._lock:
-            self._event_listeners.add(callback)
+            if (callback, kind, key, typed) not in self._registrations:
+                self._set_registrations(self._registrations + ((callback, kind, key, typed),))
 
     def remove_event_listener(self, callback):
-        """Remove the provided event listener callback"""
+        """Remove the provided event listener callback (including all of its filters)"""
+        with self._lock:
+            registrations = tuple(r for r in self._registrations if r[0] != callback)
+            if len(registrations) == len(self._registrations):
+                raise KeyError(callback)
+            self._set_registrations(registrations)
+
+    def _set_registrations(self, registrations):
+        self._registrations = registrations
+        self._routes = _EventRoutes((cb, kind, key) for cb, kind, key, typed in registrations if not typed)
+        self._typed_routes = _EventRoutes((cb, kind, key) for cb, kind, key, typed in registrations if typed)
+
+    def add_batch_listener(self, callback, max_events=None, max_interval=None, typed=False):
+        """Add a listener that will be called with lists of events
+
+        The callback is called as ``callback(events)`` where ``events`` is a
+        list of event dictionaries (see :meth:`add_event_listener`).  This
+        is much more efficient than per-event callbacks for sinks that work
+        with batches of data (e.g. message producers or columnar writers).
+
+        If neither ``max_events`` nor ``max_interval`` is specified, the
+        callback receives all of the events decoded from each read from the
+        WVA.  Otherwise events are accumulated until ``max_events`` events are
+        pending or the oldest pending event is ``max_interval`` seconds old,
+        whichever happens first.  Interval batches are checked whenever
+        events arrive and at least every ``SOCKET_TIMEOUT`` seconds while the
+        stream is idle.
+
+        If ``typed`` is True, batches contain :class:`wva.events.VehicleDataEvent`
+        instances (only vehicle data events are included).
+
+        Batch listeners are called on the thread receiving events, even when
+        a dispatcher has been set with :meth:`set_dispatcher`.
+        """
         with self._lock:
-            self._event_listeners.remove(callback)
+            if not any(batcher.callback == callback for batcher in self._batchers):
+                self._batchers += (_EventBatcher(callback, max_events, max_interval, typed),)
 
+    def remove_batch_listener(self, callback):
+        """Remove the provided batch listener callback
 
-class WVAEventListenerThread(threading.Thread):
-    """Thread responsible for communicating with WVA in order to receive a stream of events"""
+        Any events held for the listener are discarded.
+        """
+        with self._lock:
+            batchers = tuple(b for b in self._batchers if b.callback != callback)
+            if len(batchers) == len(self._batchers):
+                raise KeyError(callback)
+            self._batchers = batchers
+
+    def add_state_listener(self, callback):
+        """Add a listener that will be called when the stream changes state
+
+        The callback is called as ``callback(previous_state, state)`` with
+        ``EVENT_STREAM_STATE_*`` values (see :meth:`get_status`) on the
+        thread making the change, so it should not block.
+        """
+        with self._lock:
+            if callback not in self._state_listeners:
+                self._state_listeners += (callback,)
+
+    def remove_state_listener(self, callback):
+        """Remove the provided state listener callback"""
+        with self._lock:
+            listeners = tuple(cb for cb in self._state_listeners if cb != callback)
+            if len(listeners) == len(self._state_listeners):
+                raise KeyError(callback)
+            self._state_listeners = listeners
+
+    def _notify_state(self, previous, state):
+        for cb in self._state_listeners:
+            # noinspection PyBroadException
+            try:
+                cb(previous, state)
+            except:
+                logger.exception("State callback resulted in unhandled exception")
+
+
+class WVAEventParser(object):
+    """Incremental parser that splits the raw WVA event stream into events
+
+    Raw bytes received from the event socket are passed to :meth:`feed` and
+    complete events may then be retrieved with :meth:`next_event`.  Rather
+    than re-slicing the buffer for each event, the parser tracks a read
+    offset into a single ``bytearray``, splits on the ``\\r\\n`` record
+    separators used by the WVA and only decodes complete records.  Consumed
+    data is discarded from the front of the buffer infrequently, keeping
+    the total cost linear in the amount of data received.
+
+    Records are decoded directly from bytes using the provided JSON decoder
+    (see :mod:`wva.decoders`).
+    """
+
+    def __init__(self, json_decoder=None):
+        self._decoder = get_json_decoder(json_decoder)
+        self._buf = bytearray()
+        self._pos = 0  # start of the first unconsumed record
+        self._scan_pos = 0  # position from which to search for the next separator
+        self._tail_attempt = -1  # buffer length at last attempt to decode an unterminated record
+
+    def reset(self):
+        """Discard any buffered data (e.g. when a new connection is established)"""
+        self._buf = bytearray()
+        self._pos = 0
+        self._scan_pos = 0
+        self._tail_attempt = -1
+
+    def feed(self, data):
+        """Append raw bytes received from the event stream to the buffer"""
+        self._buf.extend(data)
+
+    def buffered(self):
+        """Return the number of bytes received but not yet consumed"""
+        return len(self._buf) - self._pos
+
+    def _decode(self, start, end):
+        # Skip anything preceding the opening brace of the record (the WVA
+        # may send stray whitespace or separators between messages)
+        start = self._buf.find(b'{', start, end)
+        if start == -1:
+            return None
+        return self._decoder.loads(self._buf[start:end])
+
+    def _consume(self, pos):
+        self._pos = self._scan_pos = pos
+        self._tail_attempt = -1
+        if self._pos == len(self._buf):
+            del self._buf[:]
+            self._pos = self._scan_pos = 0
+        elif self._pos >= COMPACT_THRESHOLD and self._pos * 2 >= len(self._buf):
+            del self._buf[:self._pos]
+            self._pos = self._scan_pos = 0
+
+    def next_event(self):
+        """Return the next complete event from the buffer or None"""
+        while True:
+            sep_idx = self._buf.find(RECORD_SEPARATOR, self._scan_pos)
+            if sep_idx == -1:
+                return self._next_unterminated_event()
+
+            try:
+                event = self._decode(self._pos, sep_idx)
+            except ValueError:
+                logger.warning("Discarding malformed event stream record")
+                event = None
+            self._consume(sep_idx + len(RECORD_SEPARATOR))
+            if event is not None:
+                return event
+
+    def _next_unterminated_event(self):
+        # The final record in a burst may not be followed by a separator.  It is
+        # only worth trying to decode it if it could be complete (it ends with a
+        # closing brace) and we have not already tried with the same data.
+        end = len(self._buf)
+        self._scan_pos = max(self._pos, end - len(RECORD_SEPARATOR) + 1)
+        if end == self._tail_attempt:
+            return None
+        tail_end = end
+        while tail_end > self._pos and self._buf[tail_end - 1:tail_end].isspace():
+            tail_end -= 1
+        if tail_end == self._pos or self._buf[tail_end - 1:tail_end] != b'}':
+            return None
+
+        self._tail_attempt = end
+        try:
+            event = self._decode(self._pos, tail_end)
+        except ValueError:
+            return None  # record is incomplete, wait for more data
+        if event is not None:
+            self._consume(end)
+        return event
+
+
+class WVAEventConnection(object):
+    """State machine for a single connection to the event stream of a WVA
+
+    The connection alternates between the connecting state (where the
+    event stream configuration is queried from the WVA and a socket is
+    connected to the event port) and the connected state (where data is
+    received, parsed and emitted to the :class:`WVAEventStream`).  The state
+    machine is driven either by a dedicated :class:`WVAEventListenerThread`
+    or by a :class:`wva.hub.WVAEventStreamHub` shared by many devices.
+
+    Attempts to connect are spaced out according to the stream's
+    :class:`WVAReconnectPolicy`; :meth:`get_reconnect_delay` returns the
+    time remaining until the next attempt should be made.
+    """
 
     def __init__(self, event_stream, http_client):
-        threading.Thread.__init__(self, name="WVAEventListenerThread")
-        self.setDaemon(True)
         self._event_stream = event_stream
         self._http_client = http_client
         self._socket = None
-        self._buf = six.u('')
-        self._stop_requested = False
-        self._decoder = json.JSONDecoder()
+        self._parser = WVAEventParser(http_client.json_decoder)
+        self._max_recv_buffer_size = event_stream.max_recv_buffer_size
+        self._allocate_recv_buffer(event_stream.recv_buffer_size)
         self._state = EVENT_STREAM_STATE_CONNECTING
+        self._state_since = time.time()
+        self._failures = 0  # consecutive failures to connect
+        self._next_attempt = 0.0
+        self._event_port = None  # (hostname, port) of the last connection
+        self._event_port_expires = 0.0
         self._state_map = {
             EVENT_STREAM_STATE_CONNECTING: self._service_connecting,
             EVENT_STREAM_STATE_CONNECTED: self._service_connected,
         }
 
+    def _allocate_recv_buffer(self, size):
+        # data is received directly into this preallocated buffer with recv_into
+        self._recv_buf = bytearray(size)
+        self._recv_view = memoryview(self._recv_buf)
+
     @staticmethod
     def _create_connected_socket(host, port):
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -143,75 +748,168 @@ class WVAEventListenerThread(threading.Thread):
 
     def _parse_one_event(self):
         """Parse the stream buffer and return either a single event or None"""
-        # WVA includes \r\n between messages which the parser doesn't like, so we
-        # throw away any data before a opening brace
-        try:
-            open_brace_idx = self._buf.index('{')
-        except ValueError:
-            self._buf = six.u('')  # no brace found
-        else:
-            if open_brace_idx > 0:
-                self._buf = self._buf[open_brace_idx:]
+        return self._parser.next_event()
 
-        try:
-            event, idx = self._decoder.raw_decode(self._buf)
-            self._buf = self._buf[idx:]
-            return event
-        except ValueError:
-            return None
+    def _connect(self):
+        """Make a single attempt to connect to the event stream
 
-    def _service_connecting(self):
+        :returns: True if the connection was established, otherwise False
+        """
+        hostname = self._http_client.hostname
+        port = self._get_cached_event_port(hostname)
         # noinspection PyBroadException
         try:
-            # get event info and enable if not enabled currently
-            event_info = self._http_client.get("config/ws_events")["ws_events"]
-            if event_info["enable"] != "on":
-                # enable events
-                self._http_client.put("config/ws_events", {
-                    "enable": "on",
-                    "port": event_info["port"],  # just keep existing port
-                })
-            host = self._http_client.hostname
-            port = event_info["port"]
+            if port is None:
+                # get event info and enable if not enabled currently
+                event_info = self._http_client.get("config/ws_events")["ws_events"]
+                if event_info["enable"] != "on":
+                    # enable events
+                    self._http_client.put("config/ws_events", {
+                        "enable": "on",
+                        "port": event_info["port"],  # just keep existing port
+                    })
+                port = event_info["port"]
+            # the event stream uses the port given by config/ws_events
+            host, _port = split_hostname(hostname)
             self._socket = self._create_connected_socket(host, port)
         except WVAError as e:
             logger.debug("WVAError connecting to event stream: %s", e)
-            time.sleep(DELAY_ON_ERROR)
         except socket.error as e:
             logger.debug("socket.error connecting to event stream: %s", e)
-            time.sleep(DELAY_ON_ERROR)
         except:
             logger.exception("Unexpected exception")
         else:
-            self._buf = six.u('')  # ensure buffer is emptied
-            self._state = EVENT_STREAM_STATE_CONNECTED
+            self._event_port = (hostname, port)
+            self._parser.reset()  # ensure buffer is emptied
+            self._set_state(EVENT_STREAM_STATE_CONNECTED)
+            return True
+        self._event_port = None  # query the port again (events may have been disabled)
+        self._schedule_retry(time.time())
+        return False
+
+    def _get_cached_event_port(self, hostname):
+        if self._event_port is None or self._event_port[0] != hostname:
+            return None
+        if time.time() >= self._event_port_expires:
+            return None
+        return self._event_port[1]
+
+    def _schedule_retry(self, now):
+        self._failures += 1
+        self._next_attempt = now + self._event_stream.reconnect_policy.get_delay(self._failures)
+
+    def _disconnected(self, now, connected_seconds):
+        policy = self._event_stream.reconnect_policy
+        self._event_port_expires = now + (policy.event_port_ttl or 0)
+        if connected_seconds >= policy.reset_after:
+            self._failures = 0
+            self._next_attempt = now + policy.get_delay(0)
+        else:
+            # the connection did not last, so back off as if connecting failed
+            self._schedule_retry(now)
+
+    @property
+    def event_stream(self):
+        """The :class:`WVAEventStream` to which events from this connection are emitted"""
+        return self._event_stream
+
+    def connect(self):
+        """Make a single attempt to connect to the event stream
+
+        If the attempt fails, the next one is scheduled according to the
+        stream's reconnect policy (see :meth:`get_reconnect_delay`).
+
+        :returns: True if the connection was established, otherwise False
+        """
+        return self._connect()
+
+    def fileno(self):
+        """Return the file descriptor of the connected socket (-1 if there is none)
+
+        This allows a connection to be registered with a selector.
+        """
+        try:
+            return self._socket.fileno()
+        except (AttributeError, socket.error):  # not connected or closed (Python 2)
+            return -1
+
+    def receive(self):
+        """Receive data from the connected socket and emit the events it contains
+
+        This blocks until data is available (or the socket times out), so it
+        is normally called once a selector has reported the connection as
+        readable.  If the connection is lost, the state changes to connecting.
+        """
+        self._service_connected()
+
+    def get_reconnect_delay(self):
+        """Get the number of seconds until the next attempt to connect should be made"""
+        return max(0.0, self._next_attempt - time.time())
+
+    def _sleep(self, seconds):
+        """Wait before connecting, returning True if interrupted"""
+        time.sleep(seconds)
+        return False
+
+    def _service_connecting(self):
+        delay = self.get_reconnect_delay()
+        if delay > 0 and self._sleep(delay):
+            return
+        self._connect()
 
     def _service_connected(self):
         # grab new data
         try:
-            data = self._socket.recv(1024)
+            nbytes = self._socket.recv_into(self._recv_view)
         except socket.timeout:
+            self._event_stream.flush_batches()
             return
         except socket.error as e:
             logger.debug("socket.error from connected state: %s", e)
             logger.info("Connected -> Connecting (socket error)")
             self._socket.close()
-            self._state = EVENT_STREAM_STATE_CONNECTING
+            self._set_state(EVENT_STREAM_STATE_CONNECTING)
             return
 
-        if not data:
+        if not nbytes:
             logger.info("Connect -> Connecting (EOF)")
             self._socket.close()
-            self._state = EVENT_STREAM_STATE_CONNECTING
+            self._set_state(EVENT_STREAM_STATE_CONNECTING)
             return
         else:
-            self._buf += data.decode('utf-8')
+            capture = self._event_stream.get_capture()
+            if capture is not None:
+                capture.write(time.time(), self._recv_view[:nbytes])
+            metrics = self._event_stream.metrics
+            if metrics is not None:
+                parse_start = time.time()
+            self._parser.feed(self._recv_view[:nbytes])
+            if nbytes == len(self._recv_buf) and nbytes < self._max_recv_buffer_size:
+                # the read filled the buffer, so more data is likely waiting
+                self._allocate_recv_buffer(min(nbytes * 2, self._max_recv_buffer_size))
+            events = []
             while True:
                 event = self._parse_one_event()
                 if event is None:
                     break
                 else:
-                    self._event_stream.emit_event(event)
+                    events.append(event)
+            if metrics is not None:
+                metrics.record_received(nbytes, time.time() - parse_start, len(events))
+            if events:
+                self._event_stream.emit_events(events)
+
+    def _set_state(self, state):
+        now = time.time()
+        previous, self._state = self._state, state
+        if previous == EVENT_STREAM_STATE_CONNECTED:
+            self._disconnected(now, now - self._state_since)
+        metrics = self._event_stream.metrics
+        if metrics is not None:
+            reconnect = previous == EVENT_STREAM_STATE_CONNECTED and state == EVENT_STREAM_STATE_CONNECTING
+            metrics.record_state(previous, now - self._state_since, reconnect)
+        self._state_since = now
+        self._event_stream._notify_state(previous, state)
 
     def _step(self):
         service_fn = self._state_map[self._state]
@@ -221,14 +919,35 @@ class WVAEventListenerThread(threading.Thread):
         """Get the current state"""
         return self._state
 
+    def close(self):
+        """Close the socket for this connection (if open)"""
+        if self._socket is not None:
+            self._socket.close()
+        if self._state != EVENT_STREAM_STATE_DISABLED:
+            self._set_state(EVENT_STREAM_STATE_DISABLED)
+
+
+class WVAEventListenerThread(WVAEventConnection, threading.Thread):
+    """Thread responsible for communicating with WVA in order to receive a stream of events"""
+
+    def __init__(self, event_stream, http_client):
+        threading.Thread.__init__(self, name="WVAEventListenerThread")
+        self.setDaemon(True)
+        WVAEventConnection.__init__(self, event_stream, http_client)
+        self._stop_requested = False
+        self._stop_event = threading.Event()
+
     def stop(self):
         """Request that the event stream thread be stopped and wait for it to stop"""
         self._stop_requested = True
+        self._stop_event.set()
         self.join()
 
+    def _sleep(self, seconds):
+        return self._stop_event.wait(seconds)
+
     def run(self):
         while not self._stop_requested:
             self._step()
 
-        if self._socket is not None:
-            self._socket.close()
+        self.close()
@@ -8,9 +8,14 @@
 class WVASubscription(object):
     """Provide access to a subscription on the WVA"""
 
-    def __init__(self, http_client, short_name):
+    def __init__(self, http_client, short_name, on_change=None):
         self._http_client = http_client
         self.short_name = short_name
+        self._on_change = on_change  # called as on_change(subscription) after create/delete
+
+    def _changed(self):
+        if self._on_change is not None:
+            self._on_change(self)
 
     def create(self, uri, buffer="queue", interval=10):
         """Create a subscription with this short name and the provided parameters
@@ -20,20 +25,24 @@ class WVASubscription(object):
 
         :raises WVAError: If there is a problem creating the new subscription
         """
-        return self._http_client.put_json("subscriptions/{}".format(self.short_name), {
+        result = self._http_client.put_json("subscriptions/{}".format(self.short_name), {
             "subscription": {
                 "uri": uri,
                 "buffer": buffer,
                 "interval": interval,
             }
         })
+        self._changed()
+        return result
 
     def delete(self):
         """Delete this subscription
 
         :raises WVAError: If there is a problem deleting the subscription
         """
-        return self._http_client.delete("subscriptions/{}".format(self.short_name))
+        result = self._http_client.delete("subscriptions/{}".format(self.short_name))
+        self._changed()
+        return result
 
     def get_metadata(self):
         """Get the metadata that is available for this subscription
@@ -0,0 +1,197 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+import datetime
+import json
+import socket
+import sys
+import threading
+import time
+import unittest
+
+import mock
+import six
+from six.moves import BaseHTTPServer
+
+if sys.version_info < (3, 5):
+    raise unittest.SkipTest("wva.aio requires Python 3.5+")
+
+import asyncio
+from dateutil.tz import tzutc
+from wva.aio import AsyncWVA, AsyncWVAEventStream
+from wva.exceptions import WVAHttpNotFoundError
+from wva.stream import WVAReconnectPolicy
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else None
+        self.server.requests.append((self.command, self.path, body))
+        status, document = self.server.responses.get((self.command, self.path), (404, None))
+        content = six.b(json.dumps(document)) if document is not None else six.b("")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json" if document is not None else "text/plain")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_PUT = do_DELETE = _respond
+
+
+class TestAsyncWVA(unittest.TestCase):
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.responses = {}
+        self.server.requests = []
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.loop = asyncio.new_event_loop()
+        self.wva = AsyncWVA("127.0.0.1:{}".format(self.server.server_address[1]), "user", "pass",
+                            use_https=False)
+
+    def tearDown(self):
+        self.wva.close()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_sample(self):
+        self.server.responses[("GET", "/ws/vehicle/data/VehicleSpeed")] = (200, {
+            'VehicleSpeed': {'timestamp': '2015-03-20T20:11:10Z', 'value': 170.664856}})
+        sample = self.run_async(self.wva.get_vehicle_data_element("VehicleSpeed").sample())
+        self.assertAlmostEqual(sample.value, 170.664856)
+        self.assertEqual(sample.timestamp, datetime.datetime(2015, 3, 20, 20, 11, 10, tzinfo=tzutc()))
+
+        # the second request should reuse the same keep-alive connection
+        self.run_async(self.wva.get_vehicle_data_element("VehicleSpeed").sample())
+        self.assertEqual(len(self.wva.get_http_client()._idle), 1)
+
+    def test_error_status(self):
+        with self.assertRaises(WVAHttpNotFoundError):
+            self.run_async(self.wva.get_vehicle_data_element("Nope").sample())
+
+    def test_subscriptions(self):
+        self.server.responses[("GET", "/ws/subscriptions")] = (200, {
+            "subscriptions": ["subscriptions/a", "subscriptions/b"]})
+        self.server.responses[("PUT", "/ws/subscriptions/c")] = (200, None)
+        self.server.responses[("DELETE", "/ws/subscriptions/c")] = (200, None)
+        subs = self.run_async(self.wva.get_subscriptions())
+        self.assertEqual([s.short_name for s in subs], ["a", "b"])
+        self.run_async(self.wva.get_subscription("c").create("vehicle/data/EngineSpeed", interval=5))
+        self.run_async(self.wva.get_subscription("c").delete())
+        self.assertEqual(self.server.requests[1][:2], ("PUT", "/ws/subscriptions/c"))
+        self.assertEqual(json.loads(self.server.requests[1][2].decode('utf-8')), {
+            "subscription": {"uri": "vehicle/data/EngineSpeed", "buffer": "queue", "interval": 5}})
+        self.assertEqual(self.server.requests[2][:2], ("DELETE", "/ws/subscriptions/c"))
+
+    def test_event_stream(self):
+        event_server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        event_server.bind(("127.0.0.1", 0))
+        event_server.listen(1)
+        self.addCleanup(event_server.close)
+        self.server.responses[("GET", "/ws/config/ws_events")] = (200, {
+            "ws_events": {"enable": "on", "port": event_server.getsockname()[1]}})
+
+        def send_events():
+            conn, _ = event_server.accept()
+            conn.sendall(six.b(json.dumps({"seq": 1}) + "\r\n" + json.dumps({"seq": 2}) + "\r\n"))
+            conn.close()
+        sender = threading.Thread(target=send_events)
+        sender.start()
+
+        stream = self.wva.get_event_stream()
+        events = [self.run_async(stream.__anext__()), self.run_async(stream.__anext__())]
+        self.assertEqual(events, [{"seq": 1}, {"seq": 2}])
+        stream.close()
+        with self.assertRaises(StopAsyncIteration):
+            self.run_async(stream.__anext__())
+        sender.join()
+
+    def test_event_stream_enabled(self):
+        event_server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        event_server.bind(("127.0.0.1", 0))
+        event_server.listen(1)
+        self.addCleanup(event_server.close)
+        port = event_server.getsockname()[1]
+        self.server.responses[("GET", "/ws/config/ws_events")] = (200, {
+            "ws_events": {"enable": "off", "port": port}})
+        self.server.responses[("PUT", "/ws/config/ws_events")] = (200, {})
+
+        def send_event():
+            conn, _ = event_server.accept()
+            conn.sendall(six.b(json.dumps({"seq": 1}) + "\r\n"))
+            conn.close()
+        sender = threading.Thread(target=send_event)
+        sender.start()
+
+        stream = self.wva.get_event_stream()
+        self.assertEqual(self.run_async(stream.__anext__()), {"seq": 1})
+        stream.close()
+        sender.join()
+        method, path, body = self.server.requests[1]
+        self.assertEqual((method, path), ("PUT", "/ws/config/ws_events"))
+        self.assertEqual(json.loads(body.decode('utf-8')), {"enable": "on", "port": port})
+
+    def _start_closing_event_server(self):
+        # accepts connections to the event port and closes them immediately
+        event_server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        event_server.bind(("127.0.0.1", 0))
+        event_server.listen(16)
+        self.addCleanup(event_server.close)
+        connections = []
+
+        def accept():
+            while True:
+                try:
+                    conn, _ = event_server.accept()
+                except socket.error:
+                    return
+                connections.append(conn)
+                conn.close()
+        acceptor = threading.Thread(target=accept)
+        acceptor.daemon = True
+        acceptor.start()
+        self.server.responses[("GET", "/ws/config/ws_events")] = (200, {
+            "ws_events": {"enable": "on", "port": event_server.getsockname()[1]}})
+        return connections
+
+    def test_event_stream_reconnect_backs_off(self):
+        connections = self._start_closing_event_server()
+        stream = AsyncWVAEventStream(self.wva.get_http_client(),
+                                     reconnect_policy=WVAReconnectPolicy(initial_delay=0.2, jitter=0))
+        with self.assertRaises(asyncio.TimeoutError):
+            self.run_async(asyncio.wait_for(stream.__anext__(), 0.5))  # connects at 0, 0.2 and 0.6 seconds
+        stream.close()
+        self.assertIn(len(connections), (2, 3))
+        # the port of the previous connection is reused when reconnecting
+        self.assertEqual([r[:2] for r in self.server.requests], [("GET", "/ws/config/ws_events")])
+
+    def test_event_stream_reconnect_jitter_after_long_lived_connection(self):
+        self._start_closing_event_server()
+        policy = WVAReconnectPolicy(initial_delay=10.0, jitter=0.5, reset_after=0)
+        stream = AsyncWVAEventStream(self.wva.get_http_client(), reconnect_policy=policy)
+        with mock.patch("wva.stream.random") as mock_random:
+            mock_random.random.return_value = 0.5
+            with self.assertRaises(asyncio.TimeoutError):
+                self.run_async(asyncio.wait_for(stream.__anext__(), 0.5))
+        stream.close()
+        self.assertEqual(stream._failures, 0)
+        # jitter * random * initial_delay (2.5s), rather than the 7.5s of a failed attempt
+        self.assertTrue(0 < stream._next_attempt - time.time() <= 2.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+import json
+
+import httpretty
+import mock
+from wva.cache import WVAResponseCache
+from wva.test.test_utilities import WVATestBase
+
+ECU_INFO = {"name": "can0ecu0", "VIN": "1FT..."}
+
+
+class TestWVAResponseCache(WVATestBase):
+    def setUp(self):
+        WVATestBase.setUp(self)
+        self.cache = WVAResponseCache()
+        self.wva.get_http_client().response_cache = self.cache
+
+    def _prepare(self, path, responses):
+        httpretty.register_uri("GET", "https://192.168.100.1{}".format(path), responses=responses)
+
+    def test_rules(self):
+        self.assertEqual(self.cache.get_ttl("vehicle/data/VehicleSpeed"), None)
+        self.assertEqual(self.cache.get_ttl("/vehicle/data"), None)
+        self.assertEqual(self.cache.get_ttl("hw/leds/red"), 0)
+        self.assertEqual(self.cache.get_ttl("hw/buttons/reset"), 0)
+        self.assertEqual(self.cache.get_ttl("vehicle/ecus/can0ecu0/VIN"), 3600)
+        self.assertEqual(self.cache.get_ttl("subscriptions"), 0)
+        self.assertEqual(WVAResponseCache(rules=[]).get_ttl("hw/serial"), None)
+
+    def test_ttl(self):
+        self.prepare_json_response("GET", "/ws/vehicle/ecus/can0ecu0", ECU_INFO)
+        client = self.wva.get_http_client()
+        with mock.patch('wva.cache.time') as cache_time, mock.patch('wva.http_client.time') as client_time:
+            cache_time.time.return_value = client_time.time.return_value = 1000.0
+            self.assertEqual(client.get("vehicle/ecus/can0ecu0"), ECU_INFO)
+            self.assertEqual(client.get("vehicle/ecus/can0ecu0"), ECU_INFO)
+            self.assertEqual(len(httpretty.latest_requests()), 1)
+            client_time.time.return_value = 5000.0
+            client.get("vehicle/ecus/can0ecu0")
+        self.assertEqual(len(httpretty.latest_requests()), 2)
+        self.assertEqual(self.cache.get_stats()["hits"], 1)
+
+    def test_never_cached(self):
+        self.prepare_json_response("GET", "/ws/vehicle/data/VehicleSpeed", {})
+        client = self.wva.get_http_client()
+        client.get("vehicle/data/VehicleSpeed")
+        client.get("vehicle/data/VehicleSpeed")
+        self.assertEqual(len(httpretty.latest_requests()), 2)
+        self.assertEqual(self.cache.get_stats()["entries"], 0)
+
+    def test_etag_revalidation(self):
+        self._prepare("/ws/subscriptions", [
+            httpretty.Response(json.dumps({"subscriptions": []}), status=200,
+                               content_type="application/json", etag='"abc"'),
+            httpretty.Response("", status=304),
+        ])
+        client = self.wva.get_http_client()
+        first = client.get("subscriptions")
+        self.assertIs(client.get("subscriptions"), first)
+        self.assertEqual(self._get_last_request().headers.get("If-None-Match"), '"abc"')
+        self.assertEqual(self.cache.get_stats()["revalidated"], 1)
+
+    def test_last_modified_revalidation(self):
+        self._prepare("/ws/hw/leds", [
+            httpretty.Response("on", status=200, last_modified="Fri, 20 Mar 2015 18:00:49 GMT"),
+            httpretty.Response("", status=304),
+        ])
+        self.cache = WVAResponseCache(rules=[("hw/*", 0)])
+        self.wva.get_http_client().response_cache = self.cache
+        client = self.wva.get_http_client()
+        self.assertEqual(client.get("hw/leds"), "on")
+        self.assertEqual(client.get("hw/leds"), "on")
+        self.assertEqual(self._get_last_request().headers.get("If-Modified-Since"),
+                         "Fri, 20 Mar 2015 18:00:49 GMT")
+
+    def test_write_invalidates(self):
+        self.prepare_response("GET", "/ws/hw/leds/red", "on")
+        self.prepare_response("PUT", "/ws/hw/leds/red", "")
+        self.cache = WVAResponseCache(rules=[("hw/*", 60)])
+        client = self.wva.get_http_client()
+        client.response_cache = self.cache
+        client.get("hw/leds/red")
+        self.assertEqual(self.cache.get_stats()["entries"], 1)
+        client.put("hw/leds/red", "off")
+        self.assertEqual(self.cache.get_stats()["entries"], 0)
+
+    def test_hostname_change_invalidates(self):
+        self.cache.store("GET", "vehicle/ecus/can0ecu0", ECU_INFO, etag='"1"')
+        self.wva.hostname = "my.new.host"
+        self.assertEqual(self.wva.get_http_client().hostname, "my.new.host")
+        self.assertEqual(self.cache.get_stats()["entries"], 0)
+
+    def test_parent_invalidated(self):
+        self.cache.store("GET", "subscriptions", {"subscriptions": []}, etag='"1"')
+        self.cache.store("GET", "subscriptions/other", {}, etag='"2"')
+        self.cache.invalidate("subscriptions/speed")
+        self.assertIsNone(self.cache.lookup("GET", "subscriptions"))
+        self.assertIsNotNone(self.cache.lookup("GET", "subscriptions/other"))
+
+    def test_max_entries(self):
+        cache = WVAResponseCache(rules=[("*", 60)], max_entries=2)
+        for uri in ("a", "b", "c"):
+            cache.store("GET", uri, uri)
+        self.assertIsNone(cache.lookup("GET", "a"))
+        self.assertEqual(cache.lookup("GET", "c").value, "c")
@@ -0,0 +1,76 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import six
+from wva.capture import WVAStreamCapture, WVAStreamReplay, read_capture
+from wva.stream import WVAEventStream
+
+EVENTS = [{'data': {'VehicleSpeed': {'timestamp': '2015-03-22T05:14:3{}Z'.format(i), 'value': i},
+                    'sequence': i,
+                    'short_name': 'speedy',
+                    'timestamp': '2015-03-22T05:14:3{}Z'.format(i),
+                    'uri': 'vehicle/data/VehicleSpeed'}} for i in range(3)]
+
+
+class TestCapture(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "stream.wvacap")
+        raw = six.b("".join(json.dumps(event) + "\r\n" for event in EVENTS))
+        capture = WVAStreamCapture(self.path)
+        # split the data mid-record as a socket might
+        capture.write(1000.0, raw[:50])
+        capture.write(1001.0, raw[50:200])
+        capture.close()
+        capture = WVAStreamCapture(self.path)  # appends
+        capture.write(1003.0, raw[200:])
+        self.assertEqual(capture.get_stats(), {"records": 1, "bytes": len(raw) - 200})
+        capture.close()
+        self.raw = raw
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_read_capture(self):
+        records = list(read_capture(self.path))
+        self.assertEqual([t for t, _data in records], [1000.0, 1001.0, 1003.0])
+        self.assertEqual(b"".join(data for _t, data in records), self.raw)
+
+    def test_truncated_record_ignored(self):
+        with open(self.path, "ab") as f:
+            f.write(b"\x00" * 5)
+        self.assertEqual(len(list(read_capture(self.path))), 3)
+
+    def test_not_a_capture(self):
+        with open(self.path, "wb") as f:
+            f.write(b"hello")
+        self.assertRaises(ValueError, list, read_capture(self.path))
+
+    @mock.patch('wva.capture.time')
+    def test_replay_as_fast_as_possible(self, mock_time):
+        stream = WVAEventStream(None)
+        cb = mock.Mock()
+        stream.add_event_listener(cb)
+        replay = WVAStreamReplay(self.path, stream)
+        self.assertEqual(replay.run(), 3)
+        cb.assert_has_calls([mock.call(event) for event in EVENTS])
+        self.assertFalse(mock_time.sleep.called)
+        self.assertEqual(replay.get_stats(), {"events": 3, "bytes": len(self.raw)})
+
+    @mock.patch('wva.capture.time')
+    def test_replay_speed(self, mock_time):
+        mock_time.time.return_value = 50.0
+        WVAStreamReplay(self.path, WVAEventStream(None), speed=2).run()
+        mock_time.sleep.assert_has_calls([mock.call(0.5), mock.call(1.5)])
+
+    def test_invalid_speed(self):
+        self.assertRaises(ValueError, WVAStreamReplay, self.path, WVAEventStream(None), speed=0)
@@ -4,6 +4,8 @@
 #
 # Copyright (c) 2015 Digi International Inc. All Rights Reserved.
 
+import httpretty
+import mock
 from wva import WVA
 from wva.test.test_utilities import WVATestBase
 
@@ -15,3 +17,65 @@ class TestWVA(WVATestBase):
         self.assertEqual(wva.username, "bob")
         self.assertEqual(wva.password, "secrets")
         self.assertEqual(wva.use_https, True)
+
+
+class TestDiscoveryCache(WVATestBase):
+    def setUp(self):
+        WVATestBase.setUp(self)
+        self.prepare_json_response("GET", "/ws/vehicle/data", {'data': ['vehicle/data/VehicleSpeed']})
+        self.prepare_json_response("GET", "/ws/subscriptions", {'subscriptions': ['subscriptions/a']})
+        self.prepare_response("PUT", "/ws/subscriptions/b", "")
+        self.prepare_response("DELETE", "/ws/subscriptions/a", "")
+
+    def _request_count(self):
+        return len([r for r in httpretty.latest_requests() if r.method == "GET"])
+
+    def test_disabled_by_default(self):
+        self.wva.get_vehicle_data_elements()
+        self.wva.get_vehicle_data_elements()
+        self.assertEqual(self._request_count(), 2)
+
+    @mock.patch('time.time')
+    def test_ttl(self, mock_time):
+        mock_time.return_value = 1000.0
+        self.wva.discovery_cache_ttl = 10
+        elements = self.wva.get_vehicle_data_elements()
+        elements.clear()  # modifying the result must not affect the cache
+        self.assertEqual(list(self.wva.get_vehicle_data_elements().keys()), ['VehicleSpeed'])
+        self.assertEqual(self._request_count(), 1)
+        mock_time.return_value = 1010.0
+        self.wva.get_vehicle_data_elements()
+        self.assertEqual(self._request_count(), 2)
+
+        self.wva.invalidate_discovery_cache()
+        self.wva.get_vehicle_data_elements()
+        self.assertEqual(self._request_count(), 3)
+
+    def test_subscription_changes_invalidate(self):
+        self.wva.discovery_cache_ttl = 60
+        self.wva.get_subscriptions()
+        self.wva.get_subscriptions()
+        self.assertEqual(self._request_count(), 1)
+        self.wva.get_subscription("b").create("vehicle/data/EngineSpeed")
+        self.wva.get_subscriptions()
+        self.assertEqual(self._request_count(), 2)
+        self.wva.get_subscriptions()[0].delete()
+        self.wva.get_subscriptions()
+        self.assertEqual(self._request_count(), 3)
+
+    def test_invalidation_during_fetch(self):
+        self.wva.discovery_cache_ttl = 60
+        client = self.wva.get_http_client()
+        get = client.get
+
+        def get_and_invalidate(uri, **kwargs):
+            response = get(uri, **kwargs)
+            self.wva.invalidate_discovery_cache()  # e.g. a subscription created by another thread
+            return response
+
+        with mock.patch.object(client, "get", side_effect=get_and_invalidate):
+            self.wva.get_subscriptions()
+        self.wva.get_subscriptions()
+        self.assertEqual(self._request_count(), 2)  # the stale result was not cached
+        self.wva.get_subscriptions()
+        self.assertEqual(self._request_count(), 2)
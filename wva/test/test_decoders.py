@@ -0,0 +1,57 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+import os
+import unittest
+
+import mock
+import six
+from wva import WVA
+from wva.decoders import get_json_decoder, StdlibJSONDecoder, DECODER_ENV_VAR, DECODER_CLASSES
+from wva.stream import WVAEventParser
+
+
+class TestJSONDecoders(unittest.TestCase):
+    def _check_decoder(self, decoder):
+        doc = {"data": {"VehicleSpeed": {"value": 1.5, "timestamp": "2015-03-22T05:14:31Z"}}}
+        encoded = six.b('{"data": {"VehicleSpeed": {"value": 1.5, "timestamp": "2015-03-22T05:14:31Z"}}}')
+        self.assertEqual(decoder.loads(encoded), doc)
+        self.assertEqual(decoder.loads(bytearray(encoded)), doc)
+        self.assertEqual(decoder.loads(encoded.decode('utf-8')), doc)
+        self.assertRaises(ValueError, decoder.loads, six.b('{"incomplete": '))
+
+    def test_all_installed_decoders(self):
+        for name in DECODER_CLASSES:
+            try:
+                decoder = get_json_decoder(name)
+            except ImportError:
+                continue
+            self.assertEqual(decoder.name, name)
+            self._check_decoder(decoder)
+
+    def test_decoder_instance_passthrough(self):
+        decoder = StdlibJSONDecoder()
+        self.assertIs(get_json_decoder(decoder), decoder)
+
+    def test_unknown_decoder(self):
+        self.assertRaises(ValueError, get_json_decoder, "yaml")
+
+    def test_environment_selection(self):
+        with mock.patch.dict(os.environ, {DECODER_ENV_VAR: "json"}):
+            self.assertIsInstance(get_json_decoder(), StdlibJSONDecoder)
+            self.assertIsInstance(WVA("host", "user", "pass").get_http_client().json_decoder,
+                                  StdlibJSONDecoder)
+
+    def test_wva_construction(self):
+        wva = WVA("host", "user", "pass", json_decoder="json")
+        self.assertIsInstance(wva.get_http_client().json_decoder, StdlibJSONDecoder)
+
+    def test_parser_uses_decoder(self):
+        decoder = mock.Mock()
+        decoder.loads.return_value = {"decoded": True}
+        parser = WVAEventParser(decoder)
+        parser.feed(six.b('{"a": 1}\r\n'))
+        self.assertEqual(parser.next_event(), {"decoded": True})
+        self.assertEqual(bytes(decoder.loads.call_args[0][0]), six.b('{"a": 1}'))
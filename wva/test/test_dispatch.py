@@ -0,0 +1,92 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+import threading
+import unittest
+
+import mock
+from wva.dispatch import WVAQueuedDispatcher, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_COALESCE, \
+    OVERFLOW_BLOCK
+from wva.test.test_utilities import WVATestBase
+
+
+def make_event(short_name, sequence):
+    return {"data": {"short_name": short_name, "sequence": sequence}}
+
+
+class TestWVAQueuedDispatcher(unittest.TestCase):
+    def _fill_and_drain(self, overflow, events, maxsize=3):
+        dispatcher = WVAQueuedDispatcher(maxsize=maxsize, overflow=overflow)
+        for event in events:
+            dispatcher.put(event)
+        delivered = []
+        dispatcher.start(delivered.append)
+        dispatcher.stop()
+        return dispatcher, delivered
+
+    def test_drop_oldest(self):
+        events = [make_event("a", i) for i in range(5)]
+        dispatcher, delivered = self._fill_and_drain(OVERFLOW_DROP_OLDEST, events)
+        self.assertEqual(delivered, events[2:])
+        self.assertEqual(dispatcher.get_stats()["dropped"], 2)
+        self.assertEqual(dispatcher.get_stats()["delivered"], 3)
+
+    def test_drop_newest(self):
+        events = [make_event("a", i) for i in range(5)]
+        dispatcher, delivered = self._fill_and_drain(OVERFLOW_DROP_NEWEST, events)
+        self.assertEqual(delivered, events[:3])
+        self.assertEqual(dispatcher.get_stats()["dropped"], 2)
+
+    def test_coalesce(self):
+        events = [make_event("a", 0), make_event("b", 1), make_event("c", 2),
+                  make_event("b", 3), make_event("d", 4)]
+        dispatcher, delivered = self._fill_and_drain(OVERFLOW_COALESCE, events)
+        # b is replaced in place, d has no queued match so the oldest (a) is dropped
+        self.assertEqual(delivered, [events[3], events[2], events[4]])
+        self.assertEqual(dispatcher.get_stats()["coalesced"], 1)
+        self.assertEqual(dispatcher.get_stats()["dropped"], 1)
+
+    def test_block(self):
+        release = threading.Event()
+        delivered = []
+
+        def slow_deliver(event):
+            release.wait()
+            delivered.append(event)
+
+        dispatcher = WVAQueuedDispatcher(maxsize=1, overflow=OVERFLOW_BLOCK)
+        dispatcher.start(slow_deliver)
+        events = [make_event("a", i) for i in range(4)]
+        producer = threading.Thread(target=lambda: [dispatcher.put(e) for e in events])
+        producer.start()
+        producer.join(0.1)
+        self.assertTrue(producer.is_alive())  # blocked waiting for space
+        release.set()
+        producer.join()
+        dispatcher.stop()
+        self.assertEqual(delivered, events)
+        self.assertEqual(dispatcher.get_stats()["dropped"], 0)
+
+    def test_invalid_policy(self):
+        self.assertRaises(ValueError, WVAQueuedDispatcher, overflow="explode")
+
+
+class TestEventStreamDispatch(WVATestBase):
+    def test_dispatch_through_stream(self):
+        stream = self.wva.get_event_stream()
+        cb = mock.Mock()
+        stream.add_event_listener(cb)
+        dispatcher = WVAQueuedDispatcher(workers=2)
+        stream.set_dispatcher(dispatcher)
+        self.assertIs(stream.get_dispatcher(), dispatcher)
+        for i in range(10):
+            stream.emit_event(make_event("a", i))
+        stream.set_dispatcher(None)  # drains the queue
+        self.assertEqual(cb.call_count, 10)
+        self.assertEqual(dispatcher.get_stats()["delivered"], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+import datetime
+import unittest
+
+import mock
+from dateutil.tz import tzutc
+from wva.events import VehicleDataEvent
+from wva.test.test_utilities import WVATestBase
+
+SPEED_EVENT = {'data': {'VehicleSpeed': {'timestamp': '2015-03-22T05:14:31Z',
+                                         'value': 153.095673},
+                        'sequence': 99649,
+                        'short_name': 'speedy',
+                        'timestamp': '2015-03-22T05:14:30Z',
+                        'uri': 'vehicle/data/VehicleSpeed'}}
+
+
+class TestVehicleDataEvent(unittest.TestCase):
+    def test_from_event(self):
+        event = VehicleDataEvent.from_event(SPEED_EVENT)
+        self.assertEqual(event.short_name, 'speedy')
+        self.assertEqual(event.uri, 'vehicle/data/VehicleSpeed')
+        self.assertEqual(event.sequence, 99649)
+        self.assertEqual(event.element, 'VehicleSpeed')
+        self.assertEqual(event.value, 153.095673)
+        self.assertEqual(event.epoch, 1427001271.0)
+        self.assertEqual(event.timestamp, datetime.datetime(2015, 3, 22, 5, 14, 31, tzinfo=tzutc()))
+        self.assertEqual(event.to_sample(), (153.095673, event.timestamp))
+        self.assertFalse(hasattr(event, '__dict__'))
+
+    def test_element_not_named_by_uri(self):
+        event = VehicleDataEvent.from_event({'data': {'uri': 'vehicle/data/Odd', 'Other': 1,
+                                                      'timestamp': '2015-03-22T05:14:31Z'}})
+        self.assertEqual(event.element, 'Other')
+        self.assertEqual(event.value, 1)
+        self.assertEqual(event.epoch, 1427001271.0)
+
+    def test_not_vehicle_data(self):
+        self.assertIsNone(VehicleDataEvent.from_event({'alarm': {}}))
+        self.assertIsNone(VehicleDataEvent.from_event({'data': {'uri': 'vehicle/data/X'}}))
+
+
+class TestTypedListeners(WVATestBase):
+    def test_typed_listener(self):
+        stream = self.wva.get_event_stream()
+        typed_cb = mock.Mock()
+        typed_batch_cb = mock.Mock()
+        stream.add_event_listener(typed_cb, element="VehicleSpeed", typed=True)
+        stream.add_batch_listener(typed_batch_cb, typed=True)
+        stream.emit_events([SPEED_EVENT, {'alarm': {}}])
+        typed_cb.assert_called_once_with(VehicleDataEvent.from_event(SPEED_EVENT))
+        typed_batch_cb.assert_called_once_with([VehicleDataEvent.from_event(SPEED_EVENT)])
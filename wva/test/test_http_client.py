@@ -4,9 +4,16 @@
 #
 # Copyright (c) 2015 Digi International Inc. All Rights Reserved.
 import base64
+import warnings
 
 import httpretty
+import mock
+from requests.packages.urllib3.connectionpool import HTTPSConnectionPool
+from requests.packages.urllib3.util.retry import Retry
 import six
+from wva import WVA
+from wva.exceptions import WVAHttpServiceUnavailableError
+from wva.simulator import WVASimulator
 from wva.test.test_utilities import WVATestBase
 
 
@@ -82,3 +89,79 @@ class TestWVAHttpClient(WVATestBase):
         self.assertEqual(self.wva.get_http_client().post_json("post", {"my": "post request"}), {"error": "an error"})
         self.assertEqual(self._get_last_request().body, six.b('{"my": "post request"}'))
 
+    def test_session_kept_on_credential_change(self):
+        self._perform_simple_request()
+        client = self.wva.get_http_client()
+        session = client._get_session()
+        self.wva.username = "bob"
+        self.wva.password = "secret"
+        self.assertIs(client._get_session(), session)
+        self.assertEqual(session.auth, ("bob", "secret"))
+
+    def test_pool_configuration(self):
+        wva = WVA("192.168.100.1", "user", "pass", pool_maxsize=32, max_retries=3, backoff_factor=0.5)
+        adapter = wva.get_http_client()._get_session().get_adapter("https://192.168.100.1/ws/")
+        self.assertEqual(adapter._pool_maxsize, 32)
+        self.assertEqual(adapter.max_retries.total, 3)
+        self.assertEqual(adapter.max_retries.backoff_factor, 0.5)
+
+    def test_pool_configuration_without_raise_on_status(self):
+        def retry(total, backoff_factor, status_forcelist=None):  # signature of older urllib3 versions
+            return Retry(total=total, backoff_factor=backoff_factor, status_forcelist=status_forcelist)
+
+        with mock.patch("wva.http_client.Retry", side_effect=retry):
+            session = WVA("192.168.100.1", "user", "pass", max_retries=2).get_http_client()._get_session()
+        retries = session.get_adapter("https://192.168.100.1/ws/").max_retries
+        self.assertEqual(retries.total, 2)
+        self.assertFalse(retries.status_forcelist)  # would raise MaxRetryError rather than return a 503
+
+    def test_service_unavailable_without_retries(self):
+        self.prepare_response("GET", "/ws/vehicle/data/VehicleSpeed", "", status=503)
+        client = WVA("192.168.100.1", "user", "pass", max_retries=0).get_http_client()
+        self.assertFalse(client._get_session().get_adapter("https://192.168.100.1/ws/").max_retries.status_forcelist)
+        self.assertRaises(WVAHttpServiceUnavailableError, client.get, "vehicle/data/VehicleSpeed")
+
+    def test_timeout(self):
+        client = WVA("192.168.100.1", "user", "pass", timeout=(1.5, 4)).get_http_client()
+        self.prepare_response("GET", "/ws/test", "Value")
+        with mock.patch("requests.Session.request", wraps=client._get_session().request) as request:
+            client.get("test")
+        self.assertEqual(request.call_args[1]["timeout"], (1.5, 4))
+
+    def test_keep_alive_disabled(self):
+        client = WVA("192.168.100.1", "user", "pass", keep_alive=False).get_http_client()
+        self.prepare_response("GET", "/ws/test", "Value")
+        client.get("test")
+        self.assertEqual(self._get_last_request().headers.get("Connection"), "close")
+
+    def test_verify(self):
+        session = WVA("192.168.100.1", "user", "pass", verify="/etc/wva-ca.pem").get_http_client()._get_session()
+        self.assertEqual(session.verify, "/etc/wva-ca.pem")
+
+    def test_insecure_warnings_not_emitted(self):
+        adapter = self.wva.get_http_client()._get_session().get_adapter("https://192.168.100.1/ws/")
+        pool = adapter.poolmanager.connection_from_url("https://192.168.100.1/ws/")
+        conn = mock.Mock(sock=None, is_verified=False, proxy_is_verified=False)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            pool._validate_conn(conn)
+        conn.connect.assert_called_once_with()
+        self.assertEqual(caught, [])
+
+    def test_insecure_warnings_when_verifying(self):
+        wva = WVA("192.168.100.1", "user", "pass", verify=True)
+        adapter = wva.get_http_client()._get_session().get_adapter("https://192.168.100.1/ws/")
+        pool = adapter.poolmanager.connection_from_url("https://192.168.100.1/ws/")
+        self.assertIs(type(pool), HTTPSConnectionPool)
+
+    def test_warning_filters_unchanged_by_concurrent_requests(self):
+        simulator = WVASimulator(elements=20)
+        simulator.start()
+        self.addCleanup(simulator.stop)
+        httpretty.disable()  # real requests to the simulator
+        wva = WVA(simulator.hostname, "user", "pass", use_https=False)
+        filters = list(warnings.filters)
+        for _ in range(20):
+            samples = wva.sample_all(max_workers=8)
+            self.assertEqual(len(samples), 20)
+        self.assertEqual(warnings.filters, filters)
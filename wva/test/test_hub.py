@@ -0,0 +1,114 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+import json
+import socket
+import time
+import unittest
+
+import mock
+import six
+from wva import WVA
+from wva.exceptions import WVAError
+from wva.hub import WVAEventStreamHub
+from wva.stream import WVAEventConnection, WVAReconnectPolicy, EVENT_STREAM_STATE_CONNECTED, \
+    EVENT_STREAM_STATE_CONNECTING, EVENT_STREAM_STATE_DISABLED
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.time() + timeout
+    while not condition():
+        if time.time() > end:
+            raise AssertionError("Timed out waiting for condition")
+        time.sleep(0.01)
+
+
+class TestWVAEventStreamHub(unittest.TestCase):
+    def setUp(self):
+        self.hub = WVAEventStreamHub(connect_workers=2)
+        self.hub.start()
+        self.sockets = {}  # hostname -> head of socket pair
+        self.tails = []
+        patcher = mock.patch.object(WVAEventConnection, '_create_connected_socket', self._create_connected_socket)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.hub.stop()
+        for sock in list(self.sockets.values()) + self.tails:
+            sock.close()
+
+    def _create_connected_socket(self, host, port):
+        head, tail = socket.socketpair()
+        tail.settimeout(0.5)
+        self.sockets[host] = head
+        self.tails.append(tail)
+        return tail
+
+    def _create_wva(self, hostname):
+        wva = WVA(hostname, "user", "pass")
+        wva.get_http_client().get = mock.Mock(return_value={'ws_events': {'enable': 'on', 'port': 5000}})
+        wva.get_event_stream().reconnect_policy = WVAReconnectPolicy(initial_delay=0.01)
+        return wva
+
+    def test_many_streams(self):
+        received = {}
+        streams = {}
+        for i in range(10):
+            hostname = "wva{}".format(i)
+            stream = self._create_wva(hostname).get_event_stream()
+            stream.add_event_listener(lambda event, h=hostname: received.setdefault(h, []).append(event))
+            stream.enable(hub=self.hub)
+            streams[hostname] = stream
+
+        self.assertEqual(self.hub.get_connection_count(), 10)
+        wait_for(lambda: all(s.get_status() == EVENT_STREAM_STATE_CONNECTED for s in streams.values()))
+        for hostname, head in self.sockets.items():
+            head.send(six.b(json.dumps({"host": hostname}) + "\r\n"))
+        wait_for(lambda: len(received) == 10)
+        for hostname, events in received.items():
+            self.assertEqual(events, [{"host": hostname}])
+
+        for stream in streams.values():
+            stream.disable()
+            self.assertEqual(stream.get_status(), EVENT_STREAM_STATE_DISABLED)
+        self.assertEqual(self.hub.get_connection_count(), 0)
+
+    def test_reconnect_on_eof(self):
+        stream = self._create_wva("wva").get_event_stream()
+        stream.enable(hub=self.hub)
+        wait_for(lambda: stream.get_status() == EVENT_STREAM_STATE_CONNECTED)
+        first_head = self.sockets["wva"]
+        first_head.close()
+        wait_for(lambda: self.sockets["wva"] is not first_head)
+        wait_for(lambda: stream.get_status() == EVENT_STREAM_STATE_CONNECTED)
+        stream.disable()
+
+    def test_retry_after_connect_failure(self):
+        wva = self._create_wva("wva")
+        wva.get_http_client().get.side_effect = [WVAError("no good"), WVAError("no good"),
+                                                 {'ws_events': {'enable': 'on', 'port': 5000}}]
+        stream = wva.get_event_stream()
+        stream.enable(hub=self.hub)
+        self.assertEqual(stream.get_status(), EVENT_STREAM_STATE_CONNECTING)
+        wait_for(lambda: stream.get_status() == EVENT_STREAM_STATE_CONNECTED)
+        self.assertEqual(wva.get_http_client().get.call_count, 3)
+        stream.disable()
+
+    def test_retry_backs_off(self):
+        wva = self._create_wva("wva")
+        wva.get_http_client().get.side_effect = WVAError("no good")
+        stream = wva.get_event_stream()
+        stream.reconnect_policy = WVAReconnectPolicy(initial_delay=0.1, multiplier=10.0, jitter=0)
+        start = time.time()
+        stream.enable(hub=self.hub)  # attempts at 0, 0.1 and 1.1 seconds
+        wait_for(lambda: wva.get_http_client().get.call_count == 2)
+        self.assertGreaterEqual(time.time() - start, 0.09)
+        self.assertEqual(wva.get_http_client().get.call_count, 2)
+        stream.disable()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+import json
+import socket
+import _socket
+
+import mock
+import six
+from wva import WVA
+from wva.exceptions import WVAHttpRequestError
+from wva.metrics import WVAMetrics
+from wva.stream import WVAEventListenerThread, EVENT_STREAM_STATE_CONNECTING, EVENT_STREAM_STATE_CONNECTED
+from wva.test.test_utilities import WVATestBase
+
+
+def speed_listener(event):
+    pass
+
+
+class TestWVAMetrics(WVATestBase):
+    def setUp(self):
+        WVATestBase.setUp(self)
+        self.metrics = WVAMetrics(labels={"device": "truck42"}, buckets=(0.5, 1.0))
+        self.wva = WVA("192.168.100.1", "user", "pass", metrics=self.metrics)
+
+    def test_uri_templates(self):
+        self.assertEqual(self.metrics.get_uri_template("vehicle/data/VehicleSpeed"), "vehicle/data/{element}")
+        self.assertEqual(self.metrics.get_uri_template("/vehicle/ecus/can0ecu0/VIN"), "vehicle/ecus/{ecu}/{element}")
+        self.assertEqual(self.metrics.get_uri_template("subscriptions"), "subscriptions")
+
+    def test_requests(self):
+        self.prepare_json_response("GET", "/ws/vehicle/data/VehicleSpeed", {
+            'VehicleSpeed': {'timestamp': '2015-03-20T18:00:49Z', 'value': 1.0}})
+        self.prepare_json_response("GET", "/ws/vehicle/data/EngineSpeed", {}, status=404)
+        with mock.patch('wva.http_client.time') as mock_time:
+            mock_time.time.side_effect = [10.0, 10.25, 20.0, 20.75]
+            self.wva.get_vehicle_data_element("VehicleSpeed").sample()
+            self.assertRaises(Exception, self.wva.get_vehicle_data_element("EngineSpeed").sample)
+
+        requests = self.metrics.as_dict()["requests"]
+        self.assertEqual(requests, [
+            {"method": "GET", "uri": "vehicle/data/{element}", "status": "200", "count": 1, "sum": 0.25,
+             "buckets": {"0.5": 1, "1.0": 1, "+Inf": 1}},
+            {"method": "GET", "uri": "vehicle/data/{element}", "status": "404", "count": 1, "sum": 0.75,
+             "buckets": {"0.5": 0, "1.0": 1, "+Inf": 1}},
+        ])
+
+        text = self.metrics.to_prometheus()
+        self.assertIn('wva_http_request_duration_seconds_bucket{device="truck42",method="GET",'
+                      'uri="vehicle/data/{element}",status="200",le="0.5"} 1\n', text)
+        self.assertIn('wva_http_request_duration_seconds_count{device="truck42",method="GET",'
+                      'uri="vehicle/data/{element}",status="404"} 1\n', text)
+
+    def test_request_error(self):
+        with mock.patch("requests.Session.request", side_effect=__import__("requests").ConnectionError()):
+            self.assertRaises(WVAHttpRequestError, self.wva.get_http_client().get, "vehicle/data")
+        self.assertEqual(self.metrics.as_dict()["requests"][0]["status"], "error")
+
+    def test_stream(self):
+        self.prepare_json_response("GET", "/ws/config/ws_events", {'ws_events': {'enable': 'on', 'port': 5000}})
+        sock_head, sock_tail = _socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM, 0)
+        self.addCleanup(sock_head.close)
+        self.addCleanup(sock_tail.close)
+
+        stream = self.wva.get_event_stream()
+        self.assertIs(stream.metrics, self.metrics)
+        stream.add_event_listener(speed_listener)
+        listener_thread = WVAEventListenerThread(stream, self.wva.get_http_client())
+        listener_thread._create_connected_socket = lambda host, port: sock_tail
+        listener_thread._step()
+        self.assertEqual(listener_thread.get_state(), EVENT_STREAM_STATE_CONNECTED)
+
+        data = six.b(json.dumps({"a": 1}) + "\r\n" + json.dumps({"b": 2}) + "\r\n")
+        sock_head.send(data)
+        listener_thread._step()
+        sock_head.close()
+        listener_thread._step()  # EOF
+        self.assertEqual(listener_thread.get_state(), EVENT_STREAM_STATE_CONNECTING)
+
+        stats = self.metrics.as_dict()["stream"]
+        self.assertEqual(stats["bytes_received"], len(data))
+        self.assertEqual(stats["events_received"], 2)
+        self.assertEqual(stats["reconnects"], 1)
+        self.assertEqual(sorted(stats["state_seconds"]), [EVENT_STREAM_STATE_CONNECTED, EVENT_STREAM_STATE_CONNECTING])
+        listener_stats = stats["listeners"]["wva.test.test_metrics.speed_listener"]
+        self.assertEqual(listener_stats["count"], 2)
+        self.assertIn('wva_stream_reconnects_total{device="truck42"} 1\n', self.metrics.to_prometheus())
+
+        self.metrics.reset()
+        self.assertEqual(self.metrics.as_dict()["stream"]["events_received"], 0)
@@ -0,0 +1,53 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+import json
+
+import httpretty
+import mock
+from wva.mirror import VehicleStateMirror
+from wva.test.test_utilities import WVATestBase, make_vehicle_data_event
+
+
+class TestVehicleStateMirror(WVATestBase):
+    def setUp(self):
+        WVATestBase.setUp(self)
+        self.prepare_response("PUT", "/ws/subscriptions/mirror_VehicleSpeed", "")
+        self.prepare_response("DELETE", "/ws/subscriptions/mirror_VehicleSpeed", "")
+        self.prepare_json_response("GET", "/ws/vehicle/data/VehicleSpeed", {
+            'VehicleSpeed': {'timestamp': '2015-03-20T18:00:49Z', 'value': 42.0}})
+        self.mirror = VehicleStateMirror(self.wva, ["VehicleSpeed"], interval=2, max_age=5)
+        self.stream = self.wva.get_event_stream()
+        with mock.patch.object(self.stream, "enable") as enable:
+            self.mirror.start()
+        enable.assert_called_once_with()
+
+    def test_subscribes(self):
+        put = [r for r in httpretty.latest_requests() if r.method == "PUT"][-1]
+        self.assertEqual(json.loads(put.body.decode('utf-8')), {
+            'subscription': {'uri': 'vehicle/data/VehicleSpeed', 'buffer': 'discard', 'interval': 2}})
+
+    def test_get_from_events(self):
+        self.stream.emit_event(make_vehicle_data_event('VehicleSpeed', 153.5, short_name='mirror_VehicleSpeed'))
+        # not mirrored
+        self.stream.emit_event(make_vehicle_data_event('EngineSpeed', 900, short_name='mirror_EngineSpeed'))
+        self.assertEqual(self.mirror.get("VehicleSpeed").value, 153.5)
+        self.assertEqual(self.mirror.get("VehicleSpeed").timestamp.year, 2015)
+        self.assertEqual(list(self.mirror.get_all().keys()), ["VehicleSpeed"])
+        self.assertFalse([r for r in httpretty.latest_requests() if r.method == "GET"])
+
+    @mock.patch('wva.mirror.time')
+    def test_stale_falls_back_to_sample(self, mock_time):
+        mock_time.time.return_value = 1000.0
+        self.stream.emit_event(make_vehicle_data_event('VehicleSpeed', 153.5, short_name='mirror_VehicleSpeed'))
+        mock_time.time.return_value = 1006.0
+        self.assertEqual(self.mirror.get("VehicleSpeed").value, 42.0)
+        self.assertEqual(self.mirror.get_age("VehicleSpeed"), 0)
+
+    def test_stop(self):
+        self.mirror.stop()
+        self.assertEqual(self._get_last_request().method, "DELETE")
+        self.stream.emit_event(make_vehicle_data_event('VehicleSpeed', 153.5, short_name='mirror_VehicleSpeed'))
+        self.assertEqual(self.mirror.get_all(), {})
@@ -0,0 +1,73 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+try:
+    from wva.report import WVAStreamReport, _PlotSeries
+except ImportError:
+    raise unittest.SkipTest("wva.report requires matplotlib and numpy")
+
+from wva.stream import WVAEventStream
+from wva.test.test_utilities import make_vehicle_data_event
+
+
+class TestWVAStreamReport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.stream = WVAEventStream(mock.Mock())
+        self.report = WVAStreamReport(["VehicleSpeed", "EngineSpeed"], capacity=2, size=(4, 3))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    @mock.patch('wva.report.time')
+    def test_record_and_summary(self, mock_time):
+        mock_time.sleep.side_effect = lambda _seconds: self.stream.emit_events([
+            make_vehicle_data_event('VehicleSpeed', 10, '2015-03-22T05:14:31Z'),
+            make_vehicle_data_event('VehicleSpeed', 30, '2015-03-22T05:14:32Z'),
+            make_vehicle_data_event('VehicleSpeed', 20, '2015-03-22T05:14:33Z'),
+        ])
+        self.report.record(self.stream, 60)
+        mock_time.sleep.assert_called_once_with(60)
+        # no longer recording
+        self.stream.emit_event(make_vehicle_data_event('VehicleSpeed', 1000, '2015-03-22T05:14:34Z'))
+
+        summary = self.report.get_summary()
+        self.assertEqual(summary["VehicleSpeed"], {
+            "count": 3, "min": 10.0, "max": 30.0, "mean": 20.0,
+            "first": 1427001271.0, "last": 1427001273.0})
+        self.assertEqual(summary["EngineSpeed"]["count"], 0)
+
+        path = os.path.join(self.tmpdir, "summary.json")
+        self.report.write_summary(path)
+        with open(path) as f:
+            self.assertEqual(json.load(f), summary)
+
+    def test_render(self):
+        for i in range(10):
+            self.report.add_sample("VehicleSpeed", 1000.0 + i, i)
+        for ext, magic in ((".png", b"\x89PNG"), (".svg", b"<?xml")):
+            path = os.path.join(self.tmpdir, "graph" + ext)
+            self.report.render(path)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(len(magic)), magic)
+
+    def test_plot_series_covers_whole_recording(self):
+        series = _PlotSeries(capacity=10)
+        for i in range(1000):
+            series.add(1000.0 + i, 5.0)
+        times, values = series.points()
+        self.assertLessEqual(len(times), 11)  # the buffer and the bucket in progress
+        self.assertEqual(times[0], 1000.0)
+        self.assertGreater(times[-1], 1900.0)
+        self.assertTrue(all(v == 5.0 for v in values))
+        self.assertTrue(all(b > a for a, b in zip(times, times[1:])))
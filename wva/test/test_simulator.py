@@ -0,0 +1,88 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+import socket
+import threading
+import time
+import unittest
+
+from wva import WVA
+from wva.exceptions import WVAHttpNotFoundError
+from wva.simulator import WVASimulator
+from wva.stream import EVENT_STREAM_STATE_CONNECTED
+
+
+class TestWVASimulator(unittest.TestCase):
+    def setUp(self):
+        self.simulator = WVASimulator(elements=["VehicleSpeed", "EngineSpeed"], event_interval=0.01)
+        self.simulator.start()
+        self.addCleanup(self.simulator.stop)
+        self.wva = WVA(self.simulator.hostname, "user", "pass", use_https=False)
+
+    def test_vehicle_data(self):
+        elements = self.wva.get_vehicle_data_elements()
+        self.assertEqual(sorted(elements), ["EngineSpeed", "VehicleSpeed"])
+        sample = elements["VehicleSpeed"].sample()
+        self.assertTrue(0 <= sample.value <= 200)
+        self.assertIsNotNone(sample.timestamp.tzinfo)
+        self.assertRaises(WVAHttpNotFoundError, self.wva.get_vehicle_data_element("Nope").sample)
+
+    def test_subscriptions(self):
+        self.assertEqual(self.wva.get_subscriptions(), [])
+        self.wva.get_subscription("speed").create("vehicle/data/VehicleSpeed", interval=5)
+        self.assertEqual(self.wva.get_subscription("speed").get_metadata(),
+                         {"uri": "vehicle/data/VehicleSpeed", "buffer": "queue", "interval": 5})
+        self.assertEqual([s.short_name for s in self.wva.get_subscriptions()], ["speed"])
+        self.wva.get_subscription("speed").delete()
+        self.assertEqual(self.wva.get_subscriptions(), [])
+
+    def test_event_stream(self):
+        received = []
+        done = threading.Event()
+
+        def on_event(event):
+            received.append(event)
+            if len(received) >= 5:
+                done.set()
+
+        self.wva.get_subscription("speed").create("vehicle/data/VehicleSpeed")
+        stream = self.wva.get_event_stream()
+        stream.add_event_listener(on_event, short_name="speed")
+        stream.enable()
+        self.addCleanup(stream.disable)
+        self.assertTrue(done.wait(5))
+        self.assertEqual(stream.get_status(), EVENT_STREAM_STATE_CONNECTED)
+        sequences = [event["data"]["sequence"] for event in received[:5]]
+        self.assertEqual(sequences, sorted(sequences))
+        self.assertEqual(received[0]["data"]["uri"], "vehicle/data/VehicleSpeed")
+
+
+class TestWVASimulatorSlowClient(unittest.TestCase):
+    def test_slow_client_dropped(self):
+        simulator = WVASimulator(elements=100, event_interval=0.001, subscribe_all=True)
+        simulator.start()
+        self.addCleanup(simulator.stop)
+        stalled = socket.create_connection(("127.0.0.1", simulator.event_port))  # never reads
+        self.addCleanup(stalled.close)
+        reader = socket.create_connection(("127.0.0.1", simulator.event_port))
+        self.addCleanup(reader.close)
+        reader.settimeout(5)
+
+        deadline = time.time() + 10
+        while simulator.get_stats()["clients"] != 1 and time.time() < deadline:
+            reader.recv(65536)
+        self.assertEqual(simulator.get_stats()["clients"], 1)
+        self.assertTrue(reader.recv(65536))  # events still flow to the remaining client
+
+    def test_stop_with_stalled_client(self):
+        simulator = WVASimulator(elements=100, event_interval=0.001, subscribe_all=True)
+        simulator.start()
+        stalled = socket.create_connection(("127.0.0.1", simulator.event_port))
+        self.addCleanup(stalled.close)
+        time.sleep(0.2)
+        stop_thread = threading.Thread(target=simulator.stop)
+        stop_thread.start()
+        stop_thread.join(5)
+        self.assertFalse(stop_thread.is_alive())
@@ -6,12 +6,13 @@
 import json
 import socket
 import _socket
+import httpretty
 import unittest
 import time
 import mock
 import six
 from wva.stream import WVAEventListenerThread, EVENT_STREAM_STATE_CONNECTING, EVENT_STREAM_STATE_CONNECTED, \
-    EVENT_STREAM_STATE_DISABLED
+    EVENT_STREAM_STATE_DISABLED, WVAEventParser, WVAReconnectPolicy, split_hostname
 
 from wva.test.test_utilities import WVATestBase
 
@@ -90,30 +91,238 @@ class TestWVAEventStream(WVATestBase):
         event_stream.emit_event({"testing": [1, 2, 3]})
         cb.assert_has_calls([])  # not called
 
-    @mock.patch('time.sleep', return_value=None)
-    def test_wva_error_on_connect_and_then_success(self, mock_sleep):
+    def test_listener_modified_during_emit(self):
+        event_stream = self.wva.get_event_stream()
+        cb = mock.Mock()
+
+        def remover(event):
+            event_stream.remove_event_listener(remover)
+            event_stream.add_event_listener(cb)
+
+        event_stream.add_event_listener(remover)
+        event_stream.emit_event({"first": True})
+        cb.assert_has_calls([])  # added after the event was emitted
+        event_stream.emit_event({"second": True})
+        cb.assert_called_once_with({"second": True})
+        self.assertRaises(KeyError, event_stream.remove_event_listener, remover)
+
+    def test_filtered_listeners(self):
+        event_stream = self.wva.get_event_stream()
+        by_short_name = mock.Mock()
+        by_element = mock.Mock()
+        by_prefix = mock.Mock()
+        everything = mock.Mock()
+        event_stream.add_event_listener(by_short_name, short_name="speedy")
+        event_stream.add_event_listener(by_element, element="EngineSpeed")
+        event_stream.add_event_listener(by_prefix, uri_prefix="vehicle/data/")
+        event_stream.add_event_listener(by_prefix, short_name="rpm")  # also matches by prefix
+        event_stream.add_event_listener(everything)
+
+        speed = {'data': {'short_name': 'speedy', 'uri': 'vehicle/data/VehicleSpeed',
+                          'VehicleSpeed': {'timestamp': '2015-03-22T05:14:31Z', 'value': 153.0}}}
+        rpm = {'data': {'short_name': 'rpm', 'uri': 'vehicle/data/EngineSpeed',
+                        'EngineSpeed': {'timestamp': '2015-03-22T05:14:31Z', 'value': 1200.0}}}
+        other = {'data': {'short_name': 'x', 'uri': 'vehicle/dataX/EngineSpeedX'}}
+        for event in (speed, rpm, other):
+            event_stream.emit_event(event)
+
+        by_short_name.assert_called_once_with(speed)
+        by_element.assert_called_once_with(rpm)
+        self.assertEqual(by_prefix.call_args_list, [mock.call(speed), mock.call(rpm)])
+        self.assertEqual(everything.call_count, 3)
+
+        event_stream.remove_event_listener(by_prefix)
+        event_stream.emit_event(speed)
+        self.assertEqual(by_prefix.call_count, 2)
+        self.assertRaises(ValueError, event_stream.add_event_listener, mock.Mock(),
+                          short_name="a", element="b")
+
+    def test_batch_listener_per_recv(self):
+        self._prepare_event_stream()
+        event_stream = self.wva.get_event_stream()
         listener_thread = self._get_event_listener_thread()
+        batch_cb = mock.Mock()
+        event_cb = mock.Mock()
+        event_stream.add_batch_listener(batch_cb)
+        event_stream.add_event_listener(event_cb)
+        listener_thread._step()
+
+        events = [{"seq": i} for i in range(5)]
+        self.sock_head.send(six.b("".join(json.dumps(e) + "\r\n" for e in events)))
+        listener_thread._step()
+        batch_cb.assert_called_once_with(events)
+        self.assertEqual(event_cb.call_count, 5)
+
+    def test_batch_listener_max_events(self):
+        event_stream = self.wva.get_event_stream()
+        batch_cb = mock.Mock()
+        event_stream.add_batch_listener(batch_cb, max_events=3)
+        events = [{"seq": i} for i in range(8)]
+        event_stream.emit_events(events[:2])
+        batch_cb.assert_has_calls([])
+        event_stream.emit_events(events[2:])
+        self.assertEqual(batch_cb.call_args_list, [mock.call(events[0:3]), mock.call(events[3:6])])
+        event_stream.flush_batches()  # interval not configured, so nothing is flushed
+        self.assertEqual(batch_cb.call_count, 2)
+        event_stream.disable()  # pending events are delivered when disabled
+        self.assertEqual(batch_cb.call_args, mock.call(events[6:8]))
+
+    @mock.patch('time.time')
+    def test_batch_listener_max_interval(self, mock_time):
+        mock_time.return_value = 1000.0
+        event_stream = self.wva.get_event_stream()
+        batch_cb = mock.Mock()
+        event_stream.add_batch_listener(batch_cb, max_interval=0.1)
+        event_stream.emit_event({"seq": 1})
+        mock_time.return_value = 1000.05
+        event_stream.emit_event({"seq": 2})
+        event_stream.flush_batches()
+        batch_cb.assert_has_calls([])
+        mock_time.return_value = 1000.1
+        event_stream.flush_batches()
+        batch_cb.assert_called_once_with([{"seq": 1}, {"seq": 2}])
+
+        event_stream.remove_batch_listener(batch_cb)
+        self.assertRaises(KeyError, event_stream.remove_batch_listener, batch_cb)
+
+    def test_wva_error_on_connect_and_then_success(self):
+        self.wva.get_event_stream().reconnect_policy = WVAReconnectPolicy(jitter=0)
+        listener_thread = self._get_event_listener_thread()
+        listener_thread._sleep = mock.Mock(return_value=False)
         self.assertEqual(listener_thread.get_state(), EVENT_STREAM_STATE_CONNECTING)
         listener_thread._step()
         listener_thread._step()
         listener_thread._step()
         self.assertEqual(listener_thread.get_state(), EVENT_STREAM_STATE_CONNECTING)
-        self.assertEqual(mock_sleep.call_count, 3)
+        self.assertEqual(listener_thread._sleep.call_count, 2)
+        self._prepare_event_stream()
+        listener_thread._step()
+        self.assertEqual(listener_thread.get_state(), EVENT_STREAM_STATE_CONNECTED)
 
-    @mock.patch('time.sleep', return_value=None)
-    def test_socket_error_on_connecting(self, mock_sleep):
+    def test_socket_error_on_connecting(self):
         def _failing_socket_connect(host, port):
             raise socket.error("connect failure")
 
+        self.wva.get_event_stream().reconnect_policy = WVAReconnectPolicy(jitter=0, max_delay=1.5)
         self._prepare_event_stream()  # Can talk to the WVA fine
         listener_thread = self._get_event_listener_thread()
         listener_thread._create_connected_socket = _failing_socket_connect
+        listener_thread._sleep = mock.Mock(return_value=False)
+        self.assertEqual(listener_thread.get_state(), EVENT_STREAM_STATE_CONNECTING)
+        for _ in range(4):
+            listener_thread._step()
+        self.assertEqual(listener_thread.get_state(), EVENT_STREAM_STATE_CONNECTING)
+        delays = [c[0][0] for c in listener_thread._sleep.call_args_list]
+        self.assertEqual(len(delays), 3)
+        for delay, expected in zip(delays, [0.5, 1.0, 1.5]):  # doubling, then capped
+            self.assertAlmostEqual(delay, expected, delta=0.05)
+
+    def test_reconnect_policy(self):
+        policy = WVAReconnectPolicy(initial_delay=1.0, max_delay=10.0, multiplier=3.0, jitter=0.5)
+        with mock.patch('wva.stream.random') as mock_random:
+            mock_random.random.return_value = 0.0
+            self.assertEqual([policy.get_delay(n) for n in range(1, 5)], [1.0, 3.0, 9.0, 10.0])
+            self.assertEqual(policy.get_delay(10000), 10.0)
+            self.assertEqual(policy.get_delay(0), 0.0)
+            mock_random.random.return_value = 1.0
+            self.assertEqual(policy.get_delay(2), 1.5)
+            self.assertEqual(policy.get_delay(0), 0.5)
+        self.assertRaises(ValueError, WVAReconnectPolicy, jitter=2)
+
+    def test_stop_interrupts_reconnect_delay(self):
+        stream = self.wva.get_event_stream()
+        stream.reconnect_policy = WVAReconnectPolicy(initial_delay=60.0, jitter=0)
+        listener_thread = self._get_event_listener_thread()
+        listener_thread.start()
+        time.sleep(0.1)  # fails to connect, then waits
+        start = time.time()
+        listener_thread.stop()
+        self.assertLess(time.time() - start, 5.0)
+        self.assertEqual(listener_thread.get_state(), EVENT_STREAM_STATE_DISABLED)
+
+    def test_reconnect_uses_cached_event_port(self):
+        self._prepare_event_stream()
+        stream = self.wva.get_event_stream()
+        stream.reconnect_policy = WVAReconnectPolicy(jitter=0, reset_after=0)
+        listener_thread = self._get_event_listener_thread()
+        listener_thread._step()
+        self.assertEqual(listener_thread.get_state(), EVENT_STREAM_STATE_CONNECTED)
+        self.assertEqual(len(httpretty.latest_requests()), 1)
+
+        # quick reconnect after EOF skips config/ws_events
+        self.sock_head.close()
+        listener_thread._step()
+        self.assertEqual(listener_thread.get_reconnect_delay(), 0)
+        self.sock_head, self.sock_tail = _socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM, 0)
+        listener_thread._step()
+        self.assertEqual(listener_thread.get_state(), EVENT_STREAM_STATE_CONNECTED)
+        self.assertEqual(len(httpretty.latest_requests()), 1)
+
+        # the cached port is forgotten once connecting to it fails
+        self.sock_head.close()
+        listener_thread._step()
+        listener_thread._create_connected_socket = mock.Mock(side_effect=socket.error("refused"))
+        listener_thread._step()
         self.assertEqual(listener_thread.get_state(), EVENT_STREAM_STATE_CONNECTING)
+        listener_thread._next_attempt = 0
         listener_thread._step()
+        self.assertEqual(len(httpretty.latest_requests()), 2)
+
+    def test_short_lived_connection_backs_off(self):
+        self._prepare_event_stream()
+        stream = self.wva.get_event_stream()
+        stream.reconnect_policy = WVAReconnectPolicy(jitter=0, reset_after=60.0, event_port_ttl=0)
+        listener_thread = self._get_event_listener_thread()
         listener_thread._step()
+        self.sock_head.close()
         listener_thread._step()
         self.assertEqual(listener_thread.get_state(), EVENT_STREAM_STATE_CONNECTING)
-        self.assertEqual(mock_sleep.call_count, 3)
+        self.assertAlmostEqual(listener_thread.get_reconnect_delay(), 0.5, delta=0.05)
+
+    @mock.patch('wva.stream.random')
+    def test_long_lived_connection_reconnects_with_jitter(self, mock_random):
+        mock_random.random.return_value = 0.5
+        self._prepare_event_stream()
+        stream = self.wva.get_event_stream()
+        stream.reconnect_policy = WVAReconnectPolicy(initial_delay=2.0, jitter=0.5, reset_after=0)
+        listener_thread = self._get_event_listener_thread()
+        listener_thread._step()
+        self.sock_head.close()
+        listener_thread._step()
+        self.assertEqual(listener_thread.get_state(), EVENT_STREAM_STATE_CONNECTING)
+        self.assertAlmostEqual(listener_thread.get_reconnect_delay(), 0.5, delta=0.05)
+
+    def test_connection_interface(self):
+        self._prepare_event_stream()
+        listener_thread = self._get_event_listener_thread()
+        self.assertIs(listener_thread.event_stream, self.wva.get_event_stream())
+        self.assertEqual(listener_thread.fileno(), -1)
+        self.assertTrue(listener_thread.connect())
+        self.assertEqual(listener_thread.fileno(), self.sock_tail.fileno())
+        self.sock_head.send(six.b(json.dumps({"seq": 1}) + "\r\n"))
+        event_cb = mock.Mock()
+        self.wva.get_event_stream().add_event_listener(event_cb)
+        listener_thread.receive()
+        event_cb.assert_called_once_with({"seq": 1})
+
+    def test_state_listener(self):
+        self._prepare_event_stream()
+        stream = self.wva.get_event_stream()
+        state_cb = mock.Mock()
+        stream.add_state_listener(state_cb)
+        stream.add_state_listener(mock.Mock(side_effect=ValueError("ignored")))
+        listener_thread = self._get_event_listener_thread()
+        listener_thread._step()
+        self.sock_head.close()
+        listener_thread._step()
+        listener_thread.close()
+        self.assertEqual(state_cb.call_args_list, [
+            mock.call(EVENT_STREAM_STATE_CONNECTING, EVENT_STREAM_STATE_CONNECTED),
+            mock.call(EVENT_STREAM_STATE_CONNECTED, EVENT_STREAM_STATE_CONNECTING),
+            mock.call(EVENT_STREAM_STATE_CONNECTING, EVENT_STREAM_STATE_DISABLED),
+        ])
+        stream.remove_state_listener(state_cb)
+        self.assertRaises(KeyError, stream.remove_state_listener, state_cb)
 
     def test_socket_timeout_when_connected(self):
         # This is a normal occurrence, and it should not cause any state transition
@@ -128,10 +337,10 @@ class TestWVAEventStream(WVATestBase):
         self.assertEqual(listener_thread.get_state(), EVENT_STREAM_STATE_CONNECTED)
 
         # replace socket with mock that will raise socket.timeout
-        def recv_raise_timeout(size):
+        def recv_raise_timeout(buf):
             raise socket.timeout("this is pretty normal")
         listener_thread._socket = mock.Mock()
-        listener_thread._socket.recv = recv_raise_timeout
+        listener_thread._socket.recv_into = recv_raise_timeout
 
         # do recv and ensure no exceptions and no state transition
         listener_thread._step()
@@ -149,11 +358,11 @@ class TestWVAEventStream(WVATestBase):
         self.assertEqual(listener_thread.get_state(), EVENT_STREAM_STATE_CONNECTED)
 
         # replace socket with mock that will raise socket.timeout
-        def recv_raise_error(size):
+        def recv_raise_error(buf):
             raise socket.error("Something bad happened")
         mock_sock = mock.Mock()
         listener_thread._socket = mock_sock
-        listener_thread._socket.recv = recv_raise_error
+        listener_thread._socket.recv_into = recv_raise_error
 
         # do recv and ensure no exceptions and no state transition
         listener_thread._step()
@@ -224,6 +433,88 @@ class TestWVAEventStream(WVATestBase):
             mock.call(event2),
         ])
 
+    def test_recv_buffer_growth(self):
+        self._prepare_event_stream()
+        event_stream = self.wva.get_event_stream()
+        event_stream.recv_buffer_size = 16
+        event_stream.max_recv_buffer_size = 40
+        listener_thread = self._get_event_listener_thread()
+
+        cb = mock.Mock()
+        event_stream.add_event_listener(cb)
+        listener_thread._step()
+        self.assertEqual(listener_thread.get_state(), EVENT_STREAM_STATE_CONNECTED)
+        self.sock_head.send(six.b(json.dumps({"value": "x" * 40}) + '\r\n'))
+        expected_sizes = [32, 40, 40]
+        for size in expected_sizes:
+            listener_thread._step()
+            self.assertEqual(len(listener_thread._recv_buf), size)
+        cb.assert_called_once_with({"value": "x" * 40})
+
+    def test_capture(self):
+        self._prepare_event_stream()
+        event_stream = self.wva.get_event_stream()
+        capture = mock.Mock()
+        event_stream.set_capture(capture)
+        listener_thread = self._get_event_listener_thread()
+        listener_thread._step()
+        self.sock_head.send(six.b('{"a": 1}\r\n'))
+        listener_thread._step()
+        self.assertEqual(capture.write.call_count, 1)
+        self.assertEqual(bytes(capture.write.call_args[0][1]), six.b('{"a": 1}\r\n'))
+
+    def test_split_hostname(self):
+        self.assertEqual(split_hostname("192.168.100.1"), ("192.168.100.1", None))
+        self.assertEqual(split_hostname("localhost:8080"), ("localhost", 8080))
+        self.assertEqual(split_hostname("[fe80::1]:8080", 443), ("fe80::1", 8080))
+        self.assertEqual(split_hostname("[fe80::1]", 443), ("fe80::1", 443))
+        self.assertEqual(split_hostname("fe80::1", 443), ("fe80::1", 443))
+
+
+class TestWVAEventParser(unittest.TestCase):
+    def _events(self, parser):
+        events = []
+        while True:
+            event = parser.next_event()
+            if event is None:
+                return events
+            events.append(event)
+
+    def test_event_split_across_feeds(self):
+        parser = WVAEventParser()
+        data = six.b(json.dumps({"data": {"value": "x" * 5000}}) + "\r\n")
+        for i in range(0, len(data), 1024):
+            self.assertEqual(self._events(parser), [])
+            parser.feed(data[i:i + 1024])
+        self.assertEqual(self._events(parser), [{"data": {"value": "x" * 5000}}])
+        self.assertEqual(parser.buffered(), 0)
+
+    def test_many_events_one_feed(self):
+        parser = WVAEventParser()
+        parser.feed(six.b("".join("\r\n" + json.dumps({"seq": i}) for i in range(100))))
+        self.assertEqual(self._events(parser), [{"seq": i} for i in range(100)])
+
+    def test_unterminated_partial_event(self):
+        parser = WVAEventParser()
+        parser.feed(six.b('{"a": {"b": 1}'))
+        self.assertEqual(self._events(parser), [])
+        parser.feed(six.b('}\r\n{"c"'))
+        self.assertEqual(self._events(parser), [{"a": {"b": 1}}])
+        parser.feed(six.b(': 2}\r\n'))
+        self.assertEqual(self._events(parser), [{"c": 2}])
+
+    def test_malformed_record_discarded(self):
+        parser = WVAEventParser()
+        parser.feed(six.b('{"bad": \r\n{"good": true}\r\n'))
+        self.assertEqual(self._events(parser), [{"good": True}])
+
+    def test_reset(self):
+        parser = WVAEventParser()
+        parser.feed(six.b('{"partial": '))
+        parser.reset()
+        parser.feed(six.b('{"x": 1}\r\n'))
+        self.assertEqual(self._events(parser), [{"x": 1}])
+
 
 if __name__ == '__main__':
     unittest.main()
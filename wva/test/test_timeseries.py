@@ -0,0 +1,91 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+import unittest
+
+import mock
+from wva.stream import WVAEventStream
+from wva.test.test_utilities import make_vehicle_data_event
+from wva.timeseries import TimeSeriesRingBuffer, TimeSeriesStore, AGGREGATE_MAX, AGGREGATE_MIN, decimate
+
+
+class TestTimeSeriesRingBuffer(unittest.TestCase):
+    def _filled(self, capacity, count):
+        buf = TimeSeriesRingBuffer(capacity)
+        for i in range(count):
+            buf.append(100.0 + i, float(i * 10))
+        return buf
+
+    def test_window(self):
+        buf = self._filled(10, 5)
+        times, values = buf.window()
+        self.assertEqual(list(times), [100.0, 101.0, 102.0, 103.0, 104.0])
+        self.assertEqual(list(values), [0.0, 10.0, 20.0, 30.0, 40.0])
+        times, values = buf.window(start=101.0, end=103.0)
+        self.assertEqual(list(values), [10.0, 20.0])
+        self.assertEqual(len(buf.window(start=200.0)[0]), 0)
+
+    def test_wraparound(self):
+        buf = self._filled(4, 7)
+        self.assertEqual(len(buf), 4)
+        self.assertEqual(list(buf.window()[0]), [103.0, 104.0, 105.0, 106.0])
+        self.assertEqual(list(buf.window(start=104.5)[1]), [50.0, 60.0])
+        self.assertEqual(buf.latest(), (106.0, 60.0))
+        buf.clear()
+        self.assertIsNone(buf.latest())
+
+    def test_aggregate(self):
+        buf = self._filled(8, 10)
+        self.assertEqual(buf.aggregate(), {"count": 8, "min": 20.0, "max": 90.0, "mean": 55.0})
+        self.assertEqual(buf.aggregate(start=500)["mean"], None)
+
+    def test_downsample(self):
+        buf = self._filled(100, 10)
+        times, values = buf.downsample(3)
+        self.assertEqual(list(times), [100.0, 103.0, 106.0, 109.0])
+        self.assertEqual(list(values), [10.0, 40.0, 70.0, 90.0])
+        self.assertEqual(list(buf.downsample(5, how=AGGREGATE_MAX)[1]), [40.0, 90.0])
+        self.assertEqual(list(buf.downsample(5, start=98, how=AGGREGATE_MIN)[1]), [0.0, 30.0, 80.0])
+        self.assertRaises(ValueError, buf.downsample, 5, how="median")
+
+    def test_non_numeric(self):
+        self.assertRaises(ValueError, TimeSeriesRingBuffer(2).append, 1.0, "on")
+
+    def test_decimate(self):
+        buf = self._filled(1000, 1000)
+        times, values = buf.window()
+        values[503] = 1e6
+        x, y = decimate(times, values, 100)
+        self.assertLessEqual(len(x), 101)
+        self.assertEqual(max(y), 1e6)
+        self.assertEqual((x[-1], y[-1]), (1099.0, 9990.0))
+        self.assertEqual(list(x), sorted(x))
+        self.assertIs(decimate(times, values, 2000)[0], times)
+
+
+class TestTimeSeriesStore(unittest.TestCase):
+    def test_attach(self):
+        stream = WVAEventStream(mock.Mock())
+        store = TimeSeriesStore(capacity=10)
+        store.attach(stream, elements=["VehicleSpeed"])
+        stream.emit_events([make_vehicle_data_event('VehicleSpeed', 1.5),
+                            make_vehicle_data_event('VehicleSpeed', 2.5, '2015-03-22T05:14:32Z'),
+                            make_vehicle_data_event('EngineSpeed', 900),
+                            make_vehicle_data_event('VehicleSpeed', "on")])
+        self.assertEqual(store.get_elements(), ["VehicleSpeed"])
+        self.assertEqual(list(store.get("VehicleSpeed").window()[1]), [1.5, 2.5])
+        self.assertEqual(store.get("VehicleSpeed").latest()[0], 1427001272.0)
+
+        store.detach()
+        stream.emit_event(make_vehicle_data_event('VehicleSpeed', 3.5))
+        self.assertEqual(len(store.get("VehicleSpeed")), 2)
+
+    def test_all_elements(self):
+        stream = WVAEventStream(mock.Mock())
+        store = TimeSeriesStore()
+        store.attach(stream)
+        stream.emit_event(make_vehicle_data_event('EngineSpeed', 900))
+        self.assertEqual(store.get("EngineSpeed").latest()[1], 900.0)
+        self.assertIsNone(store.get("VehicleSpeed"))
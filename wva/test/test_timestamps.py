@@ -0,0 +1,44 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+import calendar
+import datetime
+import unittest
+
+from dateutil.tz import tzutc
+from wva.timestamps import parse_epoch, parse_timestamp, epoch_to_datetime
+
+
+class TestTimestamps(unittest.TestCase):
+    def test_wva_format(self):
+        for timestamp in ('1970-01-01T00:00:00Z', '2015-03-20T18:00:49Z',
+                          '2000-02-29T23:59:59Z', '2100-03-01T00:00:00Z'):
+            expected = calendar.timegm(datetime.datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%SZ').timetuple())
+            self.assertEqual(parse_epoch(timestamp), expected)
+
+    def test_other_iso8601_formats(self):
+        self.assertEqual(parse_epoch('2015-03-20T18:00:49.25Z'), 1426874449.25)
+        self.assertEqual(parse_epoch('2015-03-20T19:00:49+01:00'), 1426874449.0)
+        self.assertEqual(parse_epoch('2015-03-20T13:00:49-0500'), 1426874449.0)
+
+    def test_invalid(self):
+        for timestamp in ('', 'yesterday', '2015-13-20T18:00:49Z', '2015-03-20',
+                          '2015-02-30T25:61:61Z', '2015-02-29T00:00:00Z', '2015-01-00T00:00:00Z',
+                          '2015-04-31T00:00:00Z', '2015-03-20T24:00:00Z', '2015-03-20T18:60:00Z',
+                          '2015-03-20T18:00:61Z', '2015-02-30T18:00:49.5+01:00'):
+            self.assertRaises(ValueError, parse_epoch, timestamp)
+
+    def test_parse_timestamp_cached(self):
+        first = parse_timestamp('2015-03-20T18:00:49Z')
+        self.assertEqual(first, datetime.datetime(2015, 3, 20, 18, 0, 49, tzinfo=tzutc()))
+        self.assertIs(parse_timestamp('2015-03-20T18:00:49Z'), first)
+
+    def test_valid_edge_cases(self):
+        self.assertEqual(parse_epoch('2016-02-29T00:00:00Z'), 1456704000.0)
+        self.assertEqual(parse_epoch('2015-12-31T23:59:59Z'), 1451606399.0)
+
+    def test_epoch_to_datetime(self):
+        self.assertEqual(epoch_to_datetime(1426874449.0),
+                         datetime.datetime(2015, 3, 20, 18, 0, 49, tzinfo=tzutc()))
@@ -10,6 +10,15 @@ import six.moves.urllib.parse as urllib_parse
 from wva import WVA
 
 
+def make_vehicle_data_event(element, value, timestamp='2015-03-22T05:14:31Z', short_name='speedy'):
+    """Return an event for a vehicle data element as sent on the WVA's event stream"""
+    return {'data': {element: {'timestamp': timestamp, 'value': value},
+                     'sequence': 1,
+                     'short_name': short_name,
+                     'timestamp': timestamp,
+                     'uri': 'vehicle/data/{}'.format(element)}}
+
+
 class WVATestBase(unittest.TestCase):
     def setUp(self):
         httpretty.enable()
@@ -40,5 +49,3 @@ class WVATestBase(unittest.TestCase):
     def prepare_json_response(self, method, path, data, status=200):
         headers = {'content-type': 'application/json'}
         self.prepare_response(method, path, json.dumps(data), status=status, **headers)
-
-
@@ -6,6 +6,7 @@
 
 import datetime
 from dateutil.tz import tzutc
+from wva.exceptions import WVAHttpServiceUnavailableError
 from wva.test.test_utilities import WVATestBase
 
 
@@ -36,3 +37,28 @@ class TestVehicleDataElement(WVATestBase):
         sample = el.sample()
         self.assertAlmostEqual(sample.value, 170.664856)
         self.assertEqual(sample.timestamp, datetime.datetime(2015, 3, 20, 20, 11, 10, tzinfo=tzutc()))
+
+    def test_sample_all(self):
+        self.prepare_json_response("GET", "/ws/vehicle/data",
+                                   {'data': ['vehicle/data/VehicleSpeed',
+                                             'vehicle/data/EngineSpeed',
+                                             'vehicle/data/FuelRate']})
+        self.prepare_json_response("GET", "/ws/vehicle/data/VehicleSpeed",
+                                   {'VehicleSpeed': {'timestamp': '2015-03-20T20:11:10Z', 'value': 170.5}})
+        self.prepare_json_response("GET", "/ws/vehicle/data/EngineSpeed",
+                                   {'EngineSpeed': {'timestamp': '2015-03-20T20:11:11Z', 'value': 1200.0}})
+        self.prepare_response("GET", "/ws/vehicle/data/FuelRate", status=503)
+        samples = self.wva.sample_all(max_workers=3)
+        self.assertEqual(set(samples.keys()), {'VehicleSpeed', 'EngineSpeed', 'FuelRate'})
+        self.assertEqual(samples['VehicleSpeed'].value, 170.5)
+        self.assertEqual(samples['EngineSpeed'].timestamp,
+                         datetime.datetime(2015, 3, 20, 20, 11, 11, tzinfo=tzutc()))
+        self.assertIsInstance(samples['FuelRate'], WVAHttpServiceUnavailableError)
+
+    def test_sample_all_names(self):
+        self.prepare_json_response("GET", "/ws/vehicle/data/VehicleSpeed",
+                                   {'VehicleSpeed': {'timestamp': '2015-03-20T20:11:10Z', 'value': 170.5}})
+        samples = self.wva.sample_all(["VehicleSpeed"])
+        self.assertEqual(list(samples.keys()), ['VehicleSpeed'])
+        self.assertEqual(self.wva.sample_all([]), {})
+        self.assertRaises(ValueError, self.wva.sample_all, ["VehicleSpeed"], max_workers=0)
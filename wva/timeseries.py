@@ -0,0 +1,306 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+"""Fixed-size time series storage for vehicle data received from the event stream
+
+Samples are stored as pairs of 64-bit floats (seconds since the epoch and
+value) in preallocated ring buffers rather than as Python objects, so
+holding a long history of many elements is cheap and appending a sample
+never allocates.  If NumPy is installed, the buffers are NumPy arrays and
+queries return NumPy arrays; otherwise :class:`array.array` is used and
+queries return arrays of type ``'d'``.
+
+A :class:`TimeSeriesStore` keeps a ring buffer per vehicle data element and
+is fed from an event stream::
+
+    store = TimeSeriesStore(capacity=10000)
+    store.attach(wva.get_event_stream(), elements=["VehicleSpeed"])
+    ...
+    times, values = store.get("VehicleSpeed").window(start=time.time() - 60)
+    print(store.get("VehicleSpeed").aggregate(start=time.time() - 60))
+"""
+import array
+import math
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_CAPACITY = 10000
+
+AGGREGATE_MEAN = "mean"
+AGGREGATE_MIN = "min"
+AGGREGATE_MAX = "max"
+AGGREGATES = (AGGREGATE_MEAN, AGGREGATE_MIN, AGGREGATE_MAX)
+
+
+def _allocate(size):
+    if np is not None:
+        return np.zeros(size, dtype=np.float64)
+    return array.array('d', [0.0]) * size
+
+
+def _concatenate(a, b):
+    if np is not None:
+        return np.concatenate((a, b))
+    return a + b
+
+
+def decimate(x, y, max_points):
+    """Reduce a line to at most ``max_points`` points while preserving its peaks
+
+    The samples are split into ``max_points // 2`` equal groups and only the
+    minimum and maximum of each group are kept (in their original order).
+    As a group maps to about one pixel column when ``max_points`` is twice
+    the width of the plot in pixels, the line drawn looks the same as the
+    original at a fraction of the cost.
+    """
+    groups = max_points // 2
+    if len(y) <= max_points or groups < 1:
+        return x, y
+
+    size = len(y) // groups
+    usable = size * groups
+    if np is None:
+        keep = set()
+        for offset in range(0, usable, size):
+            group = range(offset, offset + size)
+            keep.add(min(group, key=y.__getitem__))
+            keep.add(max(group, key=y.__getitem__))
+        keep.add(len(y) - 1)  # always include the newest sample
+        keep = sorted(keep)
+        return array.array('d', (x[i] for i in keep)), array.array('d', (y[i] for i in keep))
+
+    x = np.asarray(x)
+    y = np.asarray(y)
+    grouped = y[:usable].reshape(groups, size)
+    offsets = np.arange(groups) * size
+    keep = np.unique(np.concatenate((offsets + grouped.argmin(axis=1),
+                                     offsets + grouped.argmax(axis=1))))
+    if usable < len(y):
+        keep = np.append(keep, len(y) - 1)  # always include the newest sample
+    return x[keep], y[keep]
+
+
+class TimeSeriesRingBuffer(object):
+    """Ring buffer holding the most recent ``capacity`` samples of one element
+
+    Samples are expected to be appended in order of time (as they are
+    received from the WVA); queries by time use a binary search and will
+    give unexpected results otherwise.  When the buffer is full, appending a
+    sample overwrites the oldest one.  All methods are thread-safe.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self._capacity = capacity
+        self._times = _allocate(capacity)
+        self._values = _allocate(capacity)
+        self._head = 0  # index at which the next sample is written
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        """Remove all samples from the buffer"""
+        with self._lock:
+            self._head = 0
+            self._count = 0
+
+    def append(self, epoch, value):
+        """Add a sample taken at ``epoch`` (seconds since the epoch)
+
+        :raises ValueError: if the value is not numeric
+        """
+        value = float(value)
+        with self._lock:
+            head = self._head
+            self._times[head] = epoch
+            self._values[head] = value
+            self._head = (head + 1) % self._capacity
+            if self._count < self._capacity:
+                self._count += 1
+
+    def latest(self):
+        """Return the most recent ``(epoch, value)`` pair or None if the buffer is empty"""
+        with self._lock:
+            if not self._count:
+                return None
+            index = (self._head - 1) % self._capacity
+            return self._times[index], self._values[index]
+
+    def _physical(self, logical):
+        return (self._head - self._count + logical) % self._capacity
+
+    def _bisect(self, epoch):
+        # index of the first sample (oldest first) with a time >= epoch
+        lo, hi = 0, self._count
+        times = self._times
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if times[self._physical(mid)] < epoch:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _slice(self, data, lo, hi):
+        if hi <= lo:
+            return data[0:0]
+        start = self._physical(lo)
+        end = start + (hi - lo)
+        if end <= self._capacity:
+            chunk = data[start:end]
+            return chunk.copy() if np is not None else chunk
+        return _concatenate(data[start:], data[:end - self._capacity])
+
+    def window(self, start=None, end=None):
+        """Return ``(times, values)`` for samples with ``start <= time < end``
+
+        Either bound may be None to leave that end of the window open.  The
+        returned arrays are copies, ordered oldest first.
+        """
+        with self._lock:
+            lo = 0 if start is None else self._bisect(start)
+            hi = self._count if end is None else self._bisect(end)
+            return self._slice(self._times, lo, hi), self._slice(self._values, lo, hi)
+
+    def aggregate(self, start=None, end=None):
+        """Return a dictionary with the count, min, max and mean of values in a window
+
+        The min, max and mean are None if the window holds no samples.
+        """
+        _times, values = self.window(start, end)
+        count = len(values)
+        if not count:
+            return {"count": 0, "min": None, "max": None, "mean": None}
+        if np is not None:
+            return {"count": count, "min": float(values.min()), "max": float(values.max()),
+                    "mean": float(values.mean())}
+        return {"count": count, "min": min(values), "max": max(values), "mean": math.fsum(values) / count}
+
+    def downsample(self, interval, start=None, end=None, how=AGGREGATE_MEAN):
+        """Reduce the samples in a window to one per ``interval`` seconds
+
+        :param interval: Width of each bucket in seconds
+        :param how: How the values in each bucket are combined, one of
+            ``AGGREGATE_MEAN``, ``AGGREGATE_MIN`` or ``AGGREGATE_MAX``
+        :returns: ``(times, values)`` where each time is the start of a
+            bucket; buckets without samples are omitted
+        """
+        if how not in AGGREGATES:
+            raise ValueError("Unknown aggregate {!r}, expected one of {!r}".format(how, AGGREGATES))
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+
+        times, values = self.window(start, end)
+        if not len(times):
+            return times, values
+        origin = times[0] if start is None else start
+
+        if np is not None:
+            buckets = np.floor((times - origin) / interval)
+            first = np.flatnonzero(np.diff(buckets)) + 1
+            first = np.concatenate(([0], first))
+            if how == AGGREGATE_MEAN:
+                reduced = np.add.reduceat(values, first) / np.diff(np.append(first, len(values)))
+            elif how == AGGREGATE_MIN:
+                reduced = np.minimum.reduceat(values, first)
+            else:
+                reduced = np.maximum.reduceat(values, first)
+            return origin + buckets[first] * interval, reduced
+
+        combine = {AGGREGATE_MIN: min, AGGREGATE_MAX: max,
+                   AGGREGATE_MEAN: lambda bucket: math.fsum(bucket) / len(bucket)}[how]
+        out_times, out_values = array.array('d'), array.array('d')
+        bucket, bucket_index = [], None
+        for t, v in zip(times, values):
+            index = math.floor((t - origin) / interval)
+            if index != bucket_index and bucket:
+                out_times.append(origin + bucket_index * interval)
+                out_values.append(combine(bucket))
+                bucket = []
+            bucket_index = index
+            bucket.append(v)
+        out_times.append(origin + bucket_index * interval)
+        out_values.append(combine(bucket))
+        return out_times, out_values
+
+
+class TimeSeriesStore(object):
+    """A :class:`TimeSeriesRingBuffer` per vehicle data element, fed from an event stream
+
+    :param capacity: Number of samples held for each element
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self._capacity = capacity
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self._event_stream = None
+
+    def attach(self, event_stream, elements=None):
+        """Start recording vehicle data events from the provided stream
+
+        :param elements: Names of the elements to record, or None to record
+            every vehicle data element received
+        """
+        self.detach()
+        self._event_stream = event_stream
+        if elements is None:
+            event_stream.add_event_listener(self._on_event, uri_prefix="vehicle/data", typed=True)
+        else:
+            for element in elements:
+                self.get_buffer(element)
+                event_stream.add_event_listener(self._on_event, element=element, typed=True)
+
+    def detach(self):
+        """Stop recording events from the attached stream (if any)"""
+        if self._event_stream is not None:
+            try:
+                self._event_stream.remove_event_listener(self._on_event)
+            except KeyError:
+                pass
+            self._event_stream = None
+
+    def _on_event(self, event):
+        try:
+            value = float(event.value)
+        except (TypeError, ValueError):
+            return  # only numeric data is recorded
+        epoch = event.epoch
+        if epoch is not None:
+            self.get_buffer(event.element).append(epoch, value)
+
+    def add_sample(self, element, epoch, value):
+        """Record a sample directly (e.g. when loading historical data)"""
+        self.get_buffer(element).append(epoch, value)
+
+    def get_buffer(self, element):
+        """Return the buffer for an element, creating it if required"""
+        buffer = self._buffers.get(element)
+        if buffer is None:
+            with self._lock:
+                buffer = self._buffers.get(element)
+                if buffer is None:
+                    buffer = self._buffers[element] = TimeSeriesRingBuffer(self._capacity)
+        return buffer
+
+    def get(self, element):
+        """Return the buffer for an element or None if nothing has been recorded for it"""
+        return self._buffers.get(element)
+
+    def get_elements(self):
+        """Return the names of the elements with buffers in this store"""
+        return list(self._buffers.keys())
@@ -0,0 +1,158 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2015 Digi International Inc. All Rights Reserved.
+"""Fast parsing of the timestamps used by the WVA
+
+The WVA always reports timestamps in UTC with a fixed ISO-8601 format,
+e.g. ``2015-03-20T18:00:49Z``.  Timestamps in this format are parsed by
+slicing out the fields directly, which is many times faster than a
+general purpose date parser.  Other ISO-8601 timestamps (with fractional
+seconds or a UTC offset) are handled by a slower fallback and, if it is
+installed, anything else is handed to `arrow <http://crsmithdev.com/arrow/>`_.
+
+As many values sampled at the same time share a timestamp, the results for
+recently seen timestamp strings are cached.
+"""
+import datetime
+import re
+
+TIMESTAMP_CACHE_SIZE = 256
+
+_ISO8601_RE = re.compile(
+    r"^(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(\.\d+)?"
+    r"(?:(Z)|([+-])(\d{2}):?(\d{2}))?$"
+)
+
+
+class _UTC(datetime.tzinfo):
+    """UTC timezone (``datetime.timezone.utc`` is not available on Python 2)"""
+
+    _ZERO = datetime.timedelta(0)
+
+    def utcoffset(self, dt):
+        return self._ZERO
+
+    def dst(self, dt):
+        return self._ZERO
+
+    def tzname(self, dt):
+        return "UTC"
+
+    def __repr__(self):
+        return "UTC"
+
+
+UTC = _UTC()
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=UTC)
+
+# days before the start of each month in a non-leap year
+_DAYS_BEFORE_MONTH = (0, 0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334)
+_DAYS_IN_MONTH = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def _is_leap_year(year):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+def _check_fields(timestamp, year, month, day, hour, minute, second):
+    if not 1 <= month <= 12:
+        raise ValueError("Invalid month in timestamp {!r}".format(timestamp))
+    days_in_month = 29 if month == 2 and _is_leap_year(year) else _DAYS_IN_MONTH[month]
+    if not 1 <= day <= days_in_month:
+        raise ValueError("Invalid day in timestamp {!r}".format(timestamp))
+    if hour >= 24 or minute >= 60 or second >= 61:  # allow for a leap second
+        raise ValueError("Invalid time of day in timestamp {!r}".format(timestamp))
+
+
+def _days_since_epoch(year, month, day):
+    y = year - 1
+    days = y * 365 + y // 4 - y // 100 + y // 400 + _DAYS_BEFORE_MONTH[month] + day
+    if month > 2 and _is_leap_year(year):
+        days += 1
+    return days - 719163  # days from 0001-01-01 to 1970-01-01 (inclusive of the day itself)
+
+
+_epoch_cache = {}
+_datetime_cache = {}
+
+
+def parse_epoch(timestamp):
+    """Parse a WVA timestamp and return seconds since the epoch (UTC) as a float
+
+    :raises ValueError: if the timestamp cannot be parsed
+    """
+    try:
+        return _epoch_cache[timestamp]
+    except KeyError:
+        pass
+    epoch = _parse_epoch_uncached(timestamp)
+    if len(_epoch_cache) >= TIMESTAMP_CACHE_SIZE:
+        _epoch_cache.clear()
+    _epoch_cache[timestamp] = epoch
+    return epoch
+
+
+def parse_timestamp(timestamp):
+    """Parse a WVA timestamp and return a timezone-aware (UTC) datetime
+
+    :raises ValueError: if the timestamp cannot be parsed
+    """
+    try:
+        return _datetime_cache[timestamp]
+    except KeyError:
+        pass
+    dt = epoch_to_datetime(parse_epoch(timestamp))
+    if len(_datetime_cache) >= TIMESTAMP_CACHE_SIZE:
+        _datetime_cache.clear()
+    _datetime_cache[timestamp] = dt
+    return dt
+
+
+def _parse_epoch_uncached(timestamp):
+    if (len(timestamp) == 20 and timestamp[19] == "Z" and timestamp[10] == "T" and
+            timestamp[4] == "-" and timestamp[7] == "-" and timestamp[13] == ":" and timestamp[16] == ":"):
+        year, month, day = int(timestamp[0:4]), int(timestamp[5:7]), int(timestamp[8:10])
+        hour, minute, second = int(timestamp[11:13]), int(timestamp[14:16]), int(timestamp[17:19])
+        _check_fields(timestamp, year, month, day, hour, minute, second)
+        return float(_days_since_epoch(year, month, day) * 86400 + hour * 3600 + minute * 60 + second)
+    return _parse_epoch_slow(timestamp)
+
+
+def _parse_epoch_slow(timestamp):
+    match = _ISO8601_RE.match(timestamp)
+    if match is None:
+        return _parse_epoch_arrow(timestamp)
+    fields = match.groups()
+    year, month, day, hour, minute, second = (int(field) for field in fields[:6])
+    fraction, _z, sign, off_h, off_m = fields[6:]
+    _check_fields(timestamp, year, month, day, hour, minute, second)
+    epoch = _days_since_epoch(year, month, day) * 86400 + hour * 3600 + minute * 60 + second
+    if fraction:
+        epoch += float(fraction)
+    if sign:
+        offset = int(off_h) * 3600 + int(off_m) * 60
+        epoch -= offset if sign == "+" else -offset
+    return float(epoch)
+
+
+def _parse_epoch_arrow(timestamp):
+    # a WVA timestamp always identifies a time of day; don't let arrow
+    # quietly accept a bare date as midnight
+    if ":" not in timestamp:
+        raise ValueError("Timestamp {!r} has no time of day".format(timestamp))
+    try:
+        import arrow
+    except ImportError:
+        raise ValueError("Unable to parse timestamp {!r}".format(timestamp))
+    try:
+        dt = arrow.get(timestamp).datetime
+    except Exception:
+        raise ValueError("Unable to parse timestamp {!r}".format(timestamp))
+    return (dt - EPOCH).total_seconds()
+
+
+def epoch_to_datetime(epoch):
+    """Convert seconds since the epoch to a timezone-aware (UTC) datetime"""
+    return EPOCH + datetime.timedelta(seconds=epoch)
@@ -5,7 +5,7 @@
 # Copyright (c) 2015 Digi International Inc. All Rights Reserved.
 
 from collections import namedtuple
-import arrow
+from wva.timestamps import parse_timestamp
 
 VehicleDataSample = namedtuple('VehicleDataSample', ['value', 'timestamp'])
 
@@ -29,8 +29,13 @@ class VehicleDataElement(object):
                 print("Speed: %0.2f @ %s" % (speed.value, speed.timestamp))
                 time.sleep(1)
         """
-        # Response: {'VehicleSpeed': {'timestamp': '2015-03-20T18:00:49Z', 'value': 223.368515}}
-        data = self._http_client.get("vehicle/data/{}".format(self.name))[self.name]
-        dt = arrow.get(data["timestamp"]).datetime
-        value = data["value"]
-        return VehicleDataSample(value, dt)
+        return sample_from_response(self.name, self._http_client.get("vehicle/data/{}".format(self.name)))
+
+
+def sample_from_response(name, response):
+    """Build a :class:`VehicleDataSample` from the decoded response for an element"""
+    # Response: {'VehicleSpeed': {'timestamp': '2015-03-20T18:00:49Z', 'value': 223.368515}}
+    data = response[name]
+    dt = parse_timestamp(data["timestamp"])
+    value = data["value"]
+    return VehicleDataSample(value, dt)